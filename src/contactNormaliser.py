@@ -0,0 +1,190 @@
+import re
+import time
+
+try:
+    # Arrow-backed pandas strings run the .str methods in Arrow's C++
+    # kernels; on object dtype they are Python loops, slower than the plain
+    # functions below, so without pyarrow those are used
+    import pandas as pd
+    import pyarrow  # noqa: F401
+except ImportError:
+    pd = None
+
+# Value column of each contact table, in the process_json (run) layout
+CONTACT_COLUMNS = {"emails": "emailaddress", "phones": "phonenumber"}
+DUPLICATE_COLUMN = "isduplicate"
+
+# National numbers ("09 555 1111") are read as New Zealand numbers
+DEFAULT_COUNTRY_CODE = "64"
+
+# ASCII digits only, the same in Python's re and Arrow's RE2
+_E164 = re.compile(r"\+[1-9][0-9]{6,14}")
+_NOT_DIGITS = re.compile(r"[^0-9+]")
+# "021 123 4567 ext 5", "x5", "#5": the extension is not part of the number
+_EXTENSION = re.compile(r"(?i)\s*(?:ext(?:ension)?\.?|x|#)\s*[0-9]+\s*$")
+# "+64 (0)9 555 1111": the trunk 0 shown after a country code is not dialled
+_COUNTRY_TRUNK = re.compile(r"^(\s*(?:\+|00)\s*[0-9]{1,3})\s*\(0\)")
+
+
+def normalise_email(value):
+    return value.strip().lower()
+
+
+def normalise_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    E.164 form of a phone number: an extension suffix, a "(0)" after the
+    country code, punctuation and spaces dropped, a 00 international prefix
+    read as + and a 0 trunk prefix replaced by the country code. A value
+    with neither prefix (no way to tell its country), or that does not come
+    out as + and 7 to 15 digits, is only trimmed.
+    """
+    number = _EXTENSION.sub("", value)
+    number = _COUNTRY_TRUNK.sub(r"\1", number)
+    digits = _NOT_DIGITS.sub("", number)
+    if digits.startswith("00"):
+        digits = "+" + digits[2:]
+    if digits.startswith("+"):
+        number = "+" + digits[1:].replace("+", "")
+    elif digits.startswith("0"):
+        number = f"+{country_code}{digits[1:]}"
+    else:
+        return value.strip()
+    return number if _E164.fullmatch(number) else value.strip()
+
+
+def normalise_emails(values):
+    """normalise_email over a list of strings."""
+    # str.strip/lower are C already, a round trip through Arrow costs more
+    return [v.strip().lower() for v in values]
+
+
+def normalise_phones(values, country_code=DEFAULT_COUNTRY_CODE):
+    """normalise_phone over a list of strings, as one vectorised pass."""
+    if pd is None:
+        return [normalise_phone(v, country_code) for v in values]
+    raw = _strings(values)
+    digits = (
+        raw.str.replace(_EXTENSION.pattern, "", regex=True)
+        .str.replace(_COUNTRY_TRUNK.pattern, r"\1", regex=True)
+        .str.replace(_NOT_DIGITS.pattern, "", regex=True)
+        .str.replace(r"^00", "+", regex=True)
+    )
+    national = digits.str.lstrip("+")
+    international = digits.str.startswith("+")
+    trunk = digits.str.startswith("0")
+    number = ("+" + national.str.replace("+", "", regex=False)).where(
+        international, "+" + country_code + national.str[1:]
+    )
+    valid = (international | trunk) & number.str.fullmatch(_E164.pattern)
+    return number.where(valid, raw.str.strip()).tolist()
+
+
+def _strings(values):
+    return pd.Series(values, dtype="string[pyarrow]")
+
+
+NORMALISERS = {"emails": normalise_emails, "phones": normalise_phones}
+
+
+class ContactNormaliser:
+    """
+    Normalisation stage in front of the writer of a contact table (emails,
+    phones): rows are buffered and their values canonicalised batch_size at
+    a time, phones to E.164 and emails trimmed and lower-cased, with each
+    distinct value normalised once (cache_size values are remembered).
+    Every row gains the isduplicate column, True for the second and later
+    rows of a party with the same normalised value; a party's rows arrive
+    together, so this is decided in the same pass. Same interface as the
+    writer it wraps.
+    """
+
+    def __init__(self, writer, table, fieldnames, batch_size=5000, cache_size=1 << 18):
+        # fieldnames are the table's columns with DUPLICATE_COLUMN
+        self.writer = writer
+        self.normalise = NORMALISERS[table]
+        columns = [f for f in fieldnames if f != DUPLICATE_COLUMN]
+        self.value_index = columns.index(CONTACT_COLUMNS[table])
+        self.duplicate_index = list(fieldnames).index(DUPLICATE_COLUMN)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache = {}
+        self.cache_hits = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+        self._rows = []
+        # Party of the last row written and its normalised values
+        self._party = None
+        self._seen = set()
+
+    @property
+    def rows_written(self):
+        return self.writer.rows_written
+
+    def writerow(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def writerows(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        start = time.perf_counter()
+        rows, self._rows = self._rows, []
+        i, d, cache = self.value_index, self.duplicate_index, self.cache
+        values = [row[i] for row in rows]
+        misses = [
+            v for v in dict.fromkeys(values) if v.__class__ is str and v not in cache
+        ]
+        self.cache_hits += len(values) - len(misses)
+        if len(cache) + len(misses) > self.cache_size:
+            cache.clear()
+        if misses:
+            cache.update(zip(misses, self.normalise(misses)))
+        out = []
+        party, seen = self._party, self._seen
+        for row, value in zip(rows, values):
+            if value.__class__ is str:
+                value = cache[value]
+            if row[0] != party:
+                party, seen = row[0], set()
+            duplicate = value in seen
+            seen.add(value)
+            self.duplicates += duplicate
+            if d > i:
+                out.append((*row[:i], value, *row[i + 1 : d], duplicate, *row[d:]))
+            else:
+                out.append((*row[:d], duplicate, *row[d:i], value, *row[i + 1 :]))
+        self._party, self._seen = party, seen
+        self.seconds += time.perf_counter() - start
+        self.writer.writerows(out)
+
+    def stats(self) -> dict:
+        return {
+            "normalise_seconds": round(self.seconds, 3),
+            "normalise_cache_hits": self.cache_hits,
+            "duplicates": self.duplicates,
+        }
+
+    def checkpoint(self) -> dict:
+        self.flush()
+        return self.writer.checkpoint()
+
+    def resume(self, state: dict):
+        self.writer.resume(state)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
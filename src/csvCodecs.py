@@ -0,0 +1,114 @@
+import csv
+import gzip
+import io
+
+# File name suffix per compression codec, None is plain CSV
+EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+CSV_SUFFIXES = [".csv" + extension for extension in EXTENSIONS.values()]
+
+# gzip's own default (9) costs several times the CPU of 6 for ~1% smaller files
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def _zstd():
+    # Python 3.14 ships zstd in the standard library, before that it is the
+    # optional zstandard package
+    try:
+        from compression import zstd
+
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+
+        return zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression needs Python 3.14+ or the zstandard package"
+        ) from None
+
+
+def codec_available(compression):
+    if compression == "zstd":
+        try:
+            _zstd()
+        except ImportError:
+            return False
+    return compression in EXTENSIONS
+
+
+def compression_of(path):
+    """Codec of a file from its name (phones.csv.gz -> "gzip"), None if plain."""
+    for compression, extension in EXTENSIONS.items():
+        if extension and path.lower().endswith(extension):
+            return compression
+    return None
+
+
+def csv_table_name(file_name):
+    """Table of a CSV file name (phones.csv, phones.csv.zst, ...), None otherwise."""
+    for suffix in CSV_SUFFIXES:
+        if file_name.lower().endswith(suffix):
+            return file_name[: -len(suffix)]
+    return None
+
+
+def open_compressed(path, mode="rb", compression=None, level=None):
+    """
+    Binary stream of path, compressed or decompressed on the fly as it is
+    written or read. mode is "rb", "wb" or "ab".
+    """
+    if compression is None:
+        return open(path, mode)
+    if compression not in DEFAULT_LEVELS:
+        raise ValueError(f"Unknown compression: {compression}")
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=level)
+    zstd = _zstd()
+    if zstd.__name__ == "compression.zstd":
+        return zstd.open(path, mode, level=level if mode != "rb" else None)
+    if mode == "rb":
+        # Shard merges concatenate frames, so read on past the first one
+        return zstd.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    return zstd.ZstdCompressor(level=level).stream_writer(
+        open(path, mode), closefd=True
+    )
+
+
+def open_csv(path, mode="r", compression="infer", level=None):
+    """
+    Text stream of a CSV file for csv.reader/writer (or pandas.read_csv).
+    compression="infer" picks the codec from the file name.
+    """
+    if compression == "infer":
+        compression = compression_of(path)
+    stream = open_compressed(path, mode[0] + "b", compression, level)
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+
+def compress_bytes(data: bytes, compression=None, level=None):
+    """data as one complete gzip member / zstd frame (unchanged for plain CSV)."""
+    if compression is None:
+        return data
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    zstd = _zstd()
+    if zstd.__name__ == "compression.zstd":
+        return zstd.compress(data, level=level)
+    return zstd.ZstdCompressor(level=level).compress(data)
+
+
+def header_bytes(fieldnames, compression=None, level=None):
+    """
+    The CSV header line, encoded and compressed on its own. gzip members and
+    zstd frames can be concatenated, so a merge writes this and then appends
+    header-less compressed shards byte for byte.
+    """
+    line = io.StringIO()
+    csv.writer(line).writerow(fieldnames)
+    return compress_bytes(line.getvalue().encode("utf-8"), compression, level)
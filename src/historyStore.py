@@ -0,0 +1,413 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import shutil
+import sys
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from csvCodecs import EXTENSIONS, open_csv
+from partySchemaCompiler import RUN_PREFIX
+from runCheckpoint import read_checkpoint
+from tableWriters import PARQUET_SUFFIX, output_table_name
+
+RUN_COLUMNS = RUN_PREFIX[1:]
+CATALOG_FILE = "catalog.json"
+
+
+def is_run_dir(path):
+    # process_json names each run directory after its run GUID
+    try:
+        uuid.UUID(os.path.basename(path))
+    except ValueError:
+        return False
+    return os.path.isdir(path)
+
+
+def run_files(run_dir) -> dict:
+    """{table: path} of the output files of a run, delta sets as insert/emails."""
+    files = {}
+    for root, _, names in os.walk(run_dir):
+        for name in names:
+            table = output_table_name(name)
+            if table is not None:
+                key = os.path.relpath(os.path.join(root, table), run_dir)
+                files[key.replace(os.sep, "/")] = os.path.join(root, name)
+    return dict(sorted(files.items()))
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_header(path) -> list:
+    """Column names of a CSV (any codec) or Parquet output file."""
+    if path.endswith(PARQUET_SUFFIX):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    with open_csv(path) as f:
+        return next(csv.reader(f), [])
+
+
+def iter_rows(path):
+    """
+    Data rows of a CSV or Parquet output file as lists of CSV text. The file
+    is only opened once iteration starts.
+    """
+    if path.endswith(PARQUET_SUFFIX):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                yield ["" if v is None else str(v) for v in row]
+        return
+    with open_csv(path) as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+
+def run_info(run_dir) -> dict:
+    """
+    GUID, UTC run date and run-manifest columns of a run directory. The date
+    comes from metrics.json or manifest.json, else the first row of an output
+    file (runs older than both), else the directory's modification time.
+    """
+    manifest = read_json(os.path.join(run_dir, "manifest.json")).get("run_columns", {})
+    run_date_utc = read_json(os.path.join(run_dir, "metrics.json")).get(
+        "run_date_utc"
+    ) or manifest.get("run_date_utc")
+    if not run_date_utc:
+        for path in run_files(run_dir).values():
+            header = read_header(path)
+            if "run_date_utc" in header:
+                row = next(iter_rows(path), None)
+                if row:
+                    run_date_utc = row[header.index("run_date_utc")]
+                    break
+    if not run_date_utc:
+        mtime = datetime.fromtimestamp(os.path.getmtime(run_dir), timezone.utc)
+        run_date_utc = mtime.strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        "run_guid": os.path.basename(run_dir),
+        "run_date_utc": run_date_utc,
+        "date": run_date_utc[:10],
+        "constants": manifest,
+    }
+
+
+def order_columns(columns) -> list:
+    # partyidentifier first, run columns last, everything else alphabetical
+    columns = set(columns)
+    ordered = ["partyidentifier"] if "partyidentifier" in columns else []
+    ordered += sorted(c for c in columns if c not in ["partyidentifier", *RUN_COLUMNS])
+    return ordered + [c for c in RUN_COLUMNS if c in columns]
+
+
+def aligned_rows(header, rows, columns, constants=None):
+    # Rows of a file re-ordered into columns, columns it lacks are empty (or
+    # the run manifest's constant)
+    constants = constants or {}
+    positions = {name: i for i, name in enumerate(header)}
+    picks = [
+        (positions[c], None) if c in positions else (None, constants.get(c, ""))
+        for c in columns
+    ]
+    for row in rows:
+        yield [row[i] if i is not None else value for i, value in picks]
+
+
+class HistoryStore:
+    """
+    Date- and table-partitioned history of process_json runs: every table's
+    rows of one UTC run date live in one file, <store>/<table>/date=<date>/
+    part.csv.gz. catalog.json records each partition's file, row count and
+    runs, so readers go straight to the partitions of a date range.
+    Rows keep their run columns, so runs stay distinguishable; partitions are
+    rewritten without a run's old rows, which makes compacting a run twice
+    harmless.
+    """
+
+    def __init__(self, store_dir, compression="gzip"):
+        self.store_dir = store_dir
+        self.compression = compression
+        self.catalog_path = os.path.join(store_dir, CATALOG_FILE)
+        self.catalog = read_json(self.catalog_path) or {"tables": {}, "runs": {}}
+
+    def save_catalog(self):
+        # Write then rename, readers never see a partial catalog
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f"{self.catalog_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.catalog, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.catalog_path)
+
+    def partition_path(self, table, day):
+        return os.path.join(
+            self.store_dir,
+            *table.split("/"),
+            f"date={day}",
+            f"part.csv{EXTENSIONS[self.compression]}",
+        )
+
+    def add_runs(self, runs: list):
+        """
+        Fold runs (run_info dicts) into the store, one partition rewrite per
+        table and run date however many runs share it. Returns rows added.
+        """
+        sources = {}
+        for run in runs:
+            for table, path in run_files(run["path"]).items():
+                sources.setdefault((table, run["date"]), []).append((run, path))
+
+        added = 0
+        for (table, day), table_sources in sorted(sources.items()):
+            added += self._rewrite_partition(table, day, table_sources)
+        for run in runs:
+            self.catalog["runs"][run["run_guid"]] = run["run_date_utc"]
+        self.save_catalog()
+        return added
+
+    def _rewrite_partition(self, table, day, sources):
+        partitions = self.catalog["tables"].setdefault(table, {})
+        entry = partitions.get(day)
+        run_guids = {run["run_guid"] for run, _ in sources}
+        inputs = []
+        if entry:
+            entry_path = os.path.join(self.store_dir, entry["path"])
+            header, rows = read_header(entry_path), iter_rows(entry_path)
+            if "run_guid" in header:
+                # Rows of runs compacted again are replaced, not duplicated
+                guid_index = header.index("run_guid")
+                rows = (row for row in rows if row[guid_index] not in run_guids)
+            inputs.append((header, rows, None))
+        for run, path in sources:
+            inputs.append((read_header(path), iter_rows(path), run["constants"]))
+
+        columns = order_columns(
+            {
+                c
+                for header, _, constants in inputs
+                for c in [*header, *(constants or {})]
+            }
+        )
+        path = self.partition_path(table, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        row_count = 0
+        with open_csv(tmp_path, "w", self.compression) as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for header, rows, constants in inputs:
+                for row in aligned_rows(header, rows, columns, constants):
+                    writer.writerow(row)
+                    row_count += 1
+        os.replace(tmp_path, path)
+
+        rel_path = os.path.relpath(path, self.store_dir).replace(os.sep, "/")
+        if entry and entry["path"] != rel_path:
+            # Written with another compression before
+            os.remove(os.path.join(self.store_dir, entry["path"]))
+        previous_rows = entry["rows"] if entry else 0
+        partitions[day] = {
+            "path": rel_path,
+            "columns": columns,
+            "rows": row_count,
+            "bytes": os.path.getsize(path),
+            "runs": sorted(set(entry["runs"] if entry else []) | run_guids),
+        }
+        return row_count - previous_rows
+
+    def drop_before(self, day):
+        """Retention: remove partitions (and their runs) dated before day."""
+        dropped = 0
+        for table, partitions in self.catalog["tables"].items():
+            for partition_day in [d for d in partitions if d < day]:
+                entry = partitions.pop(partition_day)
+                path = os.path.join(self.store_dir, entry["path"])
+                if os.path.exists(path):
+                    os.remove(path)
+                if not os.listdir(os.path.dirname(path)):
+                    os.rmdir(os.path.dirname(path))
+                dropped += 1
+        self.catalog["runs"] = {
+            guid: run_date
+            for guid, run_date in self.catalog["runs"].items()
+            if run_date[:10] >= day
+        }
+        self.save_catalog()
+        return dropped
+
+    def partitions(self, table, start=None, end=None):
+        """Catalog entries of table with start <= date <= end (YYYY-MM-DD)."""
+        partitions = self.catalog["tables"].get(table, {})
+        return [
+            {"date": day, **partitions[day]}
+            for day in sorted(partitions)
+            if (start is None or day >= str(start)) and (end is None or day <= str(end))
+        ]
+
+    def columns(self, table, start=None, end=None):
+        """Columns of table over the partitions from start to end, in file order."""
+        return order_columns(
+            {c for p in self.partitions(table, start, end) for c in p["columns"]}
+        )
+
+    def read(self, table, start=None, end=None):
+        """
+        Rows of table as dicts, for run dates from start to end inclusive.
+        Only the partitions the catalog lists for that range are opened.
+        """
+        for partition in self.partitions(table, start, end):
+            path = os.path.join(self.store_dir, partition["path"])
+            header = partition["columns"]
+            for row in iter_rows(path):
+                yield dict(zip(header, row))
+
+
+def compact(
+    data_dir,
+    store_dir,
+    min_age_days=7,
+    retention_days=None,
+    keep_runs=False,
+    dry_run=False,
+    compression="gzip",
+    today=None,
+):
+    """
+    Fold run directories of data_dir older than min_age_days into the history
+    store at store_dir and delete them (unless keep_runs). Retention: with
+    retention_days, runs and store partitions dated before today minus
+    retention_days are deleted instead. Runs with a checkpoint that is not
+    complete (see runCheckpoint) can still be resumed and are left alone.
+    dry_run only reports what would happen. Returns a summary dict.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    compact_before = str(today - timedelta(days=min_age_days))
+    retain_from = (
+        str(today - timedelta(days=retention_days))
+        if retention_days is not None
+        else ""
+    )
+
+    runs, incomplete = [], 0
+    for name in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, name)
+        if not is_run_dir(path):
+            continue
+        checkpoint = read_checkpoint(path)
+        if checkpoint and not checkpoint.get("complete"):
+            logging.info(f"Skipping {path}, its run has not completed")
+            incomplete += 1
+            continue
+        runs.append({**run_info(path), "path": path})
+    expired = [run for run in runs if run["date"] < retain_from]
+    to_compact = [run for run in runs if retain_from <= run["date"] < compact_before]
+    summary = {
+        "runs_found": len(runs),
+        "runs_incomplete": incomplete,
+        "runs_compacted": len(to_compact),
+        "runs_expired": len(expired),
+        "rows_added": 0,
+        "partitions_dropped": 0,
+    }
+    logging.info(
+        f"{len(runs)} run directories: {len(to_compact)} to compact (before "
+        f"{compact_before}), {len(expired)} past retention"
+    )
+    if dry_run:
+        return summary
+
+    store = HistoryStore(store_dir, compression)
+    if to_compact:
+        summary["rows_added"] = store.add_runs(to_compact)
+        logging.info(
+            f"Compacted {len(to_compact)} runs, {summary['rows_added']} rows, "
+            f"into {store_dir}"
+        )
+    if retain_from:
+        summary["partitions_dropped"] = store.drop_before(retain_from)
+        logging.info(
+            f"Dropped {summary['partitions_dropped']} partitions before {retain_from}"
+        )
+    # Run directories go only once the catalog holding their rows is saved
+    if not keep_runs:
+        for run in [*to_compact, *expired]:
+            shutil.rmtree(run["path"])
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compact run directories into a partitioned history store"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = commands.add_parser("compact", help="Fold old runs into the store")
+    compact_parser.add_argument("--data-dir", default=os.path.join("src", "data"))
+    compact_parser.add_argument(
+        "--store", default=os.path.join("src", "data", "history")
+    )
+    compact_parser.add_argument(
+        "--min-age-days",
+        type=int,
+        default=7,
+        help="Only runs at least this many days old are compacted",
+    )
+    compact_parser.add_argument(
+        "--retention-days",
+        type=int,
+        help="Delete runs and partitions older than this many days",
+    )
+    compact_parser.add_argument(
+        "--keep-runs", action="store_true", help="Keep the compacted run directories"
+    )
+    compact_parser.add_argument("--dry-run", action="store_true")
+    compact_parser.add_argument(
+        "--compression", choices=["gzip", "zstd"], default="gzip"
+    )
+    query_parser = commands.add_parser("query", help="Rows of a table between dates")
+    query_parser.add_argument("--store", default=os.path.join("src", "data", "history"))
+    query_parser.add_argument("--table", required=True, help="e.g. phones")
+    query_parser.add_argument("--start", type=date.fromisoformat)
+    query_parser.add_argument("--end", type=date.fromisoformat)
+    query_parser.add_argument("--output", help="CSV file to write (default: stdout)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    if args.command == "compact":
+        summary = compact(
+            args.data_dir,
+            args.store,
+            args.min_age_days,
+            args.retention_days,
+            args.keep_runs,
+            args.dry_run,
+            args.compression,
+        )
+        print(json.dumps(summary, indent=2))
+    else:
+        store = HistoryStore(args.store)
+        out = (
+            open(args.output, "w", newline="", encoding="utf-8")
+            if args.output
+            else None
+        )
+        writer = csv.DictWriter(
+            out or sys.stdout,
+            fieldnames=store.columns(args.table, args.start, args.end),
+        )
+        writer.writeheader()
+        row_count = 0
+        for row in store.read(args.table, args.start, args.end):
+            writer.writerow(row)
+            row_count += 1
+        if out:
+            out.close()
+        logging.info(f"{row_count} rows of {args.table}")
@@ -1,41 +1,198 @@
+import argparse
 import json
 import csv
 import os
+import sys
 import uuid
 import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import partial
 from datetime import datetime, timezone
 import pyodbc
 import pandas as pd
 from sqlalchemy import create_engine
 
+# Shared party modules live one level up in src/
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
 
-def normalize_key(key: str) -> str:
-    return key.strip().lower()
+from contactNormaliser import CONTACT_COLUMNS, DUPLICATE_COLUMN, ContactNormaliser
+from csvCodecs import EXTENSIONS, header_bytes, open_csv
+from partyDelta import (
+    INSERT,
+    UPDATE,
+    PartyDelta,
+    load_fingerprints,
+    save_fingerprints,
+)
+from partyFlattener import RunFlattener
+from partyIndex import INDEX_FILE, PartyIndex
+from partyPipeline import run_pipeline
+from partySchemaCompiler import load_row_builders
+from partyShards import (
+    map_shards,
+    map_tasks,
+    merge_csv_shards,
+    merge_parquet_shards,
+    merge_unique_shards,
+    remove_shard,
+    shard_path,
+)
+from partyStream import (
+    NdjsonReader,
+    PartyFiles,
+    input_files,
+    ndjson_range_bytes,
+    open_parties,
+)
+from runCheckpoint import (
+    input_position,
+    read_checkpoint,
+    resume_input,
+    write_checkpoint,
+)
+from runMetrics import RunMetrics
+from sql.sqlTableLoader import (
+    SqlKeyDeleter,
+    SqlTableSink,
+    count_rows,
+    create_staging_tables,
+    create_tables,
+    drop_staging_tables,
+    engine_url,
+    mssql_url,
+    publish_staging_tables,
+    sql_engine,
+    table_objects,
+)
+from tableWriters import (
+    PARQUET_SUFFIX,
+    CsvTableWriter,
+    ParquetTableWriter,
+    TeeWriter,
+    output_table_name,
+)
+from utils.loggger import get_logger
 
+RUN_COLUMNS = ["run_guid", "run_date_local", "run_date_utc"]
+MANIFEST_FILE = "manifest.json"
+# Table of every distinct address with address_dimension (partySchemaCompiler)
+DIMENSION_TABLE = "address_dimension"
 
-def flatten_address(
-    addr: dict, party_id: str, run_guid: str, run_date_local: str, run_date_utc: str
-) -> dict:
-    flat = {
-        "partyidentifier": party_id,
-        "run_guid": run_guid,
-        "run_date_local": run_date_local,
-        "run_date_utc": run_date_utc,
-    }
-    if not addr:
-        return flat
-    if "AddressLines" in addr and addr["AddressLines"]:
-        flat["addresslines"] = " | ".join(addr["AddressLines"])
-    if "FormattedAddress" in addr and addr["FormattedAddress"]:
-        for k, v in addr["FormattedAddress"].items():
-            flat[normalize_key(k)] = v
-    return flat
+# Table writes are timed for one party in this many (see RunMetrics.timed_sinks)
+TIMED_EVERY = 16
+
+SQL_TARGET = {
+    "server": "LAPTOP-4HIJQT67\\SQLEXPRESS",
+    "database": "CRMDSL",
+    "user": "sa",
+    "password": "St3fan0p!",
+}
+
+
+def normalize_key(key: str) -> str:
+    return key.strip().lower()
 
 
 def lower_dict_keys(record: dict) -> dict:
     return {normalize_key(k): v for k, v in record.items()}
 
 
+def order_headers(headers) -> list:
+    # partyidentifier first, run columns last, everything else alphabetical
+    ordered_headers = []
+    if "partyidentifier" in headers:
+        ordered_headers.append("partyidentifier")
+    ordered_headers.extend(
+        sorted(h for h in headers if h not in ["partyidentifier", *RUN_COLUMNS])
+    )
+    ordered_headers.extend(tail for tail in RUN_COLUMNS if tail in headers)
+    return ordered_headers
+
+
+def table_headers(
+    schema_path=os.path.join(SRC_DIR, "partyReferenceSchema.json"),
+    layout="run",
+    address_dimension=False,
+    normalise_contacts=False,
+):
+    """
+    Fixed CSV headers per output table, derived from partyReferenceSchema.json.
+    Streaming writers need the header before the first row is seen. The order
+    is order_headers' (partyidentifier, alphabetical, run columns), which is
+    also the field order of the flattener's row tuples.
+    layout="run_manifest" gives the headers without the run columns,
+    address_dimension those of the address dimension tables and
+    normalise_contacts adds the isduplicate column of ContactNormaliser.
+    """
+    rows = load_row_builders(schema_path, layout, address_dimension)
+    headers = {table: list(fields) for table, fields in rows.TABLE_FIELDS.items()}
+    if normalise_contacts:
+        for table in CONTACT_COLUMNS:
+            headers[table] = order_headers([*headers[table], DUPLICATE_COLUMN])
+    return headers
+
+
+def table_column_types(
+    schema_path=os.path.join(SRC_DIR, "partyReferenceSchema.json"),
+    address_dimension=False,
+    normalise_contacts=False,
+):
+    """{table: {column: JSON schema type}} for typed output (Parquet)."""
+    rows = load_row_builders(schema_path, "run", address_dimension)
+    column_types = dict(rows.COLUMN_TYPES)
+    if normalise_contacts:
+        for table in CONTACT_COLUMNS:
+            column_types[table] = {**column_types[table], DUPLICATE_COLUMN: "boolean"}
+    return column_types
+
+
+def output_suffix(output_format="csv", compression=None):
+    # phones.csv, phones.csv.gz, phones.csv.zst or phones.parquet
+    if output_format == "parquet":
+        return PARQUET_SUFFIX
+    return f".csv{EXTENSIONS[compression]}"
+
+
+def file_writer(
+    file_path,
+    fieldnames,
+    output_format="csv",
+    compression=None,
+    column_types=None,
+    header=True,
+):
+    """CsvTableWriter or (output_format="parquet") ParquetTableWriter for one file."""
+    if output_format == "parquet":
+        return ParquetTableWriter(file_path, fieldnames, column_types, compression)
+    return CsvTableWriter(file_path, fieldnames, compression, header)
+
+
+def write_run_manifest(output_dir, run_columns: dict, headers: dict):
+    """
+    Record the run columns once in output_dir/manifest.json, for runs whose
+    CSVs leave them out. Loaders add them back as constant columns (see
+    read_run_manifest), so the tables keep the columns listed under "tables".
+    """
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"run_columns": run_columns, "tables": headers}, f, indent=2)
+    logging.info(f"Run manifest written to {path}")
+    return path
+
+
+def read_run_manifest(csv_dir) -> dict:
+    """Run columns {column: value} of the manifest in csv_dir, {} if there is none."""
+    path = os.path.join(csv_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["run_columns"]
+
+
 def write_csv(file_path, records):
     if not records:
         logging.info(f"No records to write for {file_path}")
@@ -44,21 +201,7 @@ def write_csv(file_path, records):
     headers = set()
     for r in records:
         headers.update(r.keys())
-    ordered_headers = []
-    if "partyidentifier" in headers:
-        ordered_headers.append("partyidentifier")
-    middle_headers = sorted(
-        [
-            h
-            for h in headers
-            if h
-            not in ["partyidentifier", "run_guid", "run_date_local", "run_date_utc"]
-        ]
-    )
-    ordered_headers.extend(middle_headers)
-    for tail in ["run_guid", "run_date_local", "run_date_utc"]:
-        if tail in headers:
-            ordered_headers.append(tail)
+    ordered_headers = order_headers(headers)
     logging.info(f"Writing {len(records)} records to {file_path}")
     with open(file_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=ordered_headers)
@@ -113,146 +256,1189 @@ def write_csv(file_path, records):
 #     logging.info("Bulk upload complete.")
 
 
-def bulk_upload_to_sql(csv_dir, server, database, user, password):
+def read_table_file(file_path) -> pd.DataFrame:
+    """One output table as a DataFrame, from CSV (any codec) or Parquet."""
+    if file_path.endswith(PARQUET_SUFFIX):
+        return pd.read_parquet(file_path)
+    with open_csv(file_path) as f:
+        return pd.read_csv(f)
+
+
+def upload_csv_table(engine, file_path, table_name, constants=None):
+    """
+    Drop/recreate table_name from one CSV (plain, .gz or .zst) or Parquet
+    file, returns (rows, seconds). constants ({column: value}) are added as
+    columns after the file's own.
+    """
+    start = time.perf_counter()
+    logging.info(f"Uploading {file_path} to table {table_name}")
+
+    df = read_table_file(file_path)
+    if constants:
+        df = df.assign(**constants)
+
+    # Drop/recreate table
+    df.to_sql(
+        table_name,
+        engine,
+        if_exists="replace",  # or "append" depending on your needs
+        index=False,
+        method="multi",  # efficient batch insert
+        # Multi-row VALUES stays under SQL Server's 2100 parameter limit
+        chunksize=max(1, 2000 // len(df.columns)),
+    )
+    return len(df), time.perf_counter() - start
+
+
+def bulk_upload_to_sql(
+    csv_dir,
+    server,
+    database,
+    user,
+    password,
+    engine=None,
+    max_workers=1,
+    skip_tables=(),
+    on_uploaded=None,
+):
     """
     Bulk upload each CSV in csv_dir to SQL Server using SQLAlchemy + pyodbc.
-    Tables are dropped/recreated dynamically.
+    Tables are dropped/recreated dynamically. gzip/zstd compressed CSVs
+    (.csv.gz, .csv.zst) and Parquet files are read like plain CSVs.
+    Pass engine to upload somewhere else (e.g. a SQLite stand-in).
+    With max_workers > 1 the tables load concurrently on a thread pool sharing
+    the engine's connection pool, largest file first. A failing table is
+    logged and the others carry on, the failures are raised at the end.
+    If csv_dir has a run manifest its run columns are loaded as constants.
+    skip_tables are left out (e.g. uploaded before a resume), on_uploaded is
+    called with (table, rows) as each table finishes.
+    Returns {table: (rows, seconds)} for the tables that loaded.
+    """
+    if engine is None:
+        engine = create_engine(
+            mssql_url(server, database, user, password),
+            fast_executemany=True,
+            pool_size=max_workers,
+            max_overflow=0,
+        )
+
+    tables = {
+        output_table_name(file): os.path.join(csv_dir, file)
+        for file in os.listdir(csv_dir)
+        if output_table_name(file) is not None
+        and output_table_name(file) not in skip_tables
+    }
+    constants = read_run_manifest(csv_dir)
+
+    start = time.perf_counter()
+    results, failures = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(
+                upload_csv_table, engine, file_path, table_name, constants
+            ): table_name
+            for table_name, file_path in sorted(
+                tables.items(), key=lambda item: os.path.getsize(item[1]), reverse=True
+            )
+        }
+        for future in as_completed(futures):
+            table_name = futures[future]
+            try:
+                rows, seconds = future.result()
+            except Exception as e:
+                failures[table_name] = e
+                logging.error(f"Upload to table {table_name} failed: {e}")
+                continue
+            results[table_name] = (rows, seconds)
+            if on_uploaded is not None:
+                on_uploaded(table_name, rows)
+            logging.info(f"Uploaded {rows} rows to {table_name} in {seconds:.2f}s")
+
+    logging.info(f"Bulk upload complete in {time.perf_counter() - start:.2f}s.")
+    if failures:
+        raise RuntimeError(f"Bulk upload failed for tables: {sorted(failures)}")
+    return results
+
+
+def table_writers(
+    headers,
+    file_paths=None,
+    engine=None,
+    tables=None,
+    batch_size=5000,
+    before_flush=None,
+    constants=None,
+    compression=None,
+    header=True,
+    output_format="csv",
+    address_dimension=False,
+    normalise_contacts=False,
+    load_tables=None,
+):
     """
-    # Build SQLAlchemy connection string
-    conn_str = (
-        f"mssql+pyodbc://{user}:{password}@{server}/{database}"
-        "?driver=ODBC+Driver+17+for+SQL+Server"
+    Writer per output table: a CSV or Parquet file (file_paths), batched
+    database inserts (engine + tables, only load_tables if given) or both.
+    A table with neither is left out. constants are the run columns
+    of a run manifest: rows come without them, files leave them out and
+    inserts add them. compression, header and output_format are passed on to
+    file_writer, Parquet columns are typed from the schema.
+    normalise_contacts puts a ContactNormaliser in front of the emails and
+    phones writers, batch_size rows at a time (headers need its column, see
+    table_headers).
+    """
+    constants = constants or {}
+    column_types = {}
+    if output_format == "parquet":
+        column_types = table_column_types(
+            address_dimension=address_dimension,
+            normalise_contacts=normalise_contacts,
+        )
+    writers = {}
+    for table, fieldnames in headers.items():
+        targets = []
+        if file_paths and table in file_paths:
+            targets.append(
+                file_writer(
+                    file_paths[table],
+                    [f for f in fieldnames if f not in constants],
+                    output_format,
+                    compression,
+                    column_types.get(table),
+                    header,
+                )
+            )
+        if engine is not None and (load_tables is None or table in load_tables):
+            targets.append(
+                SqlTableSink(engine, tables[table], batch_size, before_flush, constants)
+            )
+        if not targets:
+            continue
+        writers[table] = targets[0] if len(targets) == 1 else TeeWriter(*targets)
+        if normalise_contacts and table in CONTACT_COLUMNS:
+            writers[table] = ContactNormaliser(
+                writers[table], table, fieldnames, batch_size
+            )
+    return writers
+
+
+def normaliser_metrics(metrics, writers: dict, prefix=""):
+    # Per-table ContactNormaliser figures, next to the rows written
+    for table, writer in writers.items():
+        if isinstance(writer, ContactNormaliser):
+            metrics.table(prefix + table, **writer.stats())
+
+
+def write_parties(
+    parties,
+    writers: dict,
+    run_columns: dict,
+    metrics=None,
+    run_manifest=False,
+    checkpoint=None,
+    checkpoint_every=None,
+    address_dimension=False,
+):
+    """
+    Stream the rows of every party to the table writers, returns the party count.
+    With metrics the time spent parsing, flattening and writing is recorded
+    under the "flatten" stage, with the rows written per table.
+    run_manifest leaves the run columns out of the rows (see table_writers).
+    checkpoint(party_count) is called after every checkpoint_every parties.
+    address_dimension writes the address dimension tables (see RunFlattener),
+    with the address cache hits and misses recorded in the "flatten" stage.
+    """
+    flattener = RunFlattener(
+        **run_columns, run_manifest=run_manifest, address_dimension=address_dimension
+    )
+    sinks = {table: writer.writerow for table, writer in writers.items()}
+    stage, timed_sinks = nullcontext(), None
+    if metrics is not None:
+        parties = metrics.timed_iter(parties, "flatten")
+        timed_sinks = metrics.timed_sinks(sinks, "flatten", every=TIMED_EVERY)
+        stage = metrics.stage("flatten")
+    party_count = 0
+    with stage:
+        try:
+            for obj in parties:
+                party_count += 1
+                if timed_sinks and party_count % TIMED_EVERY == 0:
+                    flattener.flatten(obj, timed_sinks)
+                else:
+                    flattener.flatten(obj, sinks)
+                if checkpoint and party_count % checkpoint_every == 0:
+                    checkpoint(party_count)
+        finally:
+            for writer in writers.values():
+                writer.close()
+    if metrics is not None:
+        metrics.split_stage("flatten")
+        metrics.table_rows(writers)
+        normaliser_metrics(metrics, writers)
+        if address_dimension:
+            cache = flattener.address_dimension.cache_info()
+            record = metrics.stages["flatten"]
+            record["address_cache_hits"] = cache.hits
+            record["address_cache_misses"] = cache.misses
+    return party_count
+
+
+def write_party_deltas(
+    parties,
+    headers,
+    run_columns,
+    delta: PartyDelta,
+    output_dir=None,
+    engine=None,
+    tables=None,
+    batch_size=5000,
+    metrics=None,
+    run_manifest=False,
+    compression=None,
+    output_format="csv",
+    normalise_contacts=False,
+):
+    """
+    Delta mode: only new and changed parties are flattened, into insert and
+    update row sets per table, and parties missing since the previous run go
+    to delete sets. An update replaces all rows of that party.
+    Files go to output_dir/{insert,update,delete}/<table>.csv (or the
+    suffix of the compression / output_format). With engine the
+    changes are applied directly: rows of new and changed parties are deleted
+    before their new rows are flushed, rows of deleted parties at the end.
+    Fingerprints are only saved once the run is done, so a run that dies is
+    simply run again: its parties come out new or changed once more and
+    their rows are replaced, not inserted twice.
+    Parties without a PartyIdentifier are left out and logged.
+    metrics records the flatten and delete stages like write_parties.
+    With run_manifest the CSVs leave out the run columns.
+    normalise_contacts is passed on to table_writers.
+    Returns the party count.
+    """
+    deleter = SqlKeyDeleter(engine, tables) if engine is not None else None
+    constants = run_columns if run_manifest else None
+    writers = {}
+    for change in (INSERT, UPDATE):
+        file_paths = None
+        if output_dir:
+            os.makedirs(os.path.join(output_dir, change), exist_ok=True)
+            file_paths = {
+                table: os.path.join(
+                    output_dir,
+                    change,
+                    table + output_suffix(output_format, compression),
+                )
+                for table in headers
+            }
+        writers[change] = table_writers(
+            headers,
+            file_paths,
+            engine,
+            tables,
+            batch_size,
+            deleter.flush if deleter else None,
+            constants,
+            compression,
+            output_format=output_format,
+            normalise_contacts=normalise_contacts,
+        )
+
+    flattener = RunFlattener(**run_columns, run_manifest=run_manifest)
+    sinks = {
+        change: {table: writer.writerow for table, writer in change_writers.items()}
+        for change, change_writers in writers.items()
+    }
+    stage, timed_sinks = nullcontext(), None
+    if metrics is not None:
+        parties = metrics.timed_iter(parties, "flatten")
+        timed_sinks = {
+            change: metrics.timed_sinks(change_sinks, "flatten", every=TIMED_EVERY)
+            for change, change_sinks in sinks.items()
+        }
+        stage = metrics.stage("flatten")
+    party_count = 0
+    with stage:
+        try:
+            for obj in parties:
+                party_count += 1
+                change, party_id = delta.classify(obj)
+                if change is None:
+                    continue
+                if deleter:
+                    deleter.add(party_id)
+                if timed_sinks and party_count % TIMED_EVERY == 0:
+                    flattener.flatten(obj, timed_sinks[change])
+                else:
+                    flattener.flatten(obj, sinks[change])
+        finally:
+            for change_writers in writers.values():
+                for writer in change_writers.values():
+                    writer.close()
+
+    deleted = delta.deleted()
+    delete_stage = metrics.stage("delete") if metrics is not None else nullcontext({})
+    with delete_stage as stage:
+        if output_dir and deleted:
+            os.makedirs(os.path.join(output_dir, "delete"), exist_ok=True)
+            run_values = () if run_manifest else tuple(run_columns.values())
+            for table in headers:
+                with file_writer(
+                    os.path.join(
+                        output_dir,
+                        "delete",
+                        table + output_suffix(output_format, compression),
+                    ),
+                    ["partyidentifier", *(() if run_manifest else RUN_COLUMNS)],
+                    output_format,
+                    compression,
+                ) as writer:
+                    for party_id in deleted:
+                        writer.writerow((party_id, *run_values))
+        if deleter:
+            for party_id in deleted:
+                deleter.add(party_id)
+            deleter.flush()
+            stage["rows_deleted"] = deleter.rows_deleted
+            logging.info(f"Deleted {deleter.rows_deleted} replaced or removed rows")
+    if delta.counts["keyless"]:
+        logging.warning(
+            f"Left out {delta.counts['keyless']} parties without a PartyIdentifier"
+        )
+    if metrics is not None:
+        metrics.split_stage("flatten")
+        metrics.stages["flatten"]["keyless_parties"] = delta.counts["keyless"]
+        for change, change_writers in writers.items():
+            metrics.table_rows(change_writers, f"{change}/")
+            normaliser_metrics(metrics, change_writers, f"{change}/")
+        if output_dir and deleted:
+            for table in headers:
+                metrics.table(f"delete/{table}", rows=len(deleted))
+
+    logging.info(
+        f"Delta: {delta.counts[INSERT]} new, {delta.counts[UPDATE]} changed, "
+        f"{delta.counts['unchanged']} unchanged, {len(deleted)} deleted parties"
     )
-    engine = create_engine(conn_str, fast_executemany=True)
+    return party_count
 
-    for file in os.listdir(csv_dir):
-        if file.lower().endswith(".csv"):
-            table_name = os.path.splitext(file)[0]
-            file_path = os.path.join(csv_dir, file)
-            logging.info(f"Uploading {file_path} to table {table_name}")
 
-            # Load CSV into pandas
-            df = pd.read_csv(file_path)
+def flatten_shard(
+    shard_index,
+    parties,
+    shard_dir,
+    headers,
+    run_columns,
+    db_url=None,
+    batch_size=5000,
+    run_manifest=False,
+    compression=None,
+    output_format="csv",
+    address_dimension=False,
+    normalise_contacts=False,
+    csv_output=True,
+    db_tables=None,
+):
+    # Runs in a worker process: one header-less CSV (or Parquet) shard per table
+    # for this chunk of parties (compressed here, in parallel) and/or direct
+    # inserts over the worker's own engine. Address dimension rows are never
+    # inserted here, other workers see the same addresses: they go to a shard
+    # even without csv_output, and process_json loads them once merged.
+    # db_tables are the tables to insert into, by default the run's
+    load_tables = [table for table in headers if table != DIMENSION_TABLE]
+    file_paths = None
+    if shard_dir:
+        suffix = output_suffix(output_format, compression)
+        file_paths = {
+            table: shard_path(shard_dir, table, shard_index, suffix)
+            for table in headers
+            if csv_output or table not in load_tables
+        }
+    engine = sql_engine(db_url) if db_url else None
+    writers = table_writers(
+        headers,
+        file_paths,
+        engine,
+        db_tables or table_objects(headers),
+        batch_size,
+        constants=run_columns if run_manifest else None,
+        compression=compression,
+        header=False,
+        output_format=output_format,
+        address_dimension=address_dimension,
+        normalise_contacts=normalise_contacts,
+        load_tables=load_tables,
+    )
+    metrics = RunMetrics()
+    party_count = write_parties(
+        parties,
+        writers,
+        run_columns,
+        metrics,
+        run_manifest,
+        address_dimension=address_dimension,
+    )
+    return party_count, metrics
+
 
-            # Drop/recreate table
-            df.to_sql(
-                table_name,
+def flatten_file(
+    shard_index,
+    path,
+    shard_dir,
+    headers,
+    run_columns,
+    db_url=None,
+    batch_size=5000,
+    run_manifest=False,
+    compression=None,
+    output_format="csv",
+    address_dimension=False,
+    normalise_contacts=False,
+    csv_output=True,
+):
+    # Runs in a worker process: flatten_shard for one input file of a
+    # multi-file run. The direct load inserts into staging tables of this
+    # file, published to the run's tables in one transaction once the whole
+    # file is in. A file that fails is recorded rather than raised, with its
+    # shard removed and its staging tables dropped, so the run goes on with
+    # the other files
+    start = time.perf_counter()
+    engine = sql_engine(db_url) if db_url else None
+    staged = None
+    try:
+        if engine is not None:
+            staged = create_staging_tables(
                 engine,
-                if_exists="replace",  # or "append" depending on your needs
-                index=False,
-                method="multi",  # efficient batch insert
+                {t: fields for t, fields in headers.items() if t != DIMENSION_TABLE},
+                f"_stage{shard_index:06d}",
             )
+        party_count, metrics = flatten_shard(
+            shard_index,
+            open_parties(path),
+            shard_dir,
+            headers,
+            run_columns,
+            db_url,
+            batch_size,
+            run_manifest,
+            compression,
+            output_format,
+            address_dimension,
+            normalise_contacts,
+            csv_output,
+            staged,
+        )
+        if staged:
+            publish_staging_tables(engine, staged)
+    except Exception as e:
+        metrics = RunMetrics()
+        error = f"{type(e).__name__}: {e}"
+        if shard_dir:
+            remove_shard(shard_dir, shard_index)
+        if staged:
+            drop_staging_tables(engine, staged)
+        metrics.input_file(path, 0, time.perf_counter() - start, error)
+        return 0, metrics
+    metrics.input_file(path, party_count, time.perf_counter() - start)
+    return party_count, metrics
 
-    logging.info("Bulk upload complete.")
 
+class RunOptions(
+    namedtuple(
+        "RunOptions",
+        [
+            "workers",
+            "chunk_size",
+            "load",
+            "csv_output",
+            "batch_size",
+            "upload_workers",
+            "delta",
+            "fingerprint_path",
+            "run_manifest",
+            "compression",
+            "output_format",
+            "party_index",
+            "pipeline",
+            "checkpoint_every",
+            "resume",
+            "address_dimension",
+            "normalise_contacts",
+        ],
+        defaults=[
+            1,
+            5000,
+            "csv",
+            True,
+            5000,
+            1,
+            False,
+            None,
+            False,
+            None,
+            "csv",
+            None,
+            False,
+            None,
+            None,
+            False,
+            False,
+        ],
+    )
+):
+    """
+    Options of a process_json run, given to it as keyword arguments.
+    load="csv" uploads the written CSVs afterwards (bulk_upload_to_sql),
+    upload_workers tables at a time. load="direct" inserts the rows into the
+    database in batches of batch_size while flattening, and files are only
+    written if csv_output is set. load=None skips the upload.
+    workers > 1 flattens chunks of chunk_size parties on a process pool
+    (flatten_sharded), delta=True only the changes since the previous run
+    (flatten_deltas) and pipeline=True overlaps the stages of one run
+    (flatten_pipelined). checkpoint_every and resume checkpoint the
+    sequential path and carry it on (flatten_sequential).
+    run_manifest=True records the run columns once in manifest.json instead
+    of on every CSV row, the upload and direct load add them back as
+    constants.
+    compression ("gzip" or "zstd") streams every CSV through that codec,
+    giving <table>.csv.gz / .csv.zst files that the upload reads
+    transparently. output_format="parquet" writes <table>.parquet instead,
+    with columns typed from partyReferenceSchema.json, in row groups as the
+    rows stream in (compression picks the Parquet codec). csv_output then
+    means file output.
+    party_index is a PartyIndex file (see partyIndex.py) the run's files are
+    added to once written, for PartyIdentifier lookups across runs.
+    address_dimension=True writes every distinct address once, to the
+    address_dimension table keyed by a hash of its normalised content, and
+    only (partyidentifier, address_key) to the three address tables (see
+    partyFlattener.AddressDimension).
+    normalise_contacts=True writes phones in E.164 form and emails trimmed
+    and lower-cased, with an isduplicate column flagging a party's repeats
+    of the same normalised value (see contactNormaliser.ContactNormaliser).
+    """
 
-def process_json(json_data, base_output_dir="src/data"):
-    run_guid = str(uuid.uuid4())
-    run_date_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    run_date_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    __slots__ = ()
+
+    def check(self, multi_file=False):
+        """Raise ValueError for unknown values and options that do not combine."""
+        if self.load not in ("csv", "direct", None):
+            raise ValueError(f"Unknown load mode: {self.load}")
+        if self.output_format not in ("csv", "parquet"):
+            raise ValueError(f"Unknown output format: {self.output_format}")
+        if self.load == "csv" and not self.csv_output:
+            raise ValueError("load='csv' needs csv_output")
+        if self.delta and self.load == "csv":
+            raise ValueError("delta mode needs load='direct' or load=None")
+        if self.pipeline and (self.load == "csv" or self.delta or self.workers > 1):
+            raise ValueError(
+                "pipeline mode needs load='direct' or load=None, no delta and one worker"
+            )
+        if self.checkpoint_every and (
+            self.delta
+            or self.pipeline
+            or self.workers > 1
+            or self.output_format != "csv"
+        ):
+            raise ValueError(
+                "checkpoints need CSV output, one worker and no delta or pipeline"
+            )
+        if self.address_dimension and (self.delta or self.checkpoint_every):
+            raise ValueError("address_dimension does not support delta or checkpoints")
+        if multi_file and (self.delta or self.pipeline or self.checkpoint_every):
+            raise ValueError(
+                "multi-file input does not support delta, pipeline or checkpoints"
+            )
+
+
+class JsonRun:
+    """
+    What the flatten_* functions share about one process_json run: its
+    options, run columns and output directory, the table headers and
+    output files (file_paths, None without file output), the direct-load
+    engine and tables (None without), metrics and the checkpoint ({}
+    without checkpoints).
+    """
+
+    def __init__(
+        self,
+        options: RunOptions,
+        run_columns: dict,
+        output_dir,
+        headers: dict,
+        file_paths,
+        engine,
+        tables,
+        metrics: RunMetrics,
+        checkpoint: dict,
+    ):
+        self.options = options
+        self.run_columns = run_columns
+        self.output_dir = output_dir
+        self.headers = headers
+        self.file_paths = file_paths
+        self.engine = engine
+        self.tables = tables
+        self.metrics = metrics
+        self.checkpoint = checkpoint
+
+    @property
+    def constants(self):
+        # Run columns the writers add to every row, None with a run manifest
+        return self.run_columns if self.options.run_manifest else None
+
+    @property
+    def load_engine(self):
+        return self.engine if self.options.load == "direct" else None
+
+
+def flatten_deltas(json_data, run: JsonRun):
+    """
+    Emit only the parties that are new, changed or gone since the previous
+    run (see write_party_deltas), using the PartyIdentifier -> fingerprint
+    store at options.fingerprint_path. Deltas are flattened in this process.
+    """
+    options = run.options
+    previous = load_fingerprints(options.fingerprint_path)
+    logging.info(
+        f"Delta against {len(previous)} fingerprints in {options.fingerprint_path}"
+    )
+    tracker = PartyDelta(previous)
+    party_count = write_party_deltas(
+        json_data,
+        run.headers,
+        run.run_columns,
+        tracker,
+        run.output_dir if options.csv_output else None,
+        run.load_engine,
+        run.tables,
+        options.batch_size,
+        run.metrics,
+        options.run_manifest,
+        options.compression,
+        options.output_format,
+        options.normalise_contacts,
+    )
+    save_fingerprints(options.fingerprint_path, tracker.current)
+    return party_count
+
+
+def flatten_sharded(json_data, run: JsonRun):
+    """
+    Flatten chunks of options.chunk_size parties on a process pool and merge
+    the shards back in input order, giving the same files as one worker.
+    An NdjsonReader is split into line-aligned byte ranges of about
+    chunk_size parties instead, which the workers read and parse themselves.
+    With the address dimension the shards are merged keeping the first row
+    per key, and the direct load inserts the dimension from that merge.
+    json_data can also be a PartyFiles (partyStream.input_files of a
+    directory or glob): each file is flattened as one shard by one of the
+    workers, which reads it itself, and the shards merged in file order
+    under the one run_guid. The direct load stages each file's rows and
+    publishes them in one transaction once the file is done. A file that
+    fails (bad JSON, a row the writers reject) is left out, with its shard
+    and staged rows dropped, and the run carries on; every file's parties,
+    seconds and error are listed under "files" in metrics.json.
+    """
+    options, metrics, headers = run.options, run.metrics, run.headers
+    logging.info(f"Flattening on {options.workers} worker processes")
+    shard_dir = None
+    # The address dimension is merged from shards for the direct load too
+    merge_dimension = options.address_dimension and options.load == "direct"
+    if options.csv_output or merge_dimension:
+        shard_dir = os.path.join(run.output_dir, "_shards")
+        os.makedirs(shard_dir, exist_ok=True)
+    party_count, shard_count = 0, 0
+    shard_args = (
+        shard_dir,
+        headers,
+        run.run_columns,
+        engine_url(run.engine) if options.load == "direct" else None,
+        options.batch_size,
+        options.run_manifest,
+        options.compression,
+        options.output_format,
+        options.address_dimension,
+        options.normalise_contacts,
+        options.csv_output,
+    )
+    multi_file = isinstance(json_data, PartyFiles)
+    if multi_file:
+        logging.info(f"Flattening {len(json_data.paths)} input files")
+        shards = map_tasks(flatten_file, json_data.paths, options.workers, *shard_args)
+    elif isinstance(json_data, NdjsonReader):
+        # Line-aligned byte ranges of about chunk_size parties, each
+        # worker reads and parses its own
+        ranges = json_data.split(ndjson_range_bytes(json_data.path, options.chunk_size))
+        logging.info(f"Splitting {json_data.path} into {len(ranges)} ranges")
+        shards = map_tasks(flatten_shard, ranges, options.workers, *shard_args)
+    else:
+        shards = map_shards(
+            flatten_shard,
+            metrics.timed_iter(json_data, "flatten"),
+            options.workers,
+            options.chunk_size,
+            *shard_args,
+        )
+    with metrics.stage("flatten"):
+        for count, shard_metrics in shards:
+            party_count += count
+            shard_count += 1
+            metrics.merge(shard_metrics)
+    failed = [f for f in metrics.files if f["error"]]
+    for f in failed:
+        logging.error(f"Input file {f['file']} failed and was left out: {f['error']}")
+    if multi_file:
+        logging.info(
+            f"{len(json_data.paths) - len(failed)} of {len(json_data.paths)} "
+            "input files loaded"
+        )
+    if shard_dir:
+        with metrics.stage("merge"):
+            constants = run.run_columns if options.run_manifest else ()
+            suffix = output_suffix(options.output_format, options.compression)
+            for table in headers:
+                if not options.csv_output and table != DIMENSION_TABLE:
+                    continue
+                shard_paths = [
+                    shard_path(shard_dir, table, i, suffix) for i in range(shard_count)
+                ]
+                fieldnames = [f for f in headers[table] if f not in constants]
+                if table == DIMENSION_TABLE:
+                    # One row per key, loaded here rather than by the workers
+                    writers = table_writers(
+                        {table: headers[table]},
+                        run.file_paths,
+                        run.engine if merge_dimension else None,
+                        run.tables,
+                        options.batch_size,
+                        constants=run.constants,
+                        compression=options.compression,
+                        output_format=options.output_format,
+                        address_dimension=True,
+                    )
+                    merge_unique_shards(shard_paths, writers[table])
+                    continue
+                file_path = run.file_paths[table]
+                if options.output_format == "parquet":
+                    merge_parquet_shards(shard_paths, file_path, options.compression)
+                    continue
+                merge_csv_shards(
+                    shard_paths,
+                    file_path,
+                    header_bytes(fieldnames, options.compression),
+                )
+            os.rmdir(shard_dir)
+    return party_count
+
+
+def flatten_pipelined(json_data, run: JsonRun):
+    """
+    Overlap parsing, flattening, the file writes and the direct load (see
+    partyPipeline.run_pipeline), each table's file and database inserts fed
+    from bounded queues. Flattening runs in one worker process, the other
+    stages in this one. It pays off when the load waits on database round
+    trips; parties and rows are pickled across to the flatten process, so
+    CPU-bound runs are faster with workers > 1.
+    """
+    options, metrics = run.options, run.metrics
+    stages = {}
+    if options.csv_output:
+        stages["write"] = table_writers(
+            run.headers,
+            run.file_paths,
+            constants=run.constants,
+            compression=options.compression,
+            output_format=options.output_format,
+            address_dimension=options.address_dimension,
+            normalise_contacts=options.normalise_contacts,
+        )
+    if options.load == "direct":
+        stages["load"] = table_writers(
+            run.headers,
+            None,
+            run.engine,
+            run.tables,
+            options.batch_size,
+            constants=run.constants,
+            normalise_contacts=options.normalise_contacts,
+        )
+    logging.info(f"Pipelining parse, flatten and {', '.join(stages)} stages")
+    party_count = run_pipeline(
+        json_data,
+        partial(
+            RunFlattener,
+            **run.run_columns,
+            run_manifest=options.run_manifest,
+            address_dimension=options.address_dimension,
+        ),
+        stages,
+        metrics=metrics,
+    )
+    for stage, writers in stages.items():
+        metrics.table_rows(writers, "" if stage == "write" else "load/")
+        normaliser_metrics(metrics, writers, "" if stage == "write" else "load/")
+    return party_count
+
+
+def flatten_sequential(json_data, run: JsonRun):
+    """
+    Flatten in this process, straight into the table writers. With
+    options.checkpoint_every=N a checkpoint (runCheckpoint) is recorded in
+    the run directory every N parties: the input offset, the rows and bytes
+    flushed per file and the rows loaded per table. options.resume carries
+    a run on from its last checkpoint: files are cut back to it, rows the
+    direct load inserted since are not inserted again and a run that had
+    finished flattening goes straight on to its upload. json_data should be
+    a JsonArrayReader or NdjsonReader so the input is resumed by byte
+    offset, other iterables skip the parties done.
+    Returns the run's party count, including those before a resume.
+    """
+    options, checkpoint = run.options, run.checkpoint
+    parties_before = checkpoint.get("parties", 0)
+    if checkpoint.get("flatten_complete"):
+        logging.info("Flattening finished before the resume")
+        return parties_before
+    writers = table_writers(
+        run.headers,
+        run.file_paths,
+        run.load_engine,
+        run.tables,
+        options.batch_size,
+        constants=run.constants,
+        compression=options.compression,
+        output_format=options.output_format,
+        address_dimension=options.address_dimension,
+        normalise_contacts=options.normalise_contacts,
+    )
+    if options.resume:
+        for table, writer in writers.items():
+            state = {"rows": 0, "bytes": 0, "loaded": 0}
+            state.update(checkpoint["tables"].get(table, {}))
+            if options.load == "direct":
+                state["in_table"] = count_rows(
+                    run.engine,
+                    run.tables[table],
+                    run_guid=run.run_columns["run_guid"],
+                )
+            writer.resume(state)
+        json_data = resume_input(json_data, checkpoint)
+
+    def save_checkpoint(count):
+        checkpoint.update(input_position(json_data, parties_before + count))
+        checkpoint["tables"] = {
+            table: writer.checkpoint() for table, writer in writers.items()
+        }
+        write_checkpoint(run.output_dir, checkpoint)
+
+    party_count = parties_before + write_parties(
+        json_data,
+        writers,
+        run.run_columns,
+        run.metrics,
+        options.run_manifest,
+        save_checkpoint if options.checkpoint_every else None,
+        options.checkpoint_every,
+        options.address_dimension,
+    )
+    if options.checkpoint_every:
+        save_checkpoint(party_count - parties_before)
+        checkpoint["flatten_complete"] = True
+        write_checkpoint(run.output_dir, checkpoint)
+    return party_count
+
+
+def process_json(json_data, base_output_dir="src/data", engine=None, **options):
+    """
+    Flatten parties into per-table files and load them, options are the
+    RunOptions fields.
+    json_data can be a list or any iterable of party objects (e.g. a
+    JsonArrayReader or NdjsonReader, see partyStream.open_parties), rows are
+    streamed to the table writers so memory is bounded by one party, or a
+    PartyFiles of several input files. engine defaults to the SQL_TARGET
+    server. Each run writes to its own base_output_dir/<run_guid> directory,
+    and flattens by one of flatten_deltas, flatten_sharded,
+    flatten_pipelined or flatten_sequential.
+    Stage and per-table metrics (see RunMetrics) are written to metrics.json in
+    the run's output directory, after flattening and again after the upload.
+    """
+    options = RunOptions(**options)
+    checkpoint = {}
+    if options.resume:
+        checkpoint = read_checkpoint(os.path.join(base_output_dir, options.resume))
+        if not checkpoint:
+            raise ValueError(f"Run {options.resume} has no checkpoint to resume from")
+        if checkpoint.get("complete"):
+            logging.info(f"Run {options.resume} is already complete")
+            return
+        # The rest of the run goes on as it started
+        options = options._replace(
+            **checkpoint["options"],
+            checkpoint_every=options.checkpoint_every or checkpoint["checkpoint_every"],
+        )
+    multi_file = isinstance(json_data, PartyFiles)
+    options.check(multi_file)
+    if checkpoint:
+        run_columns = checkpoint["run_columns"]
+        run_guid, run_date_local, run_date_utc = run_columns.values()
+        logging.info(f"Resuming run after {checkpoint['parties']} parties")
+    else:
+        run_guid = str(uuid.uuid4())
+        run_date_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        run_date_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        run_columns = {
+            "run_guid": run_guid,
+            "run_date_local": run_date_local,
+            "run_date_utc": run_date_utc,
+        }
     output_dir = os.path.join(base_output_dir, run_guid)
     os.makedirs(output_dir, exist_ok=True)
+    metrics = RunMetrics()
 
     logging.info(f"Run GUID: {run_guid}")
     logging.info(f"Run Local Date: {run_date_local}")
     logging.info(f"Run UTC Date: {run_date_utc}")
     logging.info(f"Output directory: {output_dir}")
 
-    emails, phones, postal_addresses, physical_addresses, previous_addresses = (
-        [],
-        [],
-        [],
-        [],
-        [],
+    headers = table_headers(
+        address_dimension=options.address_dimension,
+        normalise_contacts=options.normalise_contacts,
+    )
+    if options.fingerprint_path is None:
+        options = options._replace(
+            fingerprint_path=os.path.join(base_output_dir, "fingerprints.csv")
+        )
+    file_paths = None
+    if options.csv_output:
+        suffix = output_suffix(options.output_format, options.compression)
+        file_paths = {
+            table: os.path.join(output_dir, table + suffix) for table in headers
+        }
+        if options.run_manifest and not checkpoint:
+            write_run_manifest(output_dir, run_columns, headers)
+    tables = None
+    if options.load == "direct":
+        if engine is None:
+            engine = sql_engine(mssql_url(**SQL_TARGET))
+        logging.info(f"Loading rows directly into {engine.url.database}")
+        # Delta runs apply changes to the existing tables, unless there is no
+        # fingerprint store yet and this is the first (full) load. A resumed
+        # run carries on in its tables
+        tables = create_tables(
+            engine,
+            headers,
+            replace=not (
+                options.delta and os.path.exists(options.fingerprint_path) or checkpoint
+            ),
+        )
+    if options.checkpoint_every:
+        checkpoint = checkpoint or {
+            "run_columns": run_columns,
+            "options": {
+                "load": options.load,
+                "csv_output": options.csv_output,
+                "run_manifest": options.run_manifest,
+                "compression": options.compression,
+                "normalise_contacts": options.normalise_contacts,
+            },
+            "checkpoint_every": options.checkpoint_every,
+            "parties": 0,
+            "tables": {},
+            "flatten_complete": False,
+            "uploads": {},
+        }
+    run = JsonRun(
+        options,
+        run_columns,
+        output_dir,
+        headers,
+        file_paths,
+        engine,
+        tables,
+        metrics,
+        checkpoint,
     )
 
     logging.info("Starting JSON processing...")
-    for obj in json_data:
-        details = None
-        for k, v in obj.items():
-            if normalize_key(k) in ["individualdetails", "organisationdetails"]:
-                details = v
-                break
-        if not details:
-            continue
-        party_id = details.get("PartyIdentifier")
-
-        for email in details.get("Emails", []):
-            rec = {
-                "partyidentifier": party_id,
-                "run_guid": run_guid,
-                "run_date_local": run_date_local,
-                "run_date_utc": run_date_utc,
-            }
-            rec.update(email)
-            emails.append(rec)
-
-        for phone in details.get("Phones", []):
-            rec = {
-                "partyidentifier": party_id,
-                "run_guid": run_guid,
-                "run_date_local": run_date_local,
-                "run_date_utc": run_date_utc,
-            }
-            rec.update(phone)
-            phones.append(rec)
-
-        if details.get("PhysicalAddress"):
-            physical_addresses.append(
-                flatten_address(
-                    details["PhysicalAddress"],
-                    party_id,
-                    run_guid,
-                    run_date_local,
-                    run_date_utc,
-                )
-            )
-        if details.get("PostalAddress"):
-            postal_addresses.append(
-                flatten_address(
-                    details["PostalAddress"],
-                    party_id,
-                    run_guid,
-                    run_date_local,
-                    run_date_utc,
-                )
-            )
-        if details.get("PreviousPhysicalAddress"):
-            previous_addresses.append(
-                flatten_address(
-                    details["PreviousPhysicalAddress"],
-                    party_id,
-                    run_guid,
-                    run_date_local,
-                    run_date_utc,
-                )
-            )
+    parties_before = checkpoint.get("parties", 0)
+    if options.delta:
+        flatten = flatten_deltas
+    elif options.workers > 1 or multi_file:
+        flatten = flatten_sharded
+    elif options.pipeline:
+        flatten = flatten_pipelined
+    else:
+        flatten = flatten_sequential
+    party_count = flatten(json_data, run)
 
-    logging.info("Finished processing JSON. Writing CSVs...")
-    write_csv(os.path.join(output_dir, "emails.csv"), emails)
-    write_csv(os.path.join(output_dir, "phones.csv"), phones)
-    write_csv(os.path.join(output_dir, "physical_addresses.csv"), physical_addresses)
-    write_csv(os.path.join(output_dir, "postal_addresses.csv"), postal_addresses)
-    write_csv(
-        os.path.join(output_dir, "previous_physical_addresses.csv"), previous_addresses
-    )
+    logging.info(f"Finished processing {party_count} parties.")
+    if options.party_index and options.csv_output:
+        with metrics.stage("index"), PartyIndex(options.party_index) as index:
+            index.add_run(output_dir, run_date_utc, run.constants or {})
+    metrics.csv_bytes(output_dir)
+    metrics_path = os.path.join(output_dir, "metrics.json")
+    run_metrics = {
+        "run_guid": run_guid,
+        "run_date_utc": run_date_utc,
+        "parties": party_count,
+        "load": options.load,
+        "workers": options.workers,
+        "delta": options.delta,
+        "run_manifest": options.run_manifest,
+        "compression": options.compression,
+        "output_format": options.output_format,
+        "pipeline": options.pipeline,
+        "address_dimension": options.address_dimension,
+        "normalise_contacts": options.normalise_contacts,
+        "resumed_after": parties_before if options.resume else None,
+    }
+    # Written now as well, so a failed upload still leaves the flatten metrics
+    metrics.write(metrics_path, **run_metrics)
 
-    logging.info("CSV files written. Starting bulk upload...")
-    bulk_upload_to_sql(
-        output_dir,
-        server="LAPTOP-4HIJQT67\\SQLEXPRESS",
-        database="CRMDSL",
-        user="sa",
-        password="St3fan0p!",
-    )
+    def record_upload(table, rows):
+        checkpoint["uploads"][table] = rows
+        write_checkpoint(output_dir, checkpoint)
+
+    if options.load == "csv":
+        logging.info("Starting bulk upload...")
+        with metrics.stage("upload"):
+            uploaded = bulk_upload_to_sql(
+                output_dir,
+                **SQL_TARGET,
+                engine=engine,
+                max_workers=options.upload_workers,
+                skip_tables=checkpoint.get("uploads", {}),
+                on_uploaded=record_upload if options.checkpoint_every else None,
+            )
+        for table, (rows, seconds) in uploaded.items():
+            metrics.table(table, upload_rows=rows, upload_seconds=round(seconds, 3))
+        metrics.write(metrics_path, **run_metrics)
+    elif options.load == "direct":
+        logging.info("Direct load complete.")
+    if options.checkpoint_every:
+        checkpoint["complete"] = True
+        write_checkpoint(output_dir, checkpoint)
+
+    for name, stage in metrics.stages.items():
+        logging.info(
+            f"Stage {name}: {stage['wall_seconds']:.2f}s wall, "
+            f"{stage['cpu_seconds']:.2f}s CPU, peak RSS {stage['peak_rss_mb']} MB"
+        )
+    logging.info(f"Metrics written to {metrics_path}")
 
 
 if __name__ == "__main__":
-    logging.basicConfig(
-        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-    )
-    input_path = os.path.join("src", "json", "input.json")
-    logging.info(f"Loading input JSON from {input_path}")
-    with open(input_path, "r", encoding="utf-8") as f:
-        sample_json = json.load(f)
-    process_json(sample_json, base_output_dir=os.path.join("src", "data"))
+    parser = argparse.ArgumentParser(description="Flatten party JSON and upload")
+    parser.add_argument(
+        "--input",
+        default=os.path.join("src", "json", "input.json"),
+        help="Input JSON array or NDJSON (one party per line), or a directory "
+        "or glob of them, flattened one file per worker",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes for flattening"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=5000, help="Parties per worker shard"
+    )
+    parser.add_argument(
+        "--load",
+        choices=["csv", "direct", "none"],
+        default="csv",
+        help="Upload the CSVs afterwards, or insert rows directly while flattening",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Only new, changed and deleted parties since the previous run",
+    )
+    parser.add_argument(
+        "--no-csv", action="store_true", help="Skip CSV output (direct load only)"
+    )
+    parser.add_argument(
+        "--run-manifest",
+        action="store_true",
+        help="Record the run columns once in manifest.json instead of on every row",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["gzip", "zstd"],
+        help="Compress the CSVs as they are written (the Parquet codec with --format)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Output file format, Parquet columns are typed from the schema",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        help="Record a checkpoint every N parties so the run can be resumed",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_GUID",
+        help="Carry on a run that died from its last checkpoint",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap parsing, flattening (in a process), writing and the direct "
+        "load, for a database with slow round trips",
+    )
+    parser.add_argument(
+        "--address-dimension",
+        action="store_true",
+        help="Write each distinct address once, keyed, and only keys per party",
+    )
+    parser.add_argument(
+        "--normalise-contacts",
+        action="store_true",
+        help="Phones in E.164 form, emails trimmed and lower-cased, repeats flagged",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help=f"Add the run to the PartyIdentifier index (src/data/{INDEX_FILE})",
+    )
+    parser.add_argument(
+        "--db-url", help="SQLAlchemy URL to load into instead of SQL_TARGET"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="Rows per insert batch"
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=1,
+        help="Tables uploaded concurrently with --load csv",
+    )
+    args = parser.parse_args()
+
+    # Root logger: queued console output shared by the streaming writers
+    get_logger(None, log_file=None)
+    inputs = input_files(args.input)
+    if len(inputs) > 1:
+        logging.info(f"Reading {len(inputs)} input files from {args.input}")
+        json_data = PartyFiles(inputs)
+    else:
+        logging.info(f"Streaming input JSON from {inputs[0]}")
+        json_data = open_parties(inputs[0])
+    process_json(
+        json_data,
+        base_output_dir=os.path.join("src", "data"),
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        load=None if args.load == "none" else args.load,
+        csv_output=not args.no_csv,
+        engine=sql_engine(args.db_url) if args.db_url else None,
+        batch_size=args.batch_size,
+        upload_workers=args.upload_workers,
+        delta=args.delta,
+        run_manifest=args.run_manifest,
+        compression=args.compression,
+        output_format=args.format,
+        pipeline=args.pipeline,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume,
+        address_dimension=args.address_dimension,
+        normalise_contacts=args.normalise_contacts,
+        party_index=os.path.join("src", "data", INDEX_FILE) if args.index else None,
+    )
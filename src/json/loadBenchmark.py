@@ -0,0 +1,86 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, inspect, text
+
+from inputJsonParser import process_json
+
+
+def repeated_parties(parties, repeat):
+    # Copies of the sample parties with unique PartyIdentifiers
+    for i in range(repeat):
+        for party in parties:
+            party = copy.deepcopy(party)
+            for details in party.values():
+                if isinstance(details, dict) and "PartyIdentifier" in details:
+                    details["PartyIdentifier"] = f"{details['PartyIdentifier']}-{i}"
+            yield party
+
+
+def count_rows(engine):
+    with engine.connect() as conn:
+        return sum(
+            conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            for table in inspect(engine).get_table_names()
+        )
+
+
+def run_load(label, parties, work_dir, **kwargs):
+    db_path = os.path.join(work_dir, f"{label}.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    start = time.perf_counter()
+    process_json(
+        parties, base_output_dir=os.path.join(work_dir, label), engine=engine, **kwargs
+    )
+    elapsed = time.perf_counter() - start
+    rows = count_rows(engine)
+    engine.dispose()
+    return {"mode": label, "seconds": round(elapsed, 3), "rows": rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare CSV + bulk_upload_to_sql with the direct load path "
+        "against a SQLite stand-in"
+    )
+    parser.add_argument(
+        "--input", default=os.path.join("src", "json", "input.json"), help="Input JSON"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10000, help="Copies of the input parties"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="Rows per insert batch"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        sample = json.load(f)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, kwargs in [
+            ("csv_then_upload", {"load": "csv"}),
+            ("direct", {"load": "direct", "csv_output": False}),
+            ("direct_and_csv", {"load": "direct"}),
+        ]:
+            result = run_load(
+                label,
+                repeated_parties(sample, args.repeat),
+                work_dir,
+                batch_size=args.batch_size,
+                **kwargs,
+            )
+            result["rows_per_sec"] = round(result["rows"] / result["seconds"])
+            results.append(result)
+            print(
+                f"{label:<16} {result['seconds']:>8.2f}s {result['rows']:>10} rows "
+                f"{result['rows_per_sec']:>10} rows/s"
+            )
+    print(json.dumps(results, indent=2))
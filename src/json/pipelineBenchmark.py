@@ -0,0 +1,404 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+
+# inputJsonParser puts src/ on sys.path for the shared modules below
+from inputJsonParser import (
+    SRC_DIR,
+    bulk_upload_to_sql,
+    process_json,
+    read_table_file,
+)
+from csvCodecs import codec_available, open_csv
+from loadBenchmark import count_rows
+from partyGenerator import generate_parties, write_json_array
+from partyReferenceSchema import process_party
+from partyReferenceValidation import iter_parties, validate_parties
+from partyStream import iter_json_array
+from runMetrics import peak_rss_mb
+from tableWriters import PARQUET_SUFFIX, output_table_name, parquet_available
+
+STAGES = [
+    "generate",
+    "parse",
+    "validate_jsonschema",
+    "validate_compiled",
+    "process_party",
+    "process_json_csv",
+    "process_json_csv_gzip",
+    "process_json_csv_zstd",
+    "process_json_parquet",
+    "scan_csv",
+    "scan_parquet",
+    "process_json_upload",
+    "process_json_direct",
+]
+
+
+# (format, compression) of each file output stage, their output size is
+# recorded as well
+OUTPUT_STAGES = {
+    "process_json_csv": ("csv", None),
+    "process_json_csv_gzip": ("csv", "gzip"),
+    "process_json_csv_zstd": ("csv", "zstd"),
+    "process_json_parquet": ("parquet", None),
+}
+
+# Stages that read the output of another stage
+STAGE_INPUTS = {
+    "scan_csv": "process_json_csv",
+    "scan_parquet": "process_json_parquet",
+    "process_json_upload": "process_json_csv",
+}
+
+
+def output_row_count(output_dir):
+    total = 0
+    for file in os.listdir(output_dir):
+        path = os.path.join(output_dir, file)
+        if file.endswith(PARQUET_SUFFIX):
+            import pyarrow.parquet as pq
+
+            total += pq.ParquetFile(path).metadata.num_rows
+        elif output_table_name(file) is not None:
+            with open_csv(path) as f:
+                total += sum(1 for _ in csv.reader(f)) - 1
+    return total
+
+
+def dir_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(path)
+        for file in files
+        if output_table_name(file) is not None
+    )
+
+
+def missing_package(stage):
+    # What an output stage (or a stage reading its output) needs but is missing
+    output_format, compression = OUTPUT_STAGES.get(
+        STAGE_INPUTS.get(stage, stage), ("csv", None)
+    )
+    if output_format == "parquet" and not parquet_available():
+        return "pyarrow"
+    if not codec_available(compression):
+        return compression
+    return None
+
+
+def run_dir(ctx, stage):
+    # The process_json run directory written by an output stage
+    stage_dir = os.path.join(ctx["work_dir"], stage)
+    (run_guid,) = os.listdir(stage_dir)
+    return os.path.join(stage_dir, run_guid)
+
+
+def run_generate(ctx):
+    count = write_json_array(
+        ctx["input"],
+        generate_parties(
+            ctx["parties"], ctx["seed"], ctx["organisation_ratio"], ctx["invalid_ratio"]
+        ),
+    )
+    return count, count
+
+
+def run_parse(ctx):
+    count = sum(1 for _ in iter_json_array(ctx["input"]))
+    return count, count
+
+
+def run_validate(ctx, backend):
+    party_count, _, _ = validate_parties(
+        iter_parties(ctx["input"]),
+        os.path.join(SRC_DIR, "partyReferenceSchema.json"),
+        workers=ctx["workers"],
+        backend=backend,
+    )
+    return party_count, party_count
+
+
+def run_process_party(ctx):
+    load_id = str(uuid.uuid4())
+    load_date = datetime.utcnow().isoformat() + "Z"
+    party_count, row_count = 0, 0
+    for party in iter_json_array(ctx["input"]):
+        party_count += 1
+        row_count += sum(map(len, process_party(party, load_id, load_date)))
+    return party_count, row_count
+
+
+def run_process_json_output(ctx, stage="process_json_csv"):
+    output_format, compression = OUTPUT_STAGES[stage]
+    process_json(
+        iter_json_array(ctx["input"]),
+        base_output_dir=os.path.join(ctx["work_dir"], stage),
+        workers=ctx["workers"],
+        load=None,
+        compression=compression,
+        output_format=output_format,
+    )
+    return ctx["parties"], lambda: output_row_count(run_dir(ctx, stage))
+
+
+def run_scan(ctx, stage):
+    # A downstream rescan: every table of an output read back into pandas
+    output_dir = run_dir(ctx, STAGE_INPUTS[stage])
+    row_count = sum(
+        len(read_table_file(os.path.join(output_dir, file)))
+        for file in os.listdir(output_dir)
+        if output_table_name(file) is not None
+    )
+    return ctx["parties"], row_count
+
+
+def run_process_json_upload(ctx):
+    # Uploads the CSVs of process_json_csv into a SQLite stand-in
+    engine = create_engine(f"sqlite:///{os.path.join(ctx['work_dir'], 'upload.db')}")
+    results = bulk_upload_to_sql(
+        run_dir(ctx, "process_json_csv"),
+        None,
+        None,
+        None,
+        None,
+        engine=engine,
+        max_workers=ctx["upload_workers"],
+    )
+    engine.dispose()
+    return ctx["parties"], sum(rows for rows, _ in results.values())
+
+
+def run_process_json_direct(ctx):
+    engine = create_engine(f"sqlite:///{os.path.join(ctx['work_dir'], 'direct.db')}")
+    process_json(
+        iter_json_array(ctx["input"]),
+        base_output_dir=os.path.join(ctx["work_dir"], "direct"),
+        workers=ctx["workers"],
+        load="direct",
+        csv_output=False,
+        engine=engine,
+    )
+    return ctx["parties"], lambda: count_rows(engine)
+
+
+STAGE_RUNNERS = {
+    "generate": run_generate,
+    "parse": run_parse,
+    "validate_jsonschema": lambda ctx: run_validate(ctx, "jsonschema"),
+    "validate_compiled": lambda ctx: run_validate(ctx, "compiled"),
+    "process_party": run_process_party,
+    **{
+        stage: lambda ctx, stage=stage: run_process_json_output(ctx, stage)
+        for stage in OUTPUT_STAGES
+    },
+    "scan_csv": lambda ctx: run_scan(ctx, "scan_csv"),
+    "scan_parquet": lambda ctx: run_scan(ctx, "scan_parquet"),
+    "process_json_upload": run_process_json_upload,
+    "process_json_direct": run_process_json_direct,
+}
+
+
+def measure_stage(stage, ctx):
+    # Runs in a fresh process, so peak RSS belongs to this stage alone
+    logging.getLogger().setLevel(logging.WARNING)
+    start = time.perf_counter()
+    party_count, row_count = STAGE_RUNNERS[stage](ctx)
+    seconds = time.perf_counter() - start
+    # Stages that only write their rows count them once the timer has stopped
+    if callable(row_count):
+        row_count = row_count()
+    return {
+        "stage": stage,
+        "seconds": round(seconds, 3),
+        "parties": party_count,
+        "rows": row_count,
+        "parties_per_sec": round(party_count / seconds),
+        "rows_per_sec": round(row_count / seconds),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_benchmark(
+    parties,
+    stages=STAGES,
+    work_dir=None,
+    seed=0,
+    organisation_ratio=0.3,
+    invalid_ratio=0.0,
+    workers=1,
+    upload_workers=1,
+):
+    """
+    Generate `parties` synthetic parties and time each stage on them, one fresh
+    process per stage. Rows are output rows for the flattening and load stages
+    and parties for generate/parse/validate. The file output stages also
+    record their output size: process_json_csv_<codec> once per compression
+    codec and process_json_parquet, which scan_csv / scan_parquet then read
+    back like a downstream rescan. Stages whose packages (zstd, pyarrow) are
+    not installed are skipped. Returns the list of stage results.
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        ctx = {
+            "parties": parties,
+            "seed": seed,
+            "organisation_ratio": organisation_ratio,
+            "invalid_ratio": invalid_ratio,
+            "workers": workers,
+            "upload_workers": upload_workers,
+            "work_dir": tmp_dir,
+            "input": os.path.join(tmp_dir, "parties.json"),
+        }
+        # Every stage reads the generated input, upload and scans another output
+        selected = {"generate", *stages}
+        selected.update(STAGE_INPUTS[s] for s in stages if s in STAGE_INPUTS)
+        for stage in sorted(selected):
+            missing = missing_package(stage)
+            if missing:
+                logging.warning(f"Skipping {stage}: {missing} is not available")
+                selected.discard(stage)
+
+        results = []
+        for stage in [s for s in STAGES if s in selected]:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(measure_stage, stage, ctx).result()
+            if stage == "generate":
+                result["input_bytes"] = os.path.getsize(ctx["input"])
+            if stage in OUTPUT_STAGES:
+                result["output_bytes"] = dir_bytes(os.path.join(tmp_dir, stage))
+            results.append(result)
+            logging.info(
+                f"{parties} parties {stage:<20} {result['seconds']:>9.2f}s "
+                f"{result['rows']:>11} rows {result['rows_per_sec']:>9} rows/s "
+                f"{result['peak_rss_mb']} MB peak RSS"
+            )
+        return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=SRC_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(results_dir, parties):
+    """Stage results of the latest earlier run at the same scale, {} if none."""
+    if not os.path.isdir(results_dir):
+        return {}
+    for file in sorted(os.listdir(results_dir), reverse=True):
+        if not file.endswith(".json"):
+            continue
+        with open(os.path.join(results_dir, file), "r", encoding="utf-8") as f:
+            run = json.load(f)
+        for scale in run["scales"]:
+            if scale["parties"] == parties:
+                return {result["stage"]: result for result in scale["stages"]}
+    return {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time each pipeline stage on synthetic parties"
+    )
+    parser.add_argument(
+        "--parties",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Scales to run, e.g. 1000 100000 10000000",
+    )
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to time"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--organisation-ratio", type=float, default=0.3)
+    parser.add_argument("--invalid-ratio", type=float, default=0.0)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes for the stages"
+    )
+    parser.add_argument("--upload-workers", type=int, default=1)
+    parser.add_argument(
+        "--work-dir", help="Where generated inputs and outputs go (default: temp)"
+    )
+    parser.add_argument(
+        "--results-dir",
+        default=os.path.join("src", "data", "benchmarks"),
+        help="Results are stored here as one JSON file per run",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    started = datetime.now(timezone.utc)
+    run = {
+        "started_utc": started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "organisation_ratio": args.organisation_ratio,
+        "invalid_ratio": args.invalid_ratio,
+        "workers": args.workers,
+        "upload_workers": args.upload_workers,
+        "scales": [],
+    }
+    # What a stage process holds before doing any work (interpreter and imports)
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        run["baseline_rss_mb"] = pool.submit(peak_rss_mb).result()
+    for parties in args.parties:
+        previous = previous_results(args.results_dir, parties)
+        stages = run_benchmark(
+            parties,
+            args.stages,
+            args.work_dir,
+            args.seed,
+            args.organisation_ratio,
+            args.invalid_ratio,
+            args.workers,
+            args.upload_workers,
+        )
+        run["scales"].append({"parties": parties, "stages": stages})
+
+        print(f"\n{parties} parties")
+        plain = {r["stage"]: r for r in stages}.get("process_json_csv")
+        for result in stages:
+            line = (
+                f"  {result['stage']:<22} {result['seconds']:>9.2f}s "
+                f"{result['rows_per_sec']:>10} rows/s "
+                f"{result['peak_rss_mb'] or '-':>8} MB"
+            )
+            if "output_bytes" in result:
+                line += f"  {result['output_bytes'] / (1 << 20):8.1f} MB output"
+                if plain and result is not plain and plain["output_bytes"]:
+                    line += f" ({result['output_bytes'] / plain['output_bytes']:.0%})"
+            before = previous.get(result["stage"])
+            if before:
+                change = result["rows_per_sec"] / before["rows_per_sec"] - 1
+                line += f"  {change:+.1%} rows/s vs previous run"
+            print(line)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    results_path = os.path.join(
+        args.results_dir, f"benchmark_{started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults written to {results_path}")
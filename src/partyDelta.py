@@ -0,0 +1,85 @@
+import csv
+import hashlib
+import json
+import os
+
+from partyFlattener import OWNER_TYPES
+
+INSERT, UPDATE = "insert", "update"
+
+
+def party_key(party):
+    """PartyIdentifier of the party's owner details, None if it has none."""
+    for key, details in party.items():
+        owner_type = OWNER_TYPES.get(key) or OWNER_TYPES.get(key.strip().lower())
+        if owner_type and details and details.get("PartyIdentifier") is not None:
+            return str(details["PartyIdentifier"])
+    return None
+
+
+def party_fingerprint(party) -> str:
+    # Canonical JSON, so key order and formatting do not count as a change
+    canonical = json.dumps(
+        party, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def load_fingerprints(path) -> dict:
+    """{PartyIdentifier: fingerprint} of the previous run, empty on the first run."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return {party_id: fingerprint for party_id, fingerprint in reader}
+
+
+def save_fingerprints(path, fingerprints: dict):
+    # Write then rename, a failed run keeps the previous store
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["partyidentifier", "fingerprint"])
+        writer.writerows(fingerprints.items())
+    os.replace(tmp_path, path)
+
+
+class PartyDelta:
+    """
+    Classifies each party against the fingerprints of the previous run:
+    INSERT (new), UPDATE (content changed) or None (unchanged).
+    Parties of the previous run that are not seen again are deleted().
+    current holds the fingerprints to save for the next run.
+    A party without a PartyIdentifier cannot be tracked and is rejected:
+    (None, None), counted as keyless.
+    """
+
+    def __init__(self, previous: dict):
+        self.previous = previous
+        self.current = {}
+        self.counts = {INSERT: 0, UPDATE: 0, "unchanged": 0, "keyless": 0}
+
+    def classify(self, party):
+        """(change, party_id) for one party."""
+        party_id = party_key(party)
+        if party_id is None:
+            self.counts["keyless"] += 1
+            return None, None
+        fingerprint = party_fingerprint(party)
+        self.current[party_id] = fingerprint
+        previous = self.previous.get(party_id)
+        if previous is None:
+            change = INSERT
+        elif previous != fingerprint:
+            change = UPDATE
+        else:
+            self.counts["unchanged"] += 1
+            return None, party_id
+        self.counts[change] += 1
+        return change, party_id
+
+    def deleted(self) -> list:
+        return [party_id for party_id in self.previous if party_id not in self.current]
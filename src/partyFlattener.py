@@ -0,0 +1,270 @@
+import hashlib
+from functools import lru_cache
+
+from partySchemaCompiler import SCHEMA_PATH, load_row_builders
+
+# Exact keys first, process_json has always matched them case-insensitively
+OWNER_TYPES = {
+    "IndividualDetails": "I",
+    "OrganisationDetails": "O",
+    "individualdetails": "I",
+    "organisationdetails": "O",
+}
+
+# Address keys per owner type, as defined in partyReferenceSchema.json
+ADDRESS_TYPES = {
+    "I": [
+        ("PhysicalAddress", "Physical"),
+        ("PostalAddress", "Postal"),
+        ("PreviousPhysicalAddress", "PreviousPhysical"),
+    ],
+    "O": [("PhysicalAddress", "Physical"), ("PostalAddress", "Postal")],
+}
+
+# Output tables of the LoadID layout, in the order process_party returns them
+TABLE_FIELDS = load_row_builders(SCHEMA_PATH, "load").TABLE_FIELDS
+# The same with address_dimension=True
+ADDRESS_DIMENSION_TABLE_FIELDS = load_row_builders(
+    SCHEMA_PATH, "load", True
+).TABLE_FIELDS
+# Column types of the tables of both
+COLUMN_TYPES = {
+    **load_row_builders(SCHEMA_PATH, "load", True).COLUMN_TYPES,
+    **load_row_builders(SCHEMA_PATH, "load").COLUMN_TYPES,
+}
+
+# Addresses memoised per flattener by AddressDimension
+ADDRESS_CACHE_SIZE = 1 << 16
+
+
+def address_key(content: tuple) -> str:
+    """
+    Surrogate key of normalised address content: a hash, so the same address
+    gets the same key in every worker process and every run without any
+    shared key table.
+    """
+    return hashlib.blake2b(repr(content).encode(), digest_size=8).hexdigest()
+
+
+def normalise_address(content: tuple) -> tuple:
+    # Surrounding whitespace and empty strings do not make a different address
+    return tuple((v.strip() or None) if v.__class__ is str else v for v in content)
+
+
+class AddressDimension:
+    """
+    One row per distinct address, for the address dimension tables. key()
+    returns the surrogate key of an address_content() tuple, memoised in a
+    bounded LRU cache on the raw content, so an address shared by many
+    parties (a head office, a PO box) is normalised and hashed once and the
+    per-party rows only carry its key. The dimension row is handed to emit
+    the first time a key is seen; the seen keys are kept in full so an
+    address evicted from the cache is never emitted twice. Memory is
+    therefore O(distinct addresses) of the run, about 100 bytes a key
+    (100 MB for a million addresses).
+    """
+
+    def __init__(self, dimension_row, maxsize=ADDRESS_CACHE_SIZE):
+        # dimension_row(key, content) -> row
+        self.dimension_row = dimension_row
+        self.emit = None
+        self.seen = set()
+        self.key = lru_cache(maxsize)(self._key)
+
+    def _key(self, content):
+        content = normalise_address(content)
+        key = address_key(content)
+        if key not in self.seen:
+            self.seen.add(key)
+            self.emit(self.dimension_row(key, content))
+        return key
+
+    def cache_info(self):
+        return self.key.cache_info()
+
+
+class PartyFlattener:
+    """
+    Single-pass flattening engine shared by the party entry points.
+    flatten() visits each party once and hands every output row straight to
+    the sink of its table (a list.append, a CSV writerow, ...). Rows are
+    namedtuples in the column order of the table, the per-party prefix values
+    are built once as a tuple and shared by every row of the party.
+    The column-level row builders are generated from partyReferenceSchema.json
+    (see partySchemaCompiler), so no schema dicts are walked per row.
+    This class produces the LoadID/LoadDateUTC layout of partyReferenceSchema.py,
+    other layouts set a different `layout` and override the table attributes.
+    address_dimension=True writes each distinct address once to an address
+    dimension table (see AddressDimension) and per-party rows of its key.
+    """
+
+    layout = "load"
+    address_types = ADDRESS_TYPES
+    owner_tables = {"I": "individual", "O": "organisation"}
+    tables = list(TABLE_FIELDS)
+
+    def __init__(
+        self, load_id, load_date, schema_path=SCHEMA_PATH, address_dimension=False
+    ):
+        self.run_columns = (load_id, load_date)
+        self.bind_row_builders(schema_path, address_dimension)
+
+    def bind_row_builders(self, schema_path, address_dimension=False):
+        rows = load_row_builders(schema_path, self.layout, address_dimension)
+        self.owner_rows = {"I": rows.individual_row, "O": rows.organisation_row}
+        self.email_row = rows.email_row
+        self.phone_row = rows.phone_row
+        self.bind_address_builders(rows, address_dimension)
+
+    def bind_address_builders(self, rows, address_dimension):
+        if not address_dimension:
+            self.address_dimension = None
+            self.address_lines_row = rows.address_lines_row
+            self.formatted_address_row = rows.formatted_address_row
+            return
+        self.tables = list(rows.TABLE_FIELDS)
+        self.dimension_table = rows.ADDRESS_DIMENSION_TABLE
+        self.address_content = rows.address_content
+        self.party_address_row = rows.party_address_row
+        dimension_row = rows.address_dimension_row
+        self.address_dimension = AddressDimension(
+            lambda key, content: dimension_row(self.dimension_prefix(key), content)
+        )
+
+    def dimension_prefix(self, key):
+        # LoadID, LoadDateUTC, AddressKey
+        return (*self.run_columns, key)
+
+    def address_key(self, sinks, addr):
+        dimension = self.address_dimension
+        dimension.emit = sinks[self.dimension_table]
+        return dimension.key(self.address_content(addr))
+
+    def flatten(self, party: dict, sinks: dict):
+        """Emit every output row of one party to sinks[table](row)."""
+        for key, details in party.items():
+            owner_type = OWNER_TYPES.get(key) or OWNER_TYPES.get(key.strip().lower())
+            if owner_type is None or not details:
+                continue
+            prefix = self.prefix(details.get("PartyIdentifier"), owner_type)
+
+            owner_table = self.owner_tables.get(owner_type)
+            if owner_table:
+                sinks[owner_table](self.owner_rows[owner_type](prefix, details))
+            emails = details.get("Emails")
+            if emails:
+                emit, email_row = sinks["emails"], self.email_row
+                for email in emails:
+                    emit(email_row(prefix, email))
+            phones = details.get("Phones")
+            if phones:
+                emit, phone_row = sinks["phones"], self.phone_row
+                for phone in phones:
+                    emit(phone_row(prefix, phone))
+            for addr_key, addr_type in self.address_types[owner_type]:
+                addr = details.get(addr_key)
+                if addr:
+                    self.address_rows(sinks, prefix, addr_key, addr_type, addr)
+
+    def flatten_tables(self, party: dict) -> dict:
+        """Rows of one party grouped by table (every table present, possibly empty)."""
+        tables = {table: [] for table in self.tables}
+        self.flatten(party, list_sinks(tables))
+        return tables
+
+    def prefix(self, party_id, owner_type):
+        # LoadID, LoadDateUTC, PartyIdentifier, OwnerType
+        return (*self.run_columns, party_id, owner_type)
+
+    def address_rows(self, sinks, prefix, addr_key, addr_type, addr):
+        if self.address_dimension is not None:
+            sinks["partyAddresses"](
+                self.party_address_row(prefix, addr_type, self.address_key(sinks, addr))
+            )
+            return
+        if "AddressLines" in addr:
+            sinks["addresses"](
+                self.address_lines_row(prefix, addr_type, addr["AddressLines"])
+            )
+        if "FormattedAddress" in addr:
+            sinks["formattedAddresses"](
+                self.formatted_address_row(prefix, addr_type, addr["FormattedAddress"])
+            )
+
+
+class RunFlattener(PartyFlattener):
+    """
+    process_json layout: lower-case columns, run_guid/run_date_* columns,
+    no owner tables and one table per address type. run_manifest=True drops
+    the run columns, for runs that record them once in a manifest.
+    """
+
+    address_tables = {
+        "PhysicalAddress": "physical_addresses",
+        "PostalAddress": "postal_addresses",
+        "PreviousPhysicalAddress": "previous_physical_addresses",
+    }
+    # process_json has always picked up every address type for both owners
+    address_types = {"I": ADDRESS_TYPES["I"], "O": ADDRESS_TYPES["I"]}
+    layout = "run"
+    owner_tables = {}
+    tables = ["emails", "phones", *address_tables.values()]
+
+    def __init__(
+        self,
+        run_guid,
+        run_date_local,
+        run_date_utc,
+        schema_path=SCHEMA_PATH,
+        run_manifest=False,
+        address_dimension=False,
+    ):
+        # With run_manifest the run columns are left out of the rows
+        if run_manifest:
+            self.layout, self.run_columns = "run_manifest", ()
+        else:
+            self.run_columns = (run_guid, run_date_local, run_date_utc)
+        self.bind_row_builders(schema_path, address_dimension)
+
+    def bind_row_builders(self, schema_path, address_dimension=False):
+        rows = load_row_builders(schema_path, self.layout, address_dimension)
+        self.email_row = rows.email_row
+        self.phone_row = rows.phone_row
+        self.bind_address_builders(rows, address_dimension)
+
+    def bind_address_builders(self, rows, address_dimension):
+        if not address_dimension:
+            self.address_dimension = None
+            self.address_row = rows.address_row
+            return
+        super().bind_address_builders(rows, address_dimension)
+
+    def prefix(self, party_id, owner_type):
+        # partyidentifier, run_guid, run_date_local, run_date_utc (if any)
+        return (party_id, *self.run_columns)
+
+    def dimension_prefix(self, key):
+        # address_key, run_guid, run_date_local, run_date_utc (if any)
+        return (key, *self.run_columns)
+
+    def address_rows(self, sinks, prefix, addr_key, addr_type, addr):
+        if self.address_dimension is not None:
+            sinks[self.address_tables[addr_key]](
+                self.party_address_row(prefix, self.address_key(sinks, addr))
+            )
+            return
+        sinks[self.address_tables[addr_key]](self.address_row(prefix, addr))
+
+
+@lru_cache(maxsize=16)
+def load_flattener(load_id, load_date):
+    """
+    PartyFlattener of one load, shared by every party of it (process_party).
+    Without the address dimension a flattener keeps no state between parties.
+    """
+    return PartyFlattener(load_id, load_date)
+
+
+def list_sinks(tables: dict) -> dict:
+    """Sinks that collect rows into the given {table: list} dict."""
+    return {table: rows.append for table, rows in tables.items()}
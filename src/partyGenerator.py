@@ -0,0 +1,235 @@
+import argparse
+import json
+import random
+
+FIRST_NAMES = [
+    "Charlie",
+    "Aroha",
+    "Liam",
+    "Mia",
+    "Noah",
+    "Olivia",
+    "Wiremu",
+    "Isla",
+    "Jack",
+    "Amelia",
+    "Hemi",
+    "Sophie",
+    "Oliver",
+    "Ruby",
+    "Mateo",
+    "Priya",
+]
+LAST_NAMES = [
+    "Nguyen",
+    "Smith",
+    "Williams",
+    "Brown",
+    "Wilson",
+    "Taylor",
+    "Ngata",
+    "Patel",
+    "Singh",
+    "Walker",
+    "Thompson",
+    "Tane",
+    "Chen",
+    "Kumar",
+    "Harris",
+    "King",
+]
+ORGANISATION_WORDS = [
+    "Kiwi",
+    "Southern",
+    "Harbour",
+    "Alpine",
+    "Pacific",
+    "Summit",
+    "Coastal",
+    "Fern",
+    "Tasman",
+    "Northern",
+]
+ORGANISATION_SUFFIXES = ["Ltd", "Limited", "Holdings", "Group", "Trust", "Co"]
+STREET_NAMES = [
+    "King Street",
+    "Queen Street",
+    "High Street",
+    "Victoria Avenue",
+    "Old Lane",
+    "Church Road",
+    "Beach Road",
+    "Station Road",
+    "Park Terrace",
+    "Hill Crescent",
+]
+SUBURBS = ["Riccarton", "Ponsonby", "Karori", "Mt Eden", "Roslyn", None]
+# (city, post code prefix, country code)
+CITIES = [
+    ("Auckland", "10", "NZ"),
+    ("Wellington", "60", "NZ"),
+    ("Christchurch", "80", "NZ"),
+    ("Dunedin", "90", "NZ"),
+    ("Hamilton", "32", "NZ"),
+    ("Sydney", "20", "AU"),
+    ("Melbourne", "30", "AU"),
+]
+EMAIL_DOMAINS = ["example.com", "workmail.com", "mail.co.nz", "inbox.net.nz"]
+PHONE_PREFIXES = {"NZ": ["+6421", "+6422", "+6427", "+649", "+643"], "AU": ["+614"]}
+# Phone types as the real extract sends them (see json/input.json)
+PHONE_TYPES = ["Mobile", "Home", "Work"]
+# Weights of 0, 1, 2, 3 ... emails or phones per party
+CONTACT_COUNT_WEIGHTS = [10, 45, 30, 10, 5]
+
+
+def contact_count(rng):
+    return rng.choices(range(len(CONTACT_COUNT_WEIGHTS)), CONTACT_COUNT_WEIGHTS)[0]
+
+
+def generate_address(rng, postal=False):
+    city, post_code_prefix, country = rng.choice(CITIES)
+    post_code = f"{post_code_prefix}{rng.randint(0, 99):02d}"
+    if postal:
+        lines = [f"PO Box {rng.randint(1, 9999)}", city, post_code, country]
+        formatted = {"City": city, "PostCode": post_code, "CountryCode": country}
+    else:
+        number, street = str(rng.randint(1, 400)), rng.choice(STREET_NAMES)
+        suburb = rng.choice(SUBURBS)
+        lines = [f"{number} {street}", *([suburb] if suburb else []), city]
+        lines += [post_code, country]
+        formatted = {
+            "StreetNumber": number,
+            "StreetName": street,
+            "Suburb": suburb,
+            "City": city,
+            "PostCode": post_code,
+            "CountryCode": country,
+        }
+        if rng.random() < 0.1:
+            formatted["BuildingName"] = f"{rng.choice(ORGANISATION_WORDS)} House"
+    return {"AddressLines": lines, "FormattedAddress": formatted}
+
+
+def generate_emails(rng, local_part):
+    return [
+        {
+            "EmailAddress": f"{local_part}{i or ''}@{rng.choice(EMAIL_DOMAINS)}",
+            "IsPrimary": i == 0,
+        }
+        for i in range(contact_count(rng))
+    ]
+
+
+def generate_phones(rng, country="NZ"):
+    return [
+        {
+            "PhoneNumber": rng.choice(PHONE_PREFIXES[country])
+            + str(rng.randint(1000000, 9999999)),
+            "IsPrimary": i == 0,
+            "Type": rng.choice(PHONE_TYPES),
+        }
+        for i in range(contact_count(rng))
+    ]
+
+
+def generate_individual(rng, party_id):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    details = {
+        "PartyIdentifier": party_id,
+        "FirstName": first,
+        "LastName": last,
+        "MiddleName": rng.choice(FIRST_NAMES) if rng.random() < 0.3 else None,
+        "Emails": generate_emails(rng, f"{first}.{last}".lower()),
+        "Phones": generate_phones(rng),
+        "PhysicalAddress": generate_address(rng),
+    }
+    if rng.random() < 0.6:
+        details["PostalAddress"] = generate_address(rng, postal=True)
+    if rng.random() < 0.3:
+        details["PreviousPhysicalAddress"] = generate_address(rng)
+    return {"IndividualDetails": details}
+
+
+def generate_organisation(rng, party_id):
+    words = rng.sample(ORGANISATION_WORDS, 2)
+    name = f"{' '.join(words)} {rng.choice(ORGANISATION_SUFFIXES)}"
+    details = {
+        "PartyIdentifier": party_id,
+        "Name": name,
+        "Emails": generate_emails(rng, "".join(words).lower()),
+        "Phones": generate_phones(rng),
+        "PhysicalAddress": generate_address(rng),
+    }
+    if rng.random() < 0.8:
+        details["PostalAddress"] = generate_address(rng, postal=True)
+    return {"OrganisationDetails": details}
+
+
+def make_invalid(party):
+    # The drift seen in real feeds: phone types sent as numeric codes
+    details = next(iter(party.values()))
+    if details["Phones"]:
+        details["Phones"][0]["Type"] = 1
+    else:
+        details["PartyIdentifier"] = int(details["PartyIdentifier"])
+    return party
+
+
+def generate_parties(count, seed=0, organisation_ratio=0.3, invalid_ratio=0.0):
+    """
+    count synthetic parties shaped like partyReferenceSchema.json, generated
+    lazily so any count streams in constant memory. The same seed always gives
+    the same parties. organisation_ratio of them are organisations and
+    invalid_ratio of them fail schema validation.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        party_id = str(1000000 + i)
+        if rng.random() < organisation_ratio:
+            party = generate_organisation(rng, party_id)
+        else:
+            party = generate_individual(rng, party_id)
+        if invalid_ratio and rng.random() < invalid_ratio:
+            party = make_invalid(party)
+        yield party
+
+
+def write_json_array(path, parties):
+    """Stream parties into a JSON array file, one party per line. Returns the count."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for party in parties:
+            f.write(",\n" if count else "\n")
+            f.write(json.dumps(party, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic party JSON")
+    parser.add_argument("--count", type=int, default=1000, help="Number of parties")
+    parser.add_argument("--output", default="parties.json", help="Output JSON array")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--organisation-ratio",
+        type=float,
+        default=0.3,
+        help="Share of organisations, the rest are individuals",
+    )
+    parser.add_argument(
+        "--invalid-ratio",
+        type=float,
+        default=0.0,
+        help="Share of parties that fail schema validation",
+    )
+    args = parser.parse_args()
+
+    count = write_json_array(
+        args.output,
+        generate_parties(
+            args.count, args.seed, args.organisation_ratio, args.invalid_ratio
+        ),
+    )
+    print(f"Wrote {count} parties to {args.output}")
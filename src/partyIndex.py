@@ -0,0 +1,366 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from csvCodecs import compression_of, open_compressed
+from historyStore import is_run_dir, read_header, run_files, run_info
+from tableWriters import PARQUET_SUFFIX
+
+INDEX_FILE = "party_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_guid TEXT PRIMARY KEY,
+    run_dir TEXT NOT NULL,
+    run_date_utc TEXT,
+    constants TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    run_guid TEXT NOT NULL REFERENCES runs (run_guid),
+    tbl TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_run ON files (run_guid);
+CREATE TABLE IF NOT EXISTS entries (
+    party_id TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (party_id, file_id, offset)
+) WITHOUT ROWID;
+"""
+
+
+def _binary_lines(path):
+    # Decompressed bytes of a CSV output file, line by line
+    stream = open_compressed(path, "rb", compression_of(path))
+    if not isinstance(stream, io.BufferedIOBase):
+        # The zstandard package's reader has no readline
+        stream = io.BufferedReader(stream)
+    return stream
+
+
+def csv_party_blocks(path, key_position=0):
+    """
+    (party_id, offset, length, rows) per block of consecutive rows of one party
+    in a CSV output file (any codec). Offsets and lengths are bytes of the
+    decompressed text, so a lookup seeks straight to a party's rows. The
+    flattener writes a party's rows together, so there is one block per party
+    and table unless the party repeats in the input.
+    """
+    with _binary_lines(path) as f:
+        offset = 0
+        record, start = b"", 0
+        block = None
+        first = True
+        for line in f:
+            if not record:
+                start = offset
+            offset += len(line)
+            record += line
+            if record.count(b'"') % 2:
+                # Newline inside a quoted field, the record goes on
+                continue
+            if first:
+                # Header line
+                first, record = False, b""
+                continue
+            if key_position == 0 and not record.startswith(b'"'):
+                party_id = record[: record.find(b",")].decode("utf-8")
+            else:
+                party_id = next(csv.reader([record.decode("utf-8")]))[key_position]
+            record = b""
+            if block and block[0] == party_id:
+                block[2] = offset - block[1]
+                block[3] += 1
+                continue
+            if block:
+                yield tuple(block)
+            block = [party_id, start, offset - start, 1]
+        if block:
+            yield tuple(block)
+
+
+def parquet_party_blocks(path):
+    """Like csv_party_blocks, offsets and lengths counted in rows."""
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    offset, block = 0, None
+    for i in range(parquet.num_row_groups):
+        column = parquet.read_row_group(i, columns=["partyidentifier"]).column(0)
+        for party_id in column.to_pylist():
+            offset += 1
+            if block and block[0] == party_id:
+                block[2] += 1
+                block[3] += 1
+                continue
+            if block:
+                yield tuple(block)
+            block = [party_id, offset - 1, 1, 1]
+    if block:
+        yield tuple(block)
+
+
+def party_blocks(path):
+    if path.endswith(PARQUET_SUFFIX):
+        return parquet_party_blocks(path)
+    header = read_header(path)
+    return csv_party_blocks(path, header.index("partyidentifier"))
+
+
+def read_csv_block(path, offset, length):
+    with open_compressed(path, "rb", compression_of(path)) as f:
+        # Forward seek, compressed files are decompressed up to offset on
+        # every call (see PartyIndex)
+        f.seek(offset)
+        data = f.read(length).decode("utf-8")
+    return list(csv.reader(io.StringIO(data, newline="")))
+
+
+def read_parquet_block(path, offset, length):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    rows, first = [], 0
+    for i in range(parquet.num_row_groups):
+        group_rows = parquet.metadata.row_group(i).num_rows
+        if first + group_rows > offset and first < offset + length:
+            group = parquet.read_row_group(i)
+            start = max(offset - first, 0)
+            stop = min(offset + length - first, group_rows)
+            columns = [c.to_pylist() for c in group.slice(start, stop - start).columns]
+            rows += [
+                ["" if v is None else str(v) for v in row] for row in zip(*columns)
+            ]
+        first += group_rows
+    return rows
+
+
+class PartyIndex:
+    """
+    PartyIdentifier -> (run, table, file, offset) index of process_json run
+    directories, in one SQLite file. Runs are added once each (add_run), as
+    they are written or later in bulk (add_runs), so the index grows
+    incrementally and a lookup is a single B-tree probe whatever the number
+    of runs. Offsets are bytes into a CSV's decompressed text, or rows of a
+    Parquet file.
+    gzip and zstd files have no random access, so a lookup decompresses
+    each one from the start up to the party's offset: tens of ms per file
+    of a large run, against well under a ms for a plain CSV seek or a
+    Parquet row group. Runs that are looked up often are best written
+    uncompressed or as Parquet.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(index_path, timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def has_run(self, run_guid):
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM runs WHERE run_guid = ?", (run_guid,)
+            ).fetchone()
+            is not None
+        )
+
+    def remove_run(self, run_guid):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM entries WHERE file_id IN "
+                "(SELECT file_id FROM files WHERE run_guid = ?)",
+                (run_guid,),
+            )
+            self.connection.execute("DELETE FROM files WHERE run_guid = ?", (run_guid,))
+            self.connection.execute("DELETE FROM runs WHERE run_guid = ?", (run_guid,))
+
+    def add_run(self, run_dir, run_date_utc=None, constants=None, replace=False):
+        """
+        Index every output file of a run directory in one transaction. Runs
+        already indexed are skipped unless replace. Returns the entries added.
+        """
+        info = run_info(run_dir) if run_date_utc is None else {"constants": {}}
+        run_guid = os.path.basename(os.path.normpath(run_dir))
+        if self.has_run(run_guid):
+            if not replace:
+                return 0
+            self.remove_run(run_guid)
+        start = time.perf_counter()
+        added = 0
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?)",
+                (
+                    run_guid,
+                    os.path.abspath(run_dir),
+                    run_date_utc or info["run_date_utc"],
+                    json.dumps(info["constants"] if constants is None else constants),
+                ),
+            )
+            for table, path in run_files(run_dir).items():
+                if "partyidentifier" not in read_header(path):
+                    continue
+                file_id = self.connection.execute(
+                    "INSERT INTO files (run_guid, tbl, path) VALUES (?, ?, ?)",
+                    (run_guid, table, os.path.relpath(path, run_dir)),
+                ).lastrowid
+                entries = sorted(
+                    (party_id, file_id, offset, length, rows)
+                    for party_id, offset, length, rows in party_blocks(path)
+                )
+                self.connection.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?)", entries
+                )
+                added += len(entries)
+        logging.info(
+            f"Indexed run {run_guid}: {added} entries in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+        return added
+
+    def add_runs(self, data_dir, replace=False):
+        """Index the run directories under data_dir not indexed yet."""
+        added = 0
+        for name in sorted(os.listdir(data_dir)):
+            run_dir = os.path.join(data_dir, name)
+            if is_run_dir(run_dir):
+                added += self.add_run(run_dir, replace=replace)
+        return added
+
+    def prune(self):
+        """Forget runs whose directory is gone (e.g. compacted), returns them."""
+        gone = [
+            run_guid
+            for run_guid, run_dir in self.connection.execute(
+                "SELECT run_guid, run_dir FROM runs"
+            )
+            if not os.path.isdir(run_dir)
+        ]
+        for run_guid in gone:
+            self.remove_run(run_guid)
+        return gone
+
+    def entries(self, party_id):
+        """Index entries of a party, oldest run first."""
+        return self.connection.execute(
+            "SELECT r.run_guid, r.run_date_utc, r.run_dir, r.constants, f.tbl, "
+            "f.path, e.offset, e.length FROM entries e "
+            "JOIN files f ON f.file_id = e.file_id "
+            "JOIN runs r ON r.run_guid = f.run_guid "
+            "WHERE e.party_id = ? ORDER BY r.run_date_utc, r.run_guid, f.tbl, e.offset",
+            (str(party_id),),
+        ).fetchall()
+
+    def lookup(self, party_id):
+        """
+        Rows of a party in every indexed run: a list of {run_guid,
+        run_date_utc, table, file, rows}, rows as {column: CSV text}
+        including run-manifest constants. Files that no longer exist are
+        skipped with a warning.
+        """
+        results = []
+        headers = {}
+        for (
+            run_guid,
+            run_date_utc,
+            run_dir,
+            constants,
+            table,
+            path,
+            offset,
+            length,
+        ) in self.entries(party_id):
+            file_path = os.path.join(run_dir, path)
+            if not os.path.exists(file_path):
+                logging.warning(f"Indexed file {file_path} is gone, run prune")
+                continue
+            if file_path not in headers:
+                headers[file_path] = read_header(file_path)
+            if file_path.endswith(PARQUET_SUFFIX):
+                rows = read_parquet_block(file_path, offset, length)
+            else:
+                rows = read_csv_block(file_path, offset, length)
+            constants = json.loads(constants or "{}")
+            results.append(
+                {
+                    "run_guid": run_guid,
+                    "run_date_utc": run_date_utc,
+                    "table": table,
+                    "file": file_path,
+                    "rows": [
+                        {**dict(zip(headers[file_path], row)), **constants}
+                        for row in rows
+                    ],
+                }
+            )
+        return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        stream=sys.stderr,
+    )
+    parser = argparse.ArgumentParser(
+        description="PartyIdentifier index of the process_json run directories"
+    )
+    parser.add_argument(
+        "--index",
+        default=os.path.join("src", "data", INDEX_FILE),
+        help="Index file",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Index runs not indexed yet")
+    build_parser.add_argument("--data-dir", default=os.path.join("src", "data"))
+    build_parser.add_argument(
+        "--replace", action="store_true", help="Re-index runs already in the index"
+    )
+    commands.add_parser("prune", help="Forget runs whose directory is gone")
+    lookup_parser = commands.add_parser("lookup", help="Rows of one party")
+    lookup_parser.add_argument("--party", required=True, help="PartyIdentifier")
+    lookup_parser.add_argument("--table", help="Only this table, e.g. phones")
+    args = parser.parse_args()
+
+    with PartyIndex(args.index) as index:
+        if args.command == "build":
+            added = index.add_runs(args.data_dir, args.replace)
+            logging.info(f"Added {added} entries to {args.index}")
+        elif args.command == "prune":
+            gone = index.prune()
+            logging.info(f"Pruned {len(gone)} runs from {args.index}")
+        else:
+            start = time.perf_counter()
+            results = [
+                r
+                for r in index.lookup(args.party)
+                if args.table is None or r["table"].split("/")[-1] == args.table
+            ]
+            logging.info(
+                f"Found {sum(len(r['rows']) for r in results)} rows of party "
+                f"{args.party} in {len({r['run_guid'] for r in results})} runs "
+                f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+            json.dump(results, sys.stdout, indent=2)
+            print()
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from partyFlattener import list_sinks
+from partyShards import chunked
+from runMetrics import RunMetrics
+
+# The flatten process's flattener, made once by _init_flattener so state
+# such as the address dimension carries over from batch to batch
+_flattener = None
+
+
+def _init_flattener(make_flattener):
+    global _flattener
+    _flattener = make_flattener()
+
+
+def _timed(fn, *args):
+    # Runs in an executor thread or process, so the time is that call's alone
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def flatten_batch(parties, tables):
+    """{table: rows} of a batch of parties, as plain tuples that pickle."""
+    rows = {table: [] for table in tables}
+    sinks = list_sinks(rows)
+    for party in parties:
+        _flattener.flatten(party, sinks)
+    return {table: list(map(tuple, table_rows)) for table, table_rows in rows.items()}
+
+
+async def _run(parties, make_flattener, stages, batch_size, queue_size, record):
+    loop = asyncio.get_running_loop()
+    consumers = [
+        (stage, table, writer)
+        for stage, writers in stages.items()
+        for table, writer in writers.items()
+    ]
+    tables = list(dict.fromkeys(table for _, table, _ in consumers))
+    # parse keeps its order on one thread and flatten in one process, out of
+    # this process's GIL so the two really overlap; every table writer or
+    # loader gets a thread of its own to block in
+    parse_pool = ThreadPoolExecutor(1, "parse")
+    flatten_pool = ProcessPoolExecutor(
+        1, initializer=_init_flattener, initargs=(make_flattener,)
+    )
+    io_pool = ThreadPoolExecutor(len(consumers), "write")
+    parsed = asyncio.Queue(queue_size)
+    queues = {
+        (stage, table): asyncio.Queue(queue_size) for stage, table, _ in consumers
+    }
+    closed = set()
+    party_count = 0
+
+    async def call(pool, key, fn, *args):
+        result, seconds = await loop.run_in_executor(pool, _timed, fn, *args)
+        RunMetrics.add(record, key, seconds)
+        return result
+
+    async def parse():
+        batches = chunked(parties, batch_size)
+        while True:
+            batch = await call(parse_pool, "parse_seconds", next, batches, None)
+            await parsed.put(batch)
+            if batch is None:
+                return
+
+    async def flatten():
+        nonlocal party_count
+        while True:
+            batch = await parsed.get()
+            if batch is None:
+                break
+            rows = await call(
+                flatten_pool, "flatten_seconds", flatten_batch, batch, tables
+            )
+            party_count += len(batch)
+            for (stage, table), queue in queues.items():
+                if rows[table]:
+                    await queue.put(rows[table])
+        for queue in queues.values():
+            await queue.put(None)
+
+    async def consume(stage, table, writer):
+        queue = queues[stage, table]
+        while True:
+            rows = await queue.get()
+            if rows is None:
+                break
+            await call(io_pool, f"{stage}_seconds", writer.writerows, rows)
+        closed.add((stage, table))
+        await call(io_pool, f"{stage}_seconds", writer.close)
+
+    tasks = [
+        asyncio.create_task(parse()),
+        asyncio.create_task(flatten()),
+        *(asyncio.create_task(consume(*consumer)) for consumer in consumers),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        for pool in (parse_pool, flatten_pool, io_pool):
+            pool.shutdown(wait=True)
+        for stage, table, writer in consumers:
+            if (stage, table) not in closed:
+                writer.close()
+    return party_count
+
+
+def run_pipeline(
+    parties, make_flattener, stages: dict, batch_size=100, queue_size=4, metrics=None
+):
+    """
+    Flatten parties with parse, flatten and per-table write/load stages
+    overlapping, as asyncio tasks connected by bounded queues. stages maps a
+    stage name to its table writers, e.g. {"write": file writers, "load":
+    SqlTableSinks}; every writer is fed from its own queue. Parties are
+    parsed and flattened in batches of batch_size, and a stage that falls
+    behind stalls the ones before it once queue_size batches are waiting, so
+    memory stays bounded. Reading the input, writerows and close run on
+    executor threads. Flattening is CPU-bound Python, so it runs in a worker
+    process with the flattener make_flattener() returns (picklable, e.g. a
+    functools.partial of RunFlattener), and batches and rows cross over
+    pickled.
+    metrics records the "pipeline" stage, with the busy seconds of each stage
+    (parse_seconds, flatten_seconds, <stage>_seconds summed over its tables).
+    Returns the party count.
+    """
+    metrics = metrics or RunMetrics()
+    with metrics.stage("pipeline") as record:
+        return asyncio.run(
+            _run(parties, make_flattener, stages, batch_size, queue_size, record)
+        )
@@ -1,270 +1,448 @@
+import argparse
 import json
+import logging
 import csv
+import os
+import time
 import uuid
 from datetime import datetime
 
+from csvCodecs import EXTENSIONS, header_bytes, open_csv
+from partyFlattener import (
+    ADDRESS_DIMENSION_TABLE_FIELDS,
+    COLUMN_TYPES,
+    TABLE_FIELDS,
+    PartyFlattener,
+    list_sinks,
+    load_flattener,
+)
+from partyShards import (
+    map_shards,
+    map_tasks,
+    merge_csv_shards,
+    merge_parquet_shards,
+    merge_unique_shards,
+    remove_shard,
+    remove_shards_from,
+    shard_path,
+)
+from partyStream import NdjsonReader, input_files, ndjson_range_bytes, open_parties
+from runCheckpoint import (
+    CHECKPOINT_FILE,
+    input_position,
+    read_checkpoint,
+    resume_input,
+    track_offsets,
+    write_checkpoint,
+)
+from runMetrics import RunMetrics
+from tableWriters import PARQUET_SUFFIX, CsvTableWriter, ParquetTableWriter
+from utils.loggger import get_process_logger, log_sampled
 
-def write_csv(base_filename, fieldnames, rows, load_id, load_date):
+
+def csv_filename(base_filename, load_id, load_date):
     # Append LoadID and UTC date to filename
     safe_date = (
         load_date.replace(":", "").replace("-", "").replace("T", "_").replace("Z", "")
     )
-    filename = f"{base_filename}_{load_id}_{safe_date}.csv"
-    with open(filename, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+    return f"{base_filename}_{load_id}_{safe_date}.csv"
+
+
+def output_filename(
+    base_filename, load_id, load_date, compression=None, output_format="csv"
+):
+    filename = csv_filename(base_filename, load_id, load_date)
+    if output_format == "parquet":
+        return filename[: -len(".csv")] + PARQUET_SUFFIX
+    return filename + EXTENSIONS[compression]
+
+
+def write_csv(base_filename, fieldnames, rows, load_id, load_date, compression=None):
+    filename = output_filename(base_filename, load_id, load_date, compression)
+    with open_csv(filename, "w", compression) as f:
+        # Rows are tuples in fieldnames order
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
         writer.writerows(rows)
     return filename
 
 
-def log(message):
-    with open("process.log", "a", encoding="utf-8") as logf:
-        logf.write(f"{datetime.utcnow().isoformat()}Z - {message}\n")
+def write_parquet(
+    base_filename, fieldnames, rows, load_id, load_date, compression=None
+):
+    # Typed columns, written in row groups; no file for a table without rows
+    filename = output_filename(
+        base_filename, load_id, load_date, compression, "parquet"
+    )
+    with ParquetTableWriter(
+        filename, fieldnames, COLUMN_TYPES[base_filename], compression
+    ) as writer:
+        writer.writerows(rows)
+    return filename
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+# Configured by get_process_logger in __main__ (queued, batched writes)
+logger = logging.getLogger("partyReferenceSchema")
+
+
+def log(message, *args, sampled=False):
+    if sampled:
+        log_sampled(logger, message, *args)
+    else:
+        logger.info(message, *args)
 
 
 def process_party(party_obj, load_id, load_date):
-    addresses, formatted_addresses, emails, phones, individuals, organisations = (
-        [],
-        [],
-        [],
-        [],
-        [],
-        [],
-    )
+    tables = load_flattener(load_id, load_date).flatten_tables(party_obj)
+    return tuple(tables.values())
 
-    def extract_address(addr, party_id, owner_type, addr_type):
-        if not addr:
-            return
-        if "AddressLines" in addr:
-            addresses.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": party_id,
-                    "OwnerType": owner_type,
-                    "AddressType": addr_type,
-                    "AddressLines": "|".join(addr["AddressLines"]),
-                }
-            )
-        if "FormattedAddress" in addr:
-            fa = addr["FormattedAddress"]
-            formatted_addresses.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": party_id,
-                    "OwnerType": owner_type,
-                    "AddressType": addr_type,
-                    "BuildingName": fa.get("BuildingName"),
-                    "City": fa.get("City"),
-                    "CountryCode": fa.get("CountryCode"),
-                    "PostCode": fa.get("PostCode"),
-                    "StreetName": fa.get("StreetName"),
-                    "StreetNumber": fa.get("StreetNumber"),
-                    "Suburb": fa.get("Suburb"),
-                    "TownName": fa.get("TownName"),
-                }
-            )
 
-    # Individual
-    ind = party_obj.get("IndividualDetails")
-    if ind:
-        party_id = ind.get("PartyIdentifier")
-        individuals.append(
-            {
-                "LoadID": load_id,
-                "LoadDateUTC": load_date,
-                "PartyIdentifier": party_id,
-                "OwnerType": "I",
-                "FirstName": ind.get("FirstName"),
-                "LastName": ind.get("LastName"),
-                "MiddleName": ind.get("MiddleName"),
-            }
-        )
-        for e in ind.get("Emails", []):
-            emails.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": party_id,
-                    "OwnerType": "I",
-                    **e,
-                }
-            )
-        for p in ind.get("Phones", []):
-            phones.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": party_id,
-                    "OwnerType": "I",
-                    **p,
-                }
-            )
-        extract_address(ind.get("PhysicalAddress"), party_id, "I", "Physical")
-        extract_address(ind.get("PostalAddress"), party_id, "I", "Postal")
-        extract_address(
-            ind.get("PreviousPhysicalAddress"), party_id, "I", "PreviousPhysical"
-        )
+def party_identifier(party):
+    return party.get("IndividualDetails", {}).get("PartyIdentifier") or party.get(
+        "OrganisationDetails", {}
+    ).get("PartyIdentifier")
 
-    # Organisation
-    org = party_obj.get("OrganisationDetails")
-    if org:
-        party_id = org.get("PartyIdentifier")
-        organisations.append(
-            {
-                "LoadID": load_id,
-                "LoadDateUTC": load_date,
-                "PartyIdentifier": party_id,
-                "OwnerType": "O",
-                "Name": org.get("Name"),
-            }
-        )
-        for e in org.get("Emails", []):
-            emails.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": party_id,
-                    "OwnerType": "O",
-                    **e,
-                }
-            )
-        for p in org.get("Phones", []):
-            phones.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": party_id,
-                    "OwnerType": "O",
-                    **p,
-                }
-            )
-        extract_address(org.get("PhysicalAddress"), party_id, "O", "Physical")
-        extract_address(org.get("PostalAddress"), party_id, "O", "Postal")
 
-    return addresses, formatted_addresses, emails, phones, individuals, organisations
+def metrics_filename(load_id, load_date):
+    return os.path.splitext(csv_filename("metrics", load_id, load_date))[0] + ".json"
 
 
-if __name__ == "__main__":
-    # Generate LoadID and LoadDateUTC
-    load_id = str(uuid.uuid4())
-    load_date = datetime.utcnow().isoformat() + "Z"
+def shard_suffix(output_format):
+    return PARQUET_SUFFIX if output_format == "parquet" else ".csv"
 
-    log(f"Starting load {load_id} at {load_date}")
 
-    with open("input.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
+def output_tables(address_dimension=False):
+    return ADDRESS_DIMENSION_TABLE_FIELDS if address_dimension else TABLE_FIELDS
 
-    all_addresses, all_formatted, all_emails, all_phones, all_individuals, all_orgs = (
-        [],
-        [],
-        [],
-        [],
-        [],
-        [],
-    )
 
-    for party in data:
-        addresses, formatted_addresses, emails, phones, individuals, organisations = (
-            process_party(party, load_id, load_date)
+def process_shard(
+    shard_index,
+    parties,
+    shard_dir,
+    load_id,
+    load_date,
+    compression=None,
+    output_format="csv",
+    address_dimension=False,
+):
+    # Runs in a worker process: writes one header-less CSV (or Parquet) shard per
+    # table for this chunk (a list, or an NdjsonReader range read here),
+    # compressed here so the merge only concatenates
+    metrics = RunMetrics()
+    flattener = PartyFlattener(load_id, load_date, address_dimension=address_dimension)
+    table_fields = output_tables(address_dimension)
+    tables = {table: [] for table in table_fields}
+    sinks = list_sinks(tables)
+    party_count = 0
+    with metrics.stage("flatten"):
+        for party in parties:
+            flattener.flatten(party, sinks)
+            party_count += 1
+    with metrics.stage("write"):
+        for base_filename, fieldnames in table_fields.items():
+            path = shard_path(
+                shard_dir, base_filename, shard_index, shard_suffix(output_format)
+            )
+            if output_format == "parquet":
+                with ParquetTableWriter(
+                    path, fieldnames, COLUMN_TYPES[base_filename], compression
+                ) as writer:
+                    writer.writerows(tables[base_filename])
+            else:
+                with open_csv(path, "w", compression) as f:
+                    csv.writer(f).writerows(tables[base_filename])
+            metrics.table(base_filename, rows=len(tables[base_filename]))
+    return party_count, metrics
+
+
+def process_file(shard_index, path, shard_dir, *args):
+    # Runs in a worker process: process_shard for one input file of a
+    # multi-file load. A file that fails is recorded with its error and its
+    # shard removed, so the load goes on with the other files
+    start = time.perf_counter()
+    try:
+        party_count, metrics = process_shard(
+            shard_index, open_parties(path), shard_dir, *args
         )
-        all_addresses.extend(addresses)
-        all_formatted.extend(formatted_addresses)
-        all_emails.extend(emails)
-        all_phones.extend(phones)
-        all_individuals.extend(individuals)
-        all_orgs.extend(organisations)
-        log(
-            f"Processed party {party.get('IndividualDetails', {}).get('PartyIdentifier') or party.get('OrganisationDetails', {}).get('PartyIdentifier')}"
+    except Exception as e:
+        remove_shard(shard_dir, shard_index)
+        metrics = RunMetrics()
+        metrics.input_file(
+            path, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}"
         )
+        return 0, metrics
+    metrics.input_file(path, party_count, time.perf_counter() - start)
+    return party_count, metrics
+
 
-    # Write CSVs with LoadID + Date in filenames
-    write_csv(
-        "addresses",
-        [
-            "LoadID",
-            "LoadDateUTC",
-            "PartyIdentifier",
-            "OwnerType",
-            "AddressType",
-            "AddressLines",
-        ],
-        all_addresses,
-        load_id,
-        load_date,
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flatten party JSON into CSVs")
+    parser.add_argument(
+        "--input",
+        default="input.json",
+        help="Input JSON array or NDJSON (one party per line), or a directory "
+        "or glob of them, flattened one file per worker",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes for flattening"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=5000, help="Parties per worker shard"
+    )
+    parser.add_argument(
+        "--log-every",
+        type=int,
+        default=1,
+        help="Log only every Nth per-party message",
+    )
+    parser.add_argument(
+        "--log-max-per-second",
+        type=int,
+        default=None,
+        help="Cap on per-party log messages per second",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["gzip", "zstd"],
+        help="Compress the CSVs as they are written (the Parquet codec with --format)",
     )
-    write_csv(
-        "formattedAddresses",
-        [
-            "LoadID",
-            "LoadDateUTC",
-            "PartyIdentifier",
-            "OwnerType",
-            "AddressType",
-            "BuildingName",
-            "City",
-            "CountryCode",
-            "PostCode",
-            "StreetName",
-            "StreetNumber",
-            "Suburb",
-            "TownName",
-        ],
-        all_formatted,
-        load_id,
-        load_date,
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Output file format, Parquet columns are typed from the schema",
     )
-    write_csv(
-        "emails",
-        [
-            "LoadID",
-            "LoadDateUTC",
-            "PartyIdentifier",
-            "OwnerType",
-            "EmailAddress",
-            "IsPrimary",
-        ],
-        all_emails,
-        load_id,
-        load_date,
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Write shards even with one worker, checkpointed so the load can resume",
     )
-    write_csv(
-        "phones",
-        [
-            "LoadID",
-            "LoadDateUTC",
-            "PartyIdentifier",
-            "OwnerType",
-            "PhoneNumber",
-            "IsPrimary",
-            "Type",
-        ],
-        all_phones,
-        load_id,
-        load_date,
+    parser.add_argument(
+        "--resume",
+        metavar="LOAD_ID",
+        help="Carry on a sharded load that died from its last completed shard",
     )
-    write_csv(
-        "individual",
-        [
-            "LoadID",
-            "LoadDateUTC",
-            "PartyIdentifier",
-            "OwnerType",
-            "FirstName",
-            "LastName",
-            "MiddleName",
-        ],
-        all_individuals,
-        load_id,
-        load_date,
+    parser.add_argument(
+        "--address-dimension",
+        action="store_true",
+        help="Write each distinct address once to addressDimension, keyed, "
+        "and only the keys to partyAddresses",
     )
-    write_csv(
-        "organisation",
-        ["LoadID", "LoadDateUTC", "PartyIdentifier", "OwnerType", "Name"],
-        all_orgs,
-        load_id,
-        load_date,
+    args = parser.parse_args()
+    get_process_logger(
+        "partyReferenceSchema",
+        sample_every=args.log_every,
+        max_per_second=args.log_max_per_second,
     )
 
-    log(f"Completed load {load_id} with {len(data)} parties processed")
+    checkpoint = {}
+    if args.resume:
+        # Same LoadID, date and output settings as the load that died
+        load_id = args.resume
+        checkpoint = read_checkpoint(f"_shards_{load_id}")
+        if not checkpoint:
+            parser.error(f"Load {load_id} has no checkpoint to resume from")
+        load_date = checkpoint["load_date"]
+        args.chunk_size = checkpoint["chunk_size"]
+        args.compression = checkpoint["compression"]
+        args.format = checkpoint["format"]
+        args.address_dimension = checkpoint.get("address_dimension", False)
+        inputs = checkpoint.get("inputs") or input_files(args.input)
+    else:
+        # Generate LoadID and LoadDateUTC
+        load_id = str(uuid.uuid4())
+        load_date = datetime.utcnow().isoformat() + "Z"
+        inputs = input_files(args.input)
+
+    log(f"Starting load {load_id} at {load_date}")
+    metrics = RunMetrics()
+    table_fields = output_tables(args.address_dimension)
+
+    multi_file = len(inputs) > 1
+    if args.workers > 1 or args.checkpoint or args.resume or multi_file:
+        # Each worker writes its own shard per table, merged back in input order.
+        # The shards done and the input offset after them are checkpointed.
+        # Several input files are one shard each, read by their worker
+        shard_dir = f"_shards_{load_id}"
+        os.makedirs(shard_dir, exist_ok=True)
+        parties = None if multi_file else open_parties(inputs[0])
+        shards_before = checkpoint.get("shards", 0)
+        party_count = checkpoint.get("parties", 0)
+        if checkpoint:
+            log(f"Resuming after {shards_before} shards ({party_count} parties)")
+            if not multi_file:
+                parties = resume_input(parties, checkpoint)
+            # Shards written after the checkpoint are written again
+            remove_shards_from(shard_dir, shards_before)
+        else:
+            checkpoint = {
+                "load_id": load_id,
+                "load_date": load_date,
+                "chunk_size": args.chunk_size,
+                "compression": args.compression,
+                "format": args.format,
+                "address_dimension": args.address_dimension,
+                "inputs": inputs if multi_file else None,
+                "shards": 0,
+                "merged": [],
+            }
+        offsets = []
+        shard_count = shards_before
+        shard_args = (
+            shard_dir,
+            load_id,
+            load_date,
+            args.compression,
+            args.format,
+            args.address_dimension,
+        )
+        ranges = None
+        if multi_file:
+            log(f"Flattening {len(inputs)} input files")
+            shards = map_tasks(
+                process_file,
+                inputs[shards_before:],
+                args.workers,
+                *shard_args,
+                start=shards_before,
+            )
+        elif isinstance(parties, NdjsonReader):
+            # Line-aligned byte ranges of about chunk_size parties, each read
+            # and parsed by its worker; a range's end is its checkpoint offset
+            ranges = parties.split(ndjson_range_bytes(parties.path, args.chunk_size))
+            shards = map_tasks(
+                process_shard, ranges, args.workers, *shard_args, start=shards_before
+            )
+        else:
+            shards = map_shards(
+                process_shard,
+                metrics.timed_iter(
+                    track_offsets(parties, args.chunk_size, offsets, party_count),
+                    "flatten",
+                ),
+                args.workers,
+                args.chunk_size,
+                *shard_args,
+                start=shards_before,
+            )
+        with metrics.stage("flatten"):
+            for count, shard_metrics in shards:
+                party_count += count
+                shard_count += 1
+                metrics.merge(shard_metrics)
+                if multi_file:
+                    checkpoint["parties"] = party_count
+                elif ranges:
+                    checkpoint.update(
+                        input_position(
+                            parties,
+                            party_count,
+                            ranges[shard_count - shards_before - 1].end,
+                        )
+                    )
+                else:
+                    checkpoint.update(offsets[shard_count - shards_before - 1])
+                checkpoint["shards"] = shard_count
+                write_checkpoint(shard_dir, checkpoint)
+                log(f"Processed shard {shard_count} ({party_count} parties)")
+        for f in metrics.files:
+            if f["error"]:
+                logger.error(
+                    f"Input file {f['file']} failed and was left out: {f['error']}"
+                )
+        with metrics.stage("merge"):
+            for base_filename, fieldnames in table_fields.items():
+                if base_filename in checkpoint["merged"]:
+                    continue
+                shard_paths = [
+                    shard_path(shard_dir, base_filename, i, shard_suffix(args.format))
+                    for i in range(shard_count)
+                ]
+                filename = output_filename(
+                    base_filename, load_id, load_date, args.compression, args.format
+                )
+                if base_filename == "addressDimension":
+                    # Every shard has the addresses it saw, keep one row per key
+                    if args.format == "parquet":
+                        writer = ParquetTableWriter(
+                            filename,
+                            fieldnames,
+                            COLUMN_TYPES[base_filename],
+                            args.compression,
+                        )
+                    else:
+                        writer = CsvTableWriter(filename, fieldnames, args.compression)
+                    if not merge_unique_shards(
+                        shard_paths,
+                        writer,
+                        fieldnames.index("AddressKey"),
+                        args.compression,
+                    ):
+                        filename = None
+                elif args.format == "parquet":
+                    filename = merge_parquet_shards(
+                        shard_paths, filename, args.compression
+                    )
+                else:
+                    filename = merge_csv_shards(
+                        shard_paths,
+                        filename,
+                        header_bytes(fieldnames, args.compression),
+                    )
+                if filename:
+                    metrics.table(base_filename, bytes=os.path.getsize(filename))
+                checkpoint["merged"].append(base_filename)
+                write_checkpoint(shard_dir, checkpoint)
+            os.remove(os.path.join(shard_dir, CHECKPOINT_FILE))
+            os.rmdir(shard_dir)
+    else:
+        with metrics.stage("parse"):
+            parties = open_parties(inputs[0])
+            if isinstance(parties, NdjsonReader):
+                data = list(parties)
+            else:
+                with open(inputs[0], "r", encoding="utf-8") as f:
+                    data = json.load(f)
+        party_count = len(data)
+
+        flattener = PartyFlattener(
+            load_id, load_date, address_dimension=args.address_dimension
+        )
+        tables = {table: [] for table in table_fields}
+        sinks = list_sinks(tables)
+        with metrics.stage("flatten"):
+            for party in data:
+                flattener.flatten(party, sinks)
+                log("Processed party %s", party_identifier(party), sampled=True)
+
+        # Write CSVs with LoadID + Date in filenames
+        with metrics.stage("write"):
+            for base_filename, fieldnames in table_fields.items():
+                filename = WRITERS[args.format](
+                    base_filename,
+                    fieldnames,
+                    tables[base_filename],
+                    load_id,
+                    load_date,
+                    args.compression,
+                )
+                metrics.table(
+                    base_filename,
+                    rows=len(tables[base_filename]),
+                    bytes=os.path.getsize(filename) if os.path.exists(filename) else 0,
+                )
+
+    metrics.write(
+        metrics_filename(load_id, load_date),
+        load_id=load_id,
+        load_date_utc=load_date,
+        parties=party_count,
+        workers=args.workers,
+        compression=args.compression,
+        output_format=args.format,
+        address_dimension=args.address_dimension,
+    )
+    log(f"Completed load {load_id} with {party_count} parties processed")
@@ -1,8 +1,15 @@
 import json
+import logging
 import csv
+import os
 import uuid
 from datetime import datetime
 
+from partyFlattener import TABLE_FIELDS, PartyFlattener, list_sinks
+from partyReferenceSchema import metrics_filename
+from runMetrics import RunMetrics
+from utils.loggger import get_process_logger
+
 # Load schema from file in same folder
 with open("partyReferenceSchema.json", "r", encoding="utf-8") as f:
     schema = json.load(f)
@@ -11,7 +18,7 @@ with open("partyReferenceSchema.json", "r", encoding="utf-8") as f:
 def write_csv(base_filename, rows, schema_def, load_id, load_date):
     # Build headers dynamically from schema definition
     fieldnames = ["LoadID", "LoadDateUTC", "PartyIdentifier", "OwnerType"]
-    if rows and "AddressType" in rows[0]:
+    if rows and "AddressType" in rows[0]._fields:
         fieldnames.append("AddressType")
     fieldnames.extend(schema_def["properties"].keys())
 
@@ -24,243 +31,113 @@ def write_csv(base_filename, rows, schema_def, load_id, load_date):
     with open(filename, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(rows)
+        writer.writerows(row._asdict() for row in rows)
 
     return filename, len(rows)
 
 
-def log(message):
-    with open("process.log", "a", encoding="utf-8") as logf:
-        logf.write(f"{datetime.utcnow().isoformat()}Z - {message}\n")
+# Configured by get_process_logger in __main__ (queued, batched writes)
+logger = logging.getLogger("partyReferenceSchema2")
 
 
-def flatten_array(array, schema_def, extra_fields):
-    rows = []
-    for item in array:
-        row = {prop: item.get(prop) for prop in schema_def["properties"].keys()}
-        row.update(extra_fields)
-        rows.append(row)
-    return rows
+def log(message, *args):
+    logger.info(message, *args)
 
 
 if __name__ == "__main__":
+    get_process_logger("partyReferenceSchema2")
+
     # Generate LoadID and LoadDateUTC
     load_id = str(uuid.uuid4())
     load_date = datetime.utcnow().isoformat() + "Z"
     log(f"Starting load {load_id} at {load_date}")
+    metrics = RunMetrics()
 
-    with open("input.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with metrics.stage("parse"):
+        with open("input.json", "r", encoding="utf-8") as f:
+            data = json.load(f)
 
-    all_emails, all_phones, all_addresses, all_formatted, all_individuals, all_orgs = (
-        [],
-        [],
-        [],
-        [],
-        [],
-        [],
-    )
+    # One pass per party fills every output table
+    flattener = PartyFlattener(load_id, load_date)
+    tables = {table: [] for table in TABLE_FIELDS}
+    sinks = list_sinks(tables)
+    with metrics.stage("flatten"):
+        for party in data:
+            flattener.flatten(party, sinks)
 
-    for party in data:
-        # Individual
-        ind = party.get("IndividualDetails")
-        if ind:
-            pid = ind.get("PartyIdentifier")
-            all_individuals.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": pid,
-                    "OwnerType": "I",
-                    "FirstName": ind.get("FirstName"),
-                    "LastName": ind.get("LastName"),
-                    "MiddleName": ind.get("MiddleName"),
-                }
-            )
-            all_emails.extend(
-                flatten_array(
-                    ind.get("Emails", []),
+    # Write CSVs dynamically using schema definitions
+    with metrics.stage("write"):
+        files = []
+        if tables["emails"]:
+            files.append(
+                write_csv(
+                    "emails",
+                    tables["emails"],
                     schema["definitions"]["email"],
-                    {
-                        "LoadID": load_id,
-                        "LoadDateUTC": load_date,
-                        "PartyIdentifier": pid,
-                        "OwnerType": "I",
-                    },
+                    load_id,
+                    load_date,
                 )
             )
-            all_phones.extend(
-                flatten_array(
-                    ind.get("Phones", []),
+        if tables["phones"]:
+            files.append(
+                write_csv(
+                    "phones",
+                    tables["phones"],
                     schema["definitions"]["phone"],
-                    {
-                        "LoadID": load_id,
-                        "LoadDateUTC": load_date,
-                        "PartyIdentifier": pid,
-                        "OwnerType": "I",
-                    },
+                    load_id,
+                    load_date,
                 )
             )
-            for addr_type in [
-                "PhysicalAddress",
-                "PostalAddress",
-                "PreviousPhysicalAddress",
-            ]:
-                addr = ind.get(addr_type)
-                if addr:
-                    all_addresses.append(
-                        {
-                            "LoadID": load_id,
-                            "LoadDateUTC": load_date,
-                            "PartyIdentifier": pid,
-                            "OwnerType": "I",
-                            "AddressType": addr_type.replace("Address", ""),
-                            "AddressLines": "|".join(addr.get("AddressLines", [])),
-                        }
-                    )
-                    fa = addr.get("FormattedAddress", {})
-                    fa_row = {
-                        prop: fa.get(prop)
-                        for prop in schema["definitions"]["address"]["properties"][
-                            "FormattedAddress"
-                        ]["properties"].keys()
-                    }
-                    fa_row.update(
-                        {
-                            "LoadID": load_id,
-                            "LoadDateUTC": load_date,
-                            "PartyIdentifier": pid,
-                            "OwnerType": "I",
-                            "AddressType": addr_type.replace("Address", ""),
-                        }
-                    )
-                    all_formatted.append(fa_row)
-
-        # Organisation
-        org = party.get("OrganisationDetails")
-        if org:
-            pid = org.get("PartyIdentifier")
-            all_orgs.append(
-                {
-                    "LoadID": load_id,
-                    "LoadDateUTC": load_date,
-                    "PartyIdentifier": pid,
-                    "OwnerType": "O",
-                    "Name": org.get("Name"),
-                }
-            )
-            all_emails.extend(
-                flatten_array(
-                    org.get("Emails", []),
-                    schema["definitions"]["email"],
-                    {
-                        "LoadID": load_id,
-                        "LoadDateUTC": load_date,
-                        "PartyIdentifier": pid,
-                        "OwnerType": "O",
-                    },
+        if tables["addresses"]:
+            files.append(
+                write_csv(
+                    "addresses",
+                    tables["addresses"],
+                    {"properties": {"AddressLines": {"type": "string"}}},
+                    load_id,
+                    load_date,
                 )
             )
-            all_phones.extend(
-                flatten_array(
-                    org.get("Phones", []),
-                    schema["definitions"]["phone"],
-                    {
-                        "LoadID": load_id,
-                        "LoadDateUTC": load_date,
-                        "PartyIdentifier": pid,
-                        "OwnerType": "O",
-                    },
+        if tables["formattedAddresses"]:
+            files.append(
+                write_csv(
+                    "formattedAddresses",
+                    tables["formattedAddresses"],
+                    schema["definitions"]["address"]["properties"]["FormattedAddress"],
+                    load_id,
+                    load_date,
                 )
             )
-            for addr_type in ["PhysicalAddress", "PostalAddress"]:
-                addr = org.get(addr_type)
-                if addr:
-                    all_addresses.append(
-                        {
-                            "LoadID": load_id,
-                            "LoadDateUTC": load_date,
-                            "PartyIdentifier": pid,
-                            "OwnerType": "O",
-                            "AddressType": addr_type.replace("Address", ""),
-                            "AddressLines": "|".join(addr.get("AddressLines", [])),
-                        }
-                    )
-                    fa = addr.get("FormattedAddress", {})
-                    fa_row = {
-                        prop: fa.get(prop)
-                        for prop in schema["definitions"]["address"]["properties"][
-                            "FormattedAddress"
-                        ]["properties"].keys()
-                    }
-                    fa_row.update(
-                        {
-                            "LoadID": load_id,
-                            "LoadDateUTC": load_date,
-                            "PartyIdentifier": pid,
-                            "OwnerType": "O",
-                            "AddressType": addr_type.replace("Address", ""),
-                        }
-                    )
-                    all_formatted.append(fa_row)
-
-    # Write CSVs dynamically using schema definitions
-    files = []
-    if all_emails:
-        files.append(
-            write_csv(
-                "emails", all_emails, schema["definitions"]["email"], load_id, load_date
-            )
-        )
-    if all_phones:
-        files.append(
-            write_csv(
-                "phones", all_phones, schema["definitions"]["phone"], load_id, load_date
-            )
-        )
-    if all_addresses:
-        files.append(
-            write_csv(
-                "addresses",
-                all_addresses,
-                {"properties": {"AddressLines": {"type": "string"}}},
-                load_id,
-                load_date,
-            )
-        )
-    if all_formatted:
-        files.append(
-            write_csv(
-                "formattedAddresses",
-                all_formatted,
-                schema["definitions"]["address"]["properties"]["FormattedAddress"],
-                load_id,
-                load_date,
-            )
-        )
-    if all_individuals:
-        files.append(
-            write_csv(
-                "individual",
-                all_individuals,
-                schema["properties"]["IndividualDetails"],
-                load_id,
-                load_date,
+        if tables["individual"]:
+            files.append(
+                write_csv(
+                    "individual",
+                    tables["individual"],
+                    schema["properties"]["IndividualDetails"],
+                    load_id,
+                    load_date,
+                )
             )
-        )
-    if all_orgs:
-        files.append(
-            write_csv(
-                "organisation",
-                all_orgs,
-                schema["properties"]["OrganisationDetails"],
-                load_id,
-                load_date,
+        if tables["organisation"]:
+            files.append(
+                write_csv(
+                    "organisation",
+                    tables["organisation"],
+                    schema["properties"]["OrganisationDetails"],
+                    load_id,
+                    load_date,
+                )
             )
-        )
 
     # Log summary
     for fname, count in files:
+        metrics.table(fname.split("_")[0], rows=count, bytes=os.path.getsize(fname))
         log(f"Wrote {count} rows to {fname}")
+    metrics.write(
+        metrics_filename(load_id, load_date),
+        load_id=load_id,
+        load_date_utc=load_date,
+        parties=len(data),
+    )
 
     log(f"Completed load {load_id} with {len(data)} parties processed")
@@ -1,23 +1,151 @@
+import argparse
 import json
-from jsonschema import validate, Draft7Validator, exceptions
-
-# Load schema from external file
-with open("partyReferenceSchema.json", "r", encoding="utf-8") as f:
-    party_schema = json.load(f)
-
-# Load JSON data to validate from external file
-with open("partyReference.json", "r", encoding="utf-8") as f:
-    party_data = json.load(f)
-
-# Validate JSON against schema
-try:
-    validate(instance=party_data, schema=party_schema)
-    print("JSON is valid against schema ✅")
-except exceptions.ValidationError as e:
-    print("JSON validation error ❌:", e.message)
-
-# Optional: collect all errors
-validator = Draft7Validator(party_schema)
-errors = sorted(validator.iter_errors(party_data), key=lambda e: e.path)
-for error in errors:
-    print("Error at", list(error.path), ":", error.message)
+import logging
+
+from jsonschema import Draft7Validator
+
+from partyShards import map_shards
+from partyStream import iter_json_array
+from partyValidatorCompiler import UnsupportedSchema, load_compiled_validator
+
+_validators = {}
+
+
+def load_validator(schema_path="partyReferenceSchema.json", backend="jsonschema"):
+    """
+    Draft-7 validator for one party, the schema is checked and compiled once.
+    backend="compiled" uses the Python code generated by partyValidatorCompiler
+    (same error paths and messages), falling back to jsonschema if the schema
+    uses keywords the generator does not support.
+    """
+    key = (schema_path, backend)
+    if key not in _validators:
+        with open(schema_path, "r", encoding="utf-8") as f:
+            party_schema = json.load(f)
+        Draft7Validator.check_schema(party_schema)
+        validator = None
+        if backend == "compiled":
+            try:
+                validator = load_compiled_validator(schema_path)
+            except UnsupportedSchema as e:
+                logging.warning(f"Using jsonschema, cannot compile {schema_path}: {e}")
+        _validators[key] = validator or Draft7Validator(party_schema)
+    return _validators[key]
+
+
+def iter_parties(path):
+    """Parties of a top-level JSON array streamed one at a time, or a single party."""
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(4096).lstrip()[:1]
+    if first == "[":
+        return iter_json_array(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return iter([json.load(f)])
+
+
+def party_errors(validator, party, index):
+    """(path, message) of every error in one party, the path starts at its index."""
+    for error in sorted(validator.iter_errors(party), key=lambda e: e.path):
+        yield [index, *error.path], error.message
+
+
+def check_parties(validator, parties, start=0, max_errors=100):
+    """(party count, invalid count, errors) for parties numbered from start."""
+    party_count, invalid, errors = 0, 0, []
+    for index, party in enumerate(parties, start):
+        party_count += 1
+        if len(errors) >= max_errors:
+            # Error cap reached: only count, is_valid stops at the first error
+            invalid += not validator.is_valid(party)
+            continue
+        party_errs = list(party_errors(validator, party, index))
+        if party_errs:
+            invalid += 1
+            errors.extend(party_errs[: max_errors - len(errors)])
+    return party_count, invalid, errors
+
+
+def validate_shard(shard_index, parties, chunk_size, schema_path, max_errors, backend):
+    # Runs in a worker process: the validator is compiled once per process
+    return check_parties(
+        load_validator(schema_path, backend),
+        parties,
+        shard_index * chunk_size,
+        max_errors,
+    )
+
+
+def validate_parties(
+    parties,
+    schema_path="partyReferenceSchema.json",
+    max_errors=100,
+    workers=1,
+    chunk_size=5000,
+    backend="jsonschema",
+):
+    """
+    Validate every party against the schema in one pass.
+    Returns (party count, invalid party count, first max_errors errors).
+    Only one party (or one chunk per worker) is in memory at a time, and at most
+    max_errors errors are kept. With workers > 1 chunks of chunk_size parties
+    are validated on a process pool, errors still come back in input order.
+    """
+    if workers > 1:
+        party_count, invalid, errors = 0, 0, []
+        for count, shard_invalid, shard_errors in map_shards(
+            validate_shard,
+            parties,
+            workers,
+            chunk_size,
+            chunk_size,
+            schema_path,
+            max_errors,
+            backend,
+        ):
+            party_count += count
+            invalid += shard_invalid
+            errors.extend(shard_errors[: max_errors - len(errors)])
+        return party_count, invalid, errors
+
+    return check_parties(load_validator(schema_path, backend), parties, 0, max_errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate parties against the schema")
+    parser.add_argument(
+        "--input", default="partyReference.json", help="JSON array of parties"
+    )
+    parser.add_argument("--schema", default="partyReferenceSchema.json")
+    parser.add_argument(
+        "--max-errors", type=int, default=100, help="Stop collecting errors after N"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes for validation"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=5000, help="Parties per worker chunk"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["jsonschema", "compiled"],
+        default="jsonschema",
+        help="Generic Draft7Validator or code generated from the schema",
+    )
+    args = parser.parse_args()
+
+    party_count, invalid, errors = validate_parties(
+        iter_parties(args.input),
+        args.schema,
+        args.max_errors,
+        args.workers,
+        args.chunk_size,
+        args.backend,
+    )
+    if not invalid:
+        print(f"JSON is valid against schema ✅ ({party_count} parties)")
+    else:
+        print(f"JSON validation error ❌: {invalid} of {party_count} parties invalid")
+    for path, message in errors:
+        print("Error at", path, ":", message)
+    if len(errors) >= args.max_errors:
+        print(f"Showing the first {args.max_errors} errors")
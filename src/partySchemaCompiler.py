@@ -0,0 +1,361 @@
+import hashlib
+import importlib.util
+import json
+import os
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(SRC_DIR, "partyReferenceSchema.json")
+CACHE_DIR = os.path.join(SRC_DIR, "__pycache__", "partySchema")
+
+# Bump when the generated code changes so stale cache files are not reused
+COMPILER_VERSION = 3
+
+LOAD_PREFIX = ["LoadID", "LoadDateUTC", "PartyIdentifier", "OwnerType"]
+RUN_PREFIX = ["partyidentifier", "run_guid", "run_date_local", "run_date_utc"]
+RUN_ADDRESS_TABLES = [
+    "physical_addresses",
+    "postal_addresses",
+    "previous_physical_addresses",
+]
+
+_loaded = {}
+
+
+def load_row_builders(schema_path=SCHEMA_PATH, layout="load", address_dimension=False):
+    """
+    Row builder functions generated from partyReferenceSchema.json.
+    layout "load" gives the LoadID/LoadDateUTC columns of partyReferenceSchema.py,
+    "run" the lower-case columns of process_json and "run_manifest" the same
+    without the run columns, which a run manifest then records once.
+    Rows are namedtuples (ROW_TYPES) in TABLE_FIELDS column order, the per-party
+    PREFIX_FIELDS values are passed to each builder as one tuple.
+    COLUMN_TYPES gives the JSON schema type of every column ("string" for the
+    columns added by the flattener), for typed output formats.
+    address_dimension=True replaces the address tables by one row per
+    distinct address (ADDRESS_DIMENSION_TABLE) and per-party tables holding
+    only its key, built with address_content(), address_dimension_row() and
+    party_address_row().
+    """
+    kind = f"{layout}_address_dimension" if address_dimension else layout
+    return load_generated(
+        schema_path,
+        kind,
+        lambda schema, schema_name: generate_source(
+            schema, layout, schema_name, address_dimension
+        ),
+    )
+
+
+def load_generated(schema_path, kind, generate, version=COMPILER_VERSION):
+    """
+    Import the module source generate(schema, schema_name) builds for the schema.
+    The source is cached under __pycache__/partySchema keyed by a hash of the
+    schema, kind and version, so later runs (and every worker process) just
+    import it. Within a process the module is reused while the schema file's
+    mtime and size are unchanged, without reading or hashing it again.
+    """
+    stat = os.stat(schema_path)
+    loaded_key = (
+        os.path.abspath(schema_path),
+        kind,
+        version,
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
+    if loaded_key in _loaded:
+        return _loaded[loaded_key]
+    with open(schema_path, "rb") as f:
+        raw = f.read()
+    key = hashlib.sha256(raw + f"|{kind}|{version}".encode()).hexdigest()[:16]
+
+    path = os.path.join(CACHE_DIR, f"{kind}_{key}.py")
+    if not os.path.exists(path):
+        source = generate(json.loads(raw), os.path.basename(schema_path))
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write then rename so concurrent workers never import a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(source)
+        os.replace(tmp_path, path)
+
+    spec = importlib.util.spec_from_file_location(f"party_{kind}_{key}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _loaded[loaded_key] = module
+    return module
+
+
+def scalar_properties(schema_def):
+    # Columns of a table: properties that are not arrays, objects or $refs
+    return [
+        name
+        for name, prop in schema_def["properties"].items()
+        if "$ref" not in prop
+        and not {"array", "object"} & set(_as_list(prop.get("type", [])))
+    ]
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def json_type(prop):
+    # ["string", "null"] -> "string", untyped properties are read as strings
+    types = [t for t in _as_list(prop.get("type", [])) if t != "null"]
+    return types[0] if len(types) == 1 else "string"
+
+
+def _row_expr(row_type, values):
+    # tuple.__new__ skips the argument handling of the namedtuple constructor
+    return f"_new({row_type}, ({', '.join(values)}))"
+
+
+def generate_source(schema, layout, schema_name, address_dimension=False):
+    definitions = schema["definitions"]
+    owners = {
+        "individual": schema["properties"]["IndividualDetails"],
+        "organisation": schema["properties"]["OrganisationDetails"],
+    }
+    source_defs = {
+        "emails": definitions["email"],
+        "phones": definitions["phone"],
+        "formatted": definitions["address"]["properties"]["FormattedAddress"],
+        **owners,
+    }
+    fields = {
+        source: scalar_properties(source_def)
+        for source, source_def in source_defs.items()
+    }
+    for table in owners:
+        fields[table] = [p for p in fields[table] if p != "PartyIdentifier"]
+
+    if layout == "load":
+        # Every table starts with the LOAD_PREFIX columns, passed in as one tuple
+        prefix_fields, column = LOAD_PREFIX, str
+        head, tail = ["*prefix"], []
+        table_fields = {
+            "addresses": [*LOAD_PREFIX, "AddressType", "AddressLines"],
+            "formattedAddresses": [*LOAD_PREFIX, "AddressType", *fields["formatted"]],
+            "emails": [*LOAD_PREFIX, *fields["emails"]],
+            "phones": [*LOAD_PREFIX, *fields["phones"]],
+            "individual": [*LOAD_PREFIX, *fields["individual"]],
+            "organisation": [*LOAD_PREFIX, *fields["organisation"]],
+        }
+        row_types = {
+            "addresses": "AddressRow",
+            "formattedAddresses": "FormattedAddressRow",
+            "emails": "EmailRow",
+            "phones": "PhoneRow",
+            "individual": "IndividualRow",
+            "organisation": "OrganisationRow",
+        }
+        sources = {
+            "formattedAddresses": "formatted",
+            **{t: t for t in ("emails", "phones", "individual", "organisation")},
+        }
+        if address_dimension:
+            dimension_table, key_column = "addressDimension", "AddressKey"
+            dimension_content = ["AddressLines", *fields["formatted"]]
+            del table_fields["addresses"], table_fields["formattedAddresses"]
+            del row_types["addresses"], row_types["formattedAddresses"]
+            table_fields["partyAddresses"] = [*LOAD_PREFIX, "AddressType", "AddressKey"]
+            row_types["partyAddresses"] = "PartyAddressRow"
+            table_fields[dimension_table] = [
+                "LoadID",
+                "LoadDateUTC",
+                "AddressKey",
+                *dimension_content,
+            ]
+    else:
+        # process_json order: partyidentifier, the other columns alphabetical and
+        # the run columns last, so the (partyidentifier, *run) prefix is split
+        prefix_fields = RUN_PREFIX if layout == "run" else RUN_PREFIX[:1]
+        column, head = str.lower, ["prefix[0]"]
+        tail = [f"prefix[{i}]" for i in range(1, len(prefix_fields))]
+
+        def run_fields(columns):
+            return [prefix_fields[0], *sorted(columns), *prefix_fields[1:]]
+
+        table_fields = {
+            "emails": run_fields(map(column, fields["emails"])),
+            "phones": run_fields(map(column, fields["phones"])),
+        }
+        row_types = {"emails": "EmailRow", "phones": "PhoneRow"}
+        sources = {"emails": "emails", "phones": "phones"}
+        address_columns = ["addresslines", *map(column, fields["formatted"])]
+        for table in RUN_ADDRESS_TABLES:
+            if address_dimension:
+                table_fields[table] = run_fields(["address_key"])
+                row_types[table] = "PartyAddressRow"
+            else:
+                table_fields[table] = run_fields(address_columns)
+                row_types[table] = "AddressRow"
+                sources[table] = "formatted"
+        if address_dimension:
+            dimension_table, key_column = "address_dimension", "address_key"
+            dimension_content = sorted(address_columns)
+            table_fields[dimension_table] = [
+                "address_key",
+                *dimension_content,
+                *prefix_fields[1:],
+            ]
+    if address_dimension:
+        row_types[dimension_table] = "AddressDimensionRow"
+        sources[dimension_table] = "formatted"
+
+    column_types = {}
+    for table, columns in table_fields.items():
+        source = sources.get(table)
+        types = {
+            column(prop): json_type(source_defs[source]["properties"][prop])
+            for prop in (fields[source] if source else ())
+        }
+        column_types[table] = {c: types.get(c, "string") for c in columns}
+
+    def values(table, source, **exprs):
+        # Row values in TABLE_FIELDS order: the prefix, then for each column the
+        # expression given for it or a get() of its schema property
+        exprs.update((column(prop), f"get({prop!r})") for prop in fields[source])
+        columns = table_fields[table][len(prefix_fields) - len(tail) :]
+        return [*head, *(exprs[c] for c in columns[: len(columns) - len(tail)]), *tail]
+
+    lines = [
+        f"# Generated from {schema_name} by partySchemaCompiler - do not edit",
+        "from collections import namedtuple",
+        "",
+        "_new = tuple.__new__",
+        "",
+        f"PREFIX_FIELDS = {tuple(prefix_fields)!r}",
+        "",
+        *(
+            [
+                f"ADDRESS_DIMENSION_TABLE = {dimension_table!r}",
+                f"ADDRESS_KEY_COLUMN = {key_column!r}",
+                "",
+            ]
+            if address_dimension
+            else []
+        ),
+        "TABLE_FIELDS = {",
+        *(f"    {table!r}: {tuple(names)!r}," for table, names in table_fields.items()),
+        "}",
+        "",
+        "COLUMN_TYPES = {",
+        *(f"    {table!r}: {types!r}," for table, types in column_types.items()),
+        "}",
+        "",
+    ]
+    # One row type per table layout, the run address tables share AddressRow
+    first_table = {}
+    for table, row_type in row_types.items():
+        first_table.setdefault(row_type, table)
+    lines += [
+        f"{row_type} = namedtuple({row_type!r}, TABLE_FIELDS[{table!r}])"
+        for row_type, table in first_table.items()
+    ]
+    lines += [
+        "",
+        "ROW_TYPES = {",
+        *(f"    {table!r}: {row_type}," for table, row_type in row_types.items()),
+        "}",
+        "",
+    ]
+
+    if address_dimension:
+        # The dimension row is (key, *content) with the run columns around it
+        # as in the other tables, content the address columns in table order
+        lines_expr = (
+            '"|".join(address_lines) if address_lines is not None else None'
+            if layout == "load"
+            else '" | ".join(address_lines) if address_lines else None'
+        )
+        exprs = {column(p): f"get({p!r})" for p in fields["formatted"]}
+        exprs[column("AddressLines")] = "address_lines"
+        if layout == "load":
+            dimension_values = ["*prefix", "*content"]
+            party_values = ["*prefix", "addr_type", "address_key"]
+            party_args = "prefix, addr_type, address_key"
+        else:
+            dimension_values = ["prefix[0]", "*content", *tail]
+            party_values = ["prefix[0]", "address_key", *tail]
+            party_args = "prefix, address_key"
+        lines += [
+            "",
+            "_EMPTY = {}",
+            "",
+            "",
+            "def address_content(addr):",
+            '    address_lines = addr.get("AddressLines")',
+            f"    address_lines = {lines_expr}",
+            '    get = (addr.get("FormattedAddress") or _EMPTY).get',
+            f"    return ({', '.join(exprs[c] for c in dimension_content)},)",
+            "",
+            "",
+            "def address_dimension_row(prefix, content):",
+            f"    return {_row_expr('AddressDimensionRow', dimension_values)}",
+            "",
+            "",
+            f"def party_address_row({party_args}):",
+            f"    return {_row_expr('PartyAddressRow', party_values)}",
+            "",
+        ]
+
+    if layout == "load":
+        for table in ("individual", "organisation"):
+            lines += [
+                "",
+                f"def {table}_row(prefix, details):",
+                "    get = details.get",
+                f"    return {_row_expr(row_types[table], values(table, table))}",
+                "",
+            ]
+    if layout == "load" and not address_dimension:
+        lines += [
+            "",
+            "def address_lines_row(prefix, addr_type, address_lines):",
+            "    return "
+            + _row_expr(
+                "AddressRow",
+                [*head, "addr_type", '"|".join(address_lines)'],
+            ),
+            "",
+            "",
+            "def formatted_address_row(prefix, addr_type, fa):",
+            "    get = fa.get",
+            "    return "
+            + _row_expr(
+                "FormattedAddressRow",
+                values("formattedAddresses", "formatted", AddressType="addr_type"),
+            ),
+            "",
+        ]
+    elif not address_dimension:
+        lines += [
+            "",
+            "_EMPTY = {}",
+            "",
+            "",
+            "def address_row(prefix, addr):",
+            '    address_lines = addr.get("AddressLines")',
+            '    address_lines = " | ".join(address_lines) if address_lines else None',
+            '    get = (addr.get("FormattedAddress") or _EMPTY).get',
+            "    return "
+            + _row_expr(
+                "AddressRow",
+                values(
+                    RUN_ADDRESS_TABLES[0], "formatted", addresslines="address_lines"
+                ),
+            ),
+            "",
+        ]
+
+    for table in ("emails", "phones"):
+        name = table[:-1]
+        lines += [
+            "",
+            f"def {name}_row(prefix, item):",
+            "    get = item.get",
+            f"    return {_row_expr(row_types[table], values(table, table))}",
+            "",
+        ]
+    return "\n".join(lines)
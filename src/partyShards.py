@@ -0,0 +1,179 @@
+import csv
+import os
+import re
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from csvCodecs import open_csv
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_shards(shard_fn, parties, workers, chunk_size, *args, start=0):
+    """
+    Split parties into chunks and run shard_fn(shard_index, chunk, *args) on a
+    process pool. Results are yielded in shard order, and only a couple of
+    chunks per worker are in flight so a streamed input stays bounded.
+    shard_fn must be a module-level function so it can be pickled.
+    Shard indexes count from start, e.g. the first shard after a resume.
+    """
+    return map_tasks(
+        shard_fn, chunked(parties, chunk_size), workers, *args, start=start
+    )
+
+
+def map_tasks(shard_fn, tasks, workers, *args, start=0):
+    """
+    map_shards for ready-made tasks, e.g. NdjsonReader byte ranges that each
+    worker reads itself: shard_fn(shard_index, task, *args) per task.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for shard_index, task in enumerate(tasks, start):
+            pending.append(pool.submit(shard_fn, shard_index, task, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# <table>.<shard index>.<suffix>, as named by shard_path
+_SHARD_NAME = re.compile(r"[^.]+\.([0-9]{6})\..+")
+
+
+def shard_path(shard_dir, table, shard_index, suffix=".csv"):
+    return os.path.join(shard_dir, f"{table}.{shard_index:06d}{suffix}")
+
+
+def shard_index_of(name):
+    """Shard index of a shard_path file name, None for any other file."""
+    match = _SHARD_NAME.fullmatch(name)
+    return int(match.group(1)) if match else None
+
+
+def remove_shard(shard_dir, shard_index):
+    """Remove the shard of every table written for shard_index, e.g. a failed one."""
+    for name in os.listdir(shard_dir):
+        if shard_index_of(name) == shard_index:
+            os.remove(os.path.join(shard_dir, name))
+
+
+def remove_shards_from(shard_dir, first_index):
+    """
+    Remove the shards from first_index on, e.g. those written after the
+    checkpoint a run resumes from, and .tmp files left by a write that was
+    cut short. Anything else (the checkpoint) is kept.
+    """
+    for name in os.listdir(shard_dir):
+        shard_index = shard_index_of(name)
+        if name.endswith(".tmp") or (
+            shard_index is not None and shard_index >= first_index
+        ):
+            os.remove(os.path.join(shard_dir, name))
+
+
+def merge_csv_shards(shard_paths, dest_path, header=None):
+    """
+    Concatenate CSV shards (each with its own header) into dest_path in the
+    given order, keeping only the first header. Missing shards are skipped,
+    and no file is created if every shard is missing.
+    With header (csvCodecs.header_bytes) the shards have no header line and
+    are copied whole after it, which also works for gzip/zstd shards.
+    The shards are removed once dest_path is complete, so a merge that dies
+    can be run again.
+    """
+    existing = [p for p in shard_paths if os.path.exists(p)]
+    if not existing:
+        return None
+    with open(dest_path, "wb") as dest:
+        if header is not None:
+            dest.write(header)
+        for i, path in enumerate(existing):
+            with open(path, "rb") as src:
+                if header is None:
+                    first_line = src.readline()
+                    if i == 0:
+                        dest.write(first_line)
+                shutil.copyfileobj(src, dest, 1 << 20)
+    for path in existing:
+        os.remove(path)
+    return dest_path
+
+
+def merge_parquet_shards(shard_paths, dest_path, compression=None):
+    """
+    Parquet counterpart of merge_csv_shards: the row groups of the shards are
+    copied into dest_path in the given order, one row group at a time.
+    """
+    import pyarrow.parquet as pq
+
+    existing = [p for p in shard_paths if os.path.exists(p)]
+    if not existing:
+        return None
+    writer = None
+    for path in existing:
+        shard = pq.ParquetFile(path)
+        if writer is None:
+            writer = pq.ParquetWriter(
+                dest_path, shard.schema_arrow, compression=compression or "snappy"
+            )
+        for i in range(shard.num_row_groups):
+            writer.write_table(shard.read_row_group(i))
+        shard.close()
+    writer.close()
+    for path in existing:
+        os.remove(path)
+    return dest_path
+
+
+def _shard_rows(path, compression="infer"):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        shard = pq.ParquetFile(path)
+        for i in range(shard.num_row_groups):
+            columns = [c.to_pylist() for c in shard.read_row_group(i).columns]
+            yield from zip(*columns)
+        shard.close()
+        return
+    with open_csv(path, "r", compression) as f:
+        # The writer turned None into an empty field
+        for row in csv.reader(f):
+            yield tuple(value if value != "" else None for value in row)
+
+
+def merge_unique_shards(shard_paths, writer, key_position=0, compression="infer"):
+    """
+    Merge header-less shards into writer (a CsvTableWriter,
+    ParquetTableWriter, SqlTableSink or TeeWriter of them), keeping only the
+    first row of each key, for tables such as the address dimension where
+    every shard writes the rows of the keys it has seen. Rows are decoded
+    and written again rather than copied, empty CSV fields as None;
+    compression is the codec of CSV shards, from their names by default.
+    The shards are removed once the writer is closed. Returns the rows
+    written. The keys written are held in a set, so memory is O(distinct
+    keys), like the AddressDimension that produced the shards.
+    """
+    existing = [p for p in shard_paths if os.path.exists(p)]
+    if not existing:
+        return 0
+    seen = set()
+    with writer:
+        for path in existing:
+            for row in _shard_rows(path, compression):
+                key = row[key_position]
+                if key not in seen:
+                    seen.add(key)
+                    writer.writerow(row)
+    for path in existing:
+        os.remove(path)
+    return writer.rows_written
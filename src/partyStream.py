@@ -0,0 +1,257 @@
+import argparse
+import glob
+import io
+import json
+import os
+
+_WHITESPACE = " \t\r\n"
+
+# Files taken from an input directory
+INPUT_EXTENSIONS = (".json", ".ndjson", ".jsonl")
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Yield the elements of a top-level JSON array one at a time.
+    Only the element currently being decoded is held in memory, so a multi-GB
+    party extract is read in constant memory.
+    """
+    return iter(JsonArrayReader(path, chunk_size))
+
+
+class JsonArrayReader:
+    """
+    The elements of a top-level JSON array, like iter_json_array, that also
+    knows the byte offset just past the last element yielded (offset()). A
+    reader created with start=offset picks up from there, e.g. to resume a
+    run from a checkpoint without decoding the parties before it.
+    """
+
+    def __init__(self, path, chunk_size=1 << 16, start=0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.start = start
+        # Byte offset of the buffer's first character, and the buffer
+        # position past the last element yielded
+        self._base = start
+        self._buf = ""
+        self._end = 0
+
+    def offset(self):
+        return self._base + len(self._buf[: self._end].encode("utf-8"))
+
+    def from_offset(self, offset):
+        return JsonArrayReader(self.path, self.chunk_size, offset)
+
+    def __iter__(self):
+        decoder = json.JSONDecoder()
+        with open(self.path, "rb") as raw:
+            raw.seek(self.start)
+            # newline="" keeps CRLFs as two characters, so offset() counts bytes
+            f = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            chunk_size = self.chunk_size
+            buf = f.read(chunk_size)
+            eof = not buf
+            pos = _skip(buf, 0, _WHITESPACE)
+            if self.start == 0:
+                if pos >= len(buf) or buf[pos] != "[":
+                    raise ValueError(
+                        f"{self.path} does not contain a top-level JSON array"
+                    )
+                pos += 1
+            read_size = chunk_size
+
+            while True:
+                pos = _skip(buf, pos, _WHITESPACE + ",")
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    if pos >= len(buf):
+                        raise json.JSONDecodeError("Buffer exhausted", buf, pos)
+                    obj, end = decoder.raw_decode(buf, pos)
+                    # A scalar cut at the buffer edge can decode "successfully" - refill first
+                    if end >= len(buf) and not eof:
+                        raise json.JSONDecodeError("Element at buffer edge", buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = f.read(read_size)
+                    eof = not chunk
+                    self._base += len(buf[:pos].encode("utf-8"))
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                    self._buf, self._end = buf, 0
+                    # Grow the read size so one very large party is not re-decoded many times
+                    read_size = max(chunk_size, len(buf))
+                    continue
+                self._buf, self._end = buf, end
+                yield obj
+                pos = end
+                read_size = chunk_size
+
+
+def _skip(buf, pos, chars):
+    while pos < len(buf) and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+class NdjsonReader:
+    """
+    The parties of a newline-delimited JSON file (one JSON object per line,
+    blank lines skipped), optionally only the lines starting in the byte
+    range [start, end). Like JsonArrayReader it knows the byte offset past
+    the last party yielded. split() cuts the range into line-aligned pieces
+    that separate processes can read without any coordination; a reader is
+    just a path and two offsets, so it pickles cheaply.
+    """
+
+    def __init__(self, path, start=0, end=None):
+        self.path = path
+        self.start = start
+        self.end = end
+        self._offset = start
+
+    def offset(self):
+        return self._offset
+
+    def from_offset(self, offset):
+        return NdjsonReader(self.path, offset, self.end)
+
+    def __iter__(self):
+        end = os.path.getsize(self.path) if self.end is None else self.end
+        with open(self.path, "rb") as f:
+            f.seek(self.start)
+            position = self.start
+            while position < end:
+                line = f.readline()
+                if not line:
+                    return
+                line_start, position = position, position + len(line)
+                if line.isspace():
+                    continue
+                try:
+                    party = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(
+                        f"{self.path}: invalid JSON line at byte {line_start}: {e}"
+                    ) from None
+                self._offset = position
+                yield party
+
+    def split(self, range_bytes):
+        """Readers of consecutive line-aligned ranges of about range_bytes each."""
+        return [
+            NdjsonReader(self.path, start, end)
+            for start, end in ndjson_ranges(
+                self.path, range_bytes, self.start, self.end
+            )
+        ]
+
+
+def ndjson_ranges(path, range_bytes, start=0, end=None):
+    """
+    (start, end) byte ranges covering [start, end) of an NDJSON file, each
+    about range_bytes long and moved on to the next line start, so every
+    line falls in exactly one range. start must be a line start.
+    """
+    end = os.path.getsize(path) if end is None else end
+    ranges = []
+    with open(path, "rb") as f:
+        while start < end:
+            stop = start + max(range_bytes, 1)
+            if stop < end:
+                # From the byte before stop, so a stop already at a line
+                # start stays there
+                f.seek(stop - 1)
+                stop = min(stop - 1 + len(f.readline()), end)
+            else:
+                stop = end
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def ndjson_range_bytes(path, parties, sample_bytes=1 << 20):
+    # Bytes of about that many parties, from the lines in the first MiB
+    with open(path, "rb") as f:
+        lines = [line for line in f.readlines(sample_bytes) if not line.isspace()]
+    if not lines:
+        return 1 << 20
+    return max(1, parties * sum(map(len, lines)) // len(lines))
+
+
+def is_ndjson(path):
+    """True if path holds NDJSON rather than one JSON array (first character)."""
+    with open(path, "rb") as f:
+        while True:
+            char = f.read(1)
+            if not char or char not in b" \t\r\n\xef\xbb\xbf":
+                return char != b"["
+
+
+def open_parties(path):
+    """A reader of the parties in path: NdjsonReader or JsonArrayReader."""
+    return NdjsonReader(path) if is_ndjson(path) else JsonArrayReader(path)
+
+
+def input_files(spec):
+    """
+    The input files of spec, sorted: a file is itself, a directory gives
+    its .json/.ndjson/.jsonl files and anything else is a glob pattern.
+    """
+    if os.path.isfile(spec):
+        return [spec]
+    if os.path.isdir(spec):
+        paths = [
+            os.path.join(spec, name)
+            for name in os.listdir(spec)
+            if name.lower().endswith(INPUT_EXTENSIONS)
+        ]
+    else:
+        paths = glob.glob(spec)
+    paths = sorted(p for p in paths if os.path.isfile(p))
+    if not paths:
+        raise FileNotFoundError(f"No input files match {spec}")
+    return paths
+
+
+class PartyFiles:
+    """
+    The parties of several input files (see input_files), file after file.
+    Multi-file runs hand each path to a worker instead of iterating here.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def __iter__(self):
+        for path in self.paths:
+            yield from open_parties(path)
+
+
+def json_array_to_ndjson(src_path, dest_path):
+    """
+    Convert a top-level JSON array file to NDJSON, one party per line,
+    streaming. Returns the party count.
+    """
+    count = 0
+    tmp_path = f"{dest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        for party in iter_json_array(src_path):
+            f.write(json.dumps(party, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, dest_path)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a JSON array of parties to NDJSON (one per line)"
+    )
+    parser.add_argument("--input", required=True, help="Input JSON array")
+    parser.add_argument("--output", required=True, help="Output NDJSON file")
+    args = parser.parse_args()
+    count = json_array_to_ndjson(args.input, args.output)
+    print(f"Wrote {count} parties to {args.output}")
@@ -0,0 +1,208 @@
+import argparse
+import json
+import time
+from collections import namedtuple
+
+from jsonschema import Draft7Validator
+
+from partySchemaCompiler import SCHEMA_PATH, load_generated
+
+# Bump when the generated code changes so stale cache files are not reused
+VALIDATOR_VERSION = 1
+
+
+class UnsupportedSchema(Exception):
+    """The schema uses a keyword or form the validator generator does not cover."""
+
+
+# Same attributes party_errors reads from a jsonschema ValidationError
+SchemaError = namedtuple("SchemaError", ["path", "message"])
+
+# Draft-7 type checks (jsonschema's TYPE_CHECKER), {} is the value expression
+TYPE_CHECKS = {
+    "string": "{}.__class__ is str or isinstance({}, str)",
+    "null": "{} is None",
+    "boolean": "isinstance({}, bool)",
+    "object": "isinstance({}, dict)",
+    "array": "isinstance({}, list)",
+    "integer": "(isinstance({}, int) and not isinstance({}, bool))"
+    " or (isinstance({}, float) and {}.is_integer())",
+    "number": "isinstance({}, numbers.Number) and not isinstance({}, bool)",
+}
+
+# Annotations without validation behaviour
+IGNORED_KEYWORDS = {
+    "$schema",
+    "$id",
+    "$comment",
+    "title",
+    "description",
+    "default",
+    "examples",
+    "definitions",
+}
+
+
+def load_compiled_validator(schema_path=SCHEMA_PATH):
+    """
+    Validator generated as plain Python from the schema, a drop-in for the
+    Draft7Validator iter_errors/is_valid used by partyReferenceValidation.
+    Raises UnsupportedSchema for schema keywords the generator does not cover.
+    """
+    module = load_generated(
+        schema_path, "validator", generate_validator_source, VALIDATOR_VERSION
+    )
+    return CompiledValidator(module.validate)
+
+
+class CompiledValidator:
+    def __init__(self, validate):
+        self._validate = validate
+
+    def iter_errors(self, instance):
+        return map(SchemaError._make, self._validate(instance))
+
+    def is_valid(self, instance):
+        return not self._validate(instance)
+
+
+class _Generator:
+    """
+    Emits one function per definition plus the root, each appending
+    (path, message) tuples to `errors` in jsonschema's order: schema keywords
+    in document order, properties in schema order, array items by index.
+    """
+
+    def __init__(self, schema):
+        self.definitions = schema.get("definitions", {})
+        self.functions = {}
+        self.counter = 0
+
+    def new_name(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def function(self, name, schema):
+        self.functions[name] = None  # reserve, definitions may refer to themselves
+        body = self.node(schema, "x", [], 1)
+        lines = [f"def {name}(x, path, errors):"]
+        lines += body or ["    pass"]
+        self.functions[name] = lines
+        return name
+
+    def ref(self, ref):
+        prefix = "#/definitions/"
+        if not ref.startswith(prefix) or ref[len(prefix) :] not in self.definitions:
+            raise UnsupportedSchema(f"Unsupported $ref: {ref}")
+        definition = ref[len(prefix) :]
+        name = "_def_" + "".join(c if c.isalnum() else "_" for c in definition)
+        if name not in self.functions:
+            self.function(name, self.definitions[definition])
+        return name
+
+    def node(self, schema, var, path, depth):
+        pad = "    " * depth
+        path_expr = f"path + ({', '.join(path)},)" if path else "path"
+        if schema is True or schema == {}:
+            return []
+        if not isinstance(schema, dict):
+            raise UnsupportedSchema("Boolean false schemas are not supported")
+        if "$ref" in schema:
+            # Draft 7 ignores the siblings of $ref
+            return [f"{pad}{self.ref(schema['$ref'])}({var}, {path_expr}, errors)"]
+
+        lines = []
+        for keyword, value in schema.items():
+            if keyword == "type":
+                types = value if isinstance(value, list) else [value]
+                checks = " or ".join(
+                    f"({TYPE_CHECKS[t].replace('{}', var)})" for t in types
+                )
+                reprs = ", ".join(repr(t) for t in types)
+                message = f"{{{var}!r}} is not of type {reprs}"
+                lines += [
+                    f"{pad}if not ({checks}):",
+                    f"{pad}    errors.append(({path_expr}, f{message!r}))",
+                ]
+            elif keyword == "properties":
+                block = []
+                for prop, subschema in value.items():
+                    child = self.new_name("v")
+                    body = self.node(subschema, child, [*path, repr(prop)], depth + 2)
+                    if body:
+                        block += [
+                            f"{pad}    if {prop!r} in {var}:",
+                            f"{pad}        {child} = {var}[{prop!r}]",
+                            *body,
+                        ]
+                if block:
+                    lines += [f"{pad}if isinstance({var}, dict):", *block]
+            elif keyword == "items":
+                if isinstance(value, list):
+                    raise UnsupportedSchema("Tuple items are not supported")
+                index, child = self.new_name("i"), self.new_name("v")
+                body = self.node(value, child, [*path, index], depth + 2)
+                if body:
+                    lines += [
+                        f"{pad}if isinstance({var}, list):",
+                        f"{pad}    for {index}, {child} in enumerate({var}):",
+                        *body,
+                    ]
+            elif keyword not in IGNORED_KEYWORDS:
+                raise UnsupportedSchema(f"Unsupported schema keyword: {keyword}")
+        return lines
+
+
+def generate_validator_source(schema, schema_name):
+    generator = _Generator(schema)
+    generator.function("_root", schema)
+    lines = [
+        f"# Generated from {schema_name} by partyValidatorCompiler - do not edit",
+        "import numbers",
+        "",
+    ]
+    for function_lines in generator.functions.values():
+        lines += ["", *function_lines, ""]
+    lines += [
+        "",
+        "def validate(instance):",
+        "    errors = []",
+        "    _root(instance, (), errors)",
+        "    return errors",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from partyReferenceValidation import iter_parties, party_errors
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the generated validator against Draft7Validator"
+    )
+    parser.add_argument("--input", default="partyReference.json")
+    parser.add_argument("--schema", default=SCHEMA_PATH)
+    args = parser.parse_args()
+
+    with open(args.schema, "r", encoding="utf-8") as f:
+        reference = Draft7Validator(json.load(f))
+    compiled = load_compiled_validator(args.schema)
+
+    # Only validation is timed, parsing the input costs the same for both
+    results = {}
+    for name, validator in [("jsonschema", reference), ("compiled", compiled)]:
+        elapsed, errors, party_count = 0.0, [], 0
+        for index, party in enumerate(iter_parties(args.input)):
+            start = time.perf_counter()
+            errors.extend(party_errors(validator, party, index))
+            elapsed += time.perf_counter() - start
+            party_count = index + 1
+        results[name] = (elapsed, errors)
+        print(
+            f"{name:<12} {elapsed:8.2f}s {party_count / elapsed:10.0f} parties/s "
+            f"{len(errors)} errors"
+        )
+
+    same = results["jsonschema"][1] == results["compiled"][1]
+    print(f"Same error paths and messages: {same}")
+    print(f"Speedup: {results['jsonschema'][0] / results['compiled'][0]:.1f}x")
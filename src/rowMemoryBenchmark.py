@@ -0,0 +1,55 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from partyFlattener import TABLE_FIELDS, PartyFlattener
+from partyGenerator import generate_parties
+from runMetrics import peak_rss_mb
+
+
+def hold_rows(parties, row_format, seed=0):
+    """
+    Flatten `parties` generated parties and keep every row in memory, as the
+    LoadID entry points do before writing. row_format "dict" stores each row
+    as a plain dict, the representation used before the row tuples.
+    Returns (rows, seconds, peak RSS MB).
+    """
+    flattener = PartyFlattener("load-id", "2024-01-01T00:00:00Z")
+    tables = {table: [] for table in TABLE_FIELDS}
+    if row_format == "dict":
+        sinks = {
+            table: lambda row, add=rows.append: add(row._asdict())
+            for table, rows in tables.items()
+        }
+    else:
+        sinks = {table: rows.append for table, rows in tables.items()}
+    start = time.perf_counter()
+    for party in generate_parties(parties, seed):
+        flattener.flatten(party, sinks)
+    seconds = time.perf_counter() - start
+    return sum(map(len, tables.values())), seconds, peak_rss_mb()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory of the flattened rows of N parties, dict vs tuple rows"
+    )
+    parser.add_argument("--parties", type=int, default=1000000)
+    args = parser.parse_args()
+
+    # One fresh process per measurement so peak RSS is not shared
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        baseline = pool.submit(peak_rss_mb).result()
+    results = {}
+    for row_format in ("dict", "tuple"):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            rows, seconds, peak = pool.submit(
+                hold_rows, args.parties, row_format
+            ).result()
+        results[row_format] = peak - baseline
+        print(
+            f"{row_format:<6} {rows} rows {seconds:7.1f}s "
+            f"{peak - baseline:9.1f} MB above baseline "
+            f"{(peak - baseline) * (1 << 20) / rows:6.0f} bytes/row"
+        )
+    print(f"Tuple rows use {results['tuple'] / results['dict']:.0%} of the dict memory")
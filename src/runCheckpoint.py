@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+from itertools import islice
+
+from partyStream import JsonArrayReader, NdjsonReader
+
+# Inputs resumed by byte offset
+STREAM_READERS = (JsonArrayReader, NdjsonReader)
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def read_checkpoint(directory) -> dict:
+    """The checkpoint in directory, {} if there is none."""
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_checkpoint(directory, state: dict):
+    # Write then rename, a crash never leaves a partial checkpoint
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+    logging.info(f"Checkpoint after {state.get('parties', 0)} parties")
+    return path
+
+
+def input_position(parties, party_count, offset=None) -> dict:
+    """
+    Checkpoint fields for the input after party_count parties, at offset
+    (default the reader's offset()).
+    """
+    if isinstance(parties, STREAM_READERS):
+        return {
+            "parties": party_count,
+            "input": os.path.abspath(parties.path),
+            "input_offset": parties.offset() if offset is None else offset,
+        }
+    return {"parties": party_count, "input": None, "input_offset": None}
+
+
+def track_offsets(parties, every, offsets: list, parties_before=0):
+    """
+    Yield parties, appending input_position() to offsets after each `every`
+    parties and at the end, i.e. at every chunk boundary of a sharded run.
+    parties_before counts the parties done before a resume.
+    """
+    count = 0
+    for party in parties:
+        yield party
+        count += 1
+        if count % every == 0:
+            offsets.append(input_position(parties, parties_before + count))
+    if count % every:
+        offsets.append(input_position(parties, parties_before + count))
+
+
+def resume_input(parties, state: dict):
+    """
+    The parties after a checkpoint: a JsonArrayReader or NdjsonReader of the
+    checkpointed input starts at its byte offset, any other iterable skips
+    the parties already done.
+    """
+    if isinstance(parties, STREAM_READERS) and state.get("input_offset") is not None:
+        if os.path.abspath(parties.path) != state["input"]:
+            raise ValueError(
+                f"Checkpoint is for input {state['input']}, not {parties.path}"
+            )
+        return parties.from_offset(state["input_offset"])
+    return islice(parties, state["parties"], None)
@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from tableWriters import output_table_name
+
+
+def peak_rss_mb():
+    """Peak RSS in MB of this process and its finished children, None on Windows."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and KB on Linux
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+class RunMetrics:
+    """
+    Timing and resource metrics of one run, per stage and per output table.
+    A stage records wall and CPU seconds and the peak RSS so far. Streamed
+    stages split their wall time further: time spent pulling input (parse),
+    in the table writers (write, sampled) and the rest (flatten).
+    Worker processes collect their own RunMetrics, merged in with a worker_
+    prefix since their CPU time is not part of this process.
+    Multi-file runs also record each input file (input_file).
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.tables = {}
+        self.files = []
+
+    @contextmanager
+    def stage(self, name):
+        record = self.stages.setdefault(name, {})
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            self.add(record, "wall_seconds", time.perf_counter() - wall)
+            self.add(record, "cpu_seconds", time.process_time() - cpu)
+            record["peak_rss_mb"] = peak_rss_mb()
+
+    @staticmethod
+    def add(record, key, value):
+        record[key] = record.get(key, 0) + value
+
+    def timed_iter(self, iterable, stage, key="parse_seconds"):
+        """Yield from iterable, adding the time spent producing items to the stage."""
+        record = self.stages.setdefault(stage, {})
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(record, key, time.perf_counter() - start)
+            yield item
+
+    def timed_sinks(self, sinks: dict, stage, key="write_seconds", every=16):
+        """
+        Sinks that add the time spent in the wrapped sinks to the stage, for
+        callers that use them for one party in `every` and the plain sinks
+        otherwise: the sampled time is scaled up, as timing every row would
+        cost more than the CSV writes it measures.
+        """
+        record = self.stages.setdefault(stage, {})
+        perf_counter = time.perf_counter
+
+        def timed(sink):
+            def emit(row):
+                start = perf_counter()
+                sink(row)
+                record[key] = record.get(key, 0) + (perf_counter() - start) * every
+
+            return emit
+
+        return {table: timed(sink) for table, sink in sinks.items()}
+
+    def split_stage(self, stage, rest_key="flatten_seconds"):
+        # What is left of the wall time once parse and write are taken out
+        record = self.stages[stage]
+        record[rest_key] = (
+            record["wall_seconds"]
+            - record.get("parse_seconds", 0)
+            - record.get("write_seconds", 0)
+        )
+
+    def table(self, table, **values):
+        record = self.tables.setdefault(table, {})
+        for key, value in values.items():
+            self.add(record, key, value)
+
+    def table_rows(self, writers: dict, prefix=""):
+        for table, writer in writers.items():
+            if writer.rows_written:
+                self.table(f"{prefix}{table}", rows=writer.rows_written)
+
+    def csv_bytes(self, output_dir):
+        """
+        Bytes of every output file (CSV, compressed or not, or Parquet) under
+        output_dir, keyed like tables (insert/emails).
+        """
+        for root, _, files in os.walk(output_dir):
+            for file in files:
+                table = output_table_name(file)
+                if table is not None:
+                    path = os.path.join(root, table)
+                    table = os.path.relpath(path, output_dir).replace(os.sep, "/")
+                    self.table(table, bytes=os.path.getsize(os.path.join(root, file)))
+
+    def input_file(self, path, parties, seconds, error=None):
+        self.files.append(
+            {
+                "file": path,
+                "parties": parties,
+                "seconds": round(seconds, 3),
+                "error": error,
+            }
+        )
+
+    def merge(self, other, prefix="worker_"):
+        for name, values in other.stages.items():
+            record = self.stages.setdefault(name, {})
+            for key, value in values.items():
+                if key == "peak_rss_mb":
+                    record[prefix + key] = max(
+                        record.get(prefix + key) or 0, value or 0
+                    )
+                else:
+                    self.add(record, prefix + key, value)
+        for table, values in other.tables.items():
+            self.table(table, **values)
+        self.files.extend(other.files)
+
+    def to_dict(self, **run):
+        def rounded(record):
+            return {
+                key: round(value, 3) if isinstance(value, float) else value
+                for key, value in record.items()
+            }
+
+        result = {
+            **run,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {name: rounded(record) for name, record in self.stages.items()},
+            "tables": self.tables,
+        }
+        if self.files:
+            result["files"] = self.files
+        return result
+
+    def write(self, path, **run):
+        """Write the metrics, plus the run attributes given, as JSON to path."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(**run), f, indent=2)
+        return path
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from itertools import islice
+from operator import itemgetter
+
+# Shared modules live one level up in src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csvCodecs import open_csv
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_table(table):
+    # "dbo.phones" is a schema and a table, each quoted on its own
+    return ".".join(map(quote, table.split(".")))
+
+
+def insert_statement(table, columns):
+    # qmark parameters, as used by both pyodbc and sqlite3
+    return (
+        f"INSERT INTO {quote_table(table)} ({', '.join(map(quote, columns))}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+
+def header_mapping(header, column_map=None):
+    """
+    (CSV index, table column) pairs from the CSV header. column_map renames
+    header names to table columns, mapping a name to None skips that column.
+    """
+    column_map = column_map or {}
+    pairs = []
+    for i, name in enumerate(header):
+        column = column_map.get(name, name)
+        if column is not None:
+            pairs.append((i, column))
+    return pairs
+
+
+def load_csv(
+    conn,
+    csv_path,
+    table,
+    column_map=None,
+    batch_size=10000,
+    commit_every=100000,
+    empty_as_null=False,
+    constants=None,
+):
+    """
+    Insert csv_path (plain, .gz or .zst) into table with executemany,
+    batch_size rows at a time, committing every commit_every rows (and at the
+    end). On a pyodbc cursor fast_executemany is switched on so each batch is
+    sent as one bound array.
+    constants ({column: value}, e.g. the run columns of a run manifest) are
+    inserted into every row after the CSV columns.
+    Works with any qmark DB-API connection (e.g. sqlite3 for tests).
+    Returns the number of rows inserted.
+    """
+    constants = constants or {}
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+
+    with open_csv(csv_path) as f:
+        reader = csv.reader(f)
+        pairs = header_mapping(next(reader), column_map)
+        if not pairs:
+            raise ValueError(
+                f"No column of {csv_path} is mapped to a column of {table}"
+            )
+        indexes = [i for i, _ in pairs]
+        insert_sql = insert_statement(
+            table, [*(column for _, column in pairs), *constants]
+        )
+        # itemgetter with one index returns a bare value, not a tuple
+        pick = itemgetter(*indexes) if len(indexes) > 1 else lambda r: (r[indexes[0]],)
+        if constants:
+            values, pick_columns = tuple(constants.values()), pick
+            pick = lambda r: (*pick_columns(r), *values)
+
+        row_count, uncommitted = 0, 0
+        start = time.perf_counter()
+        while True:
+            batch = [pick(row) for row in islice(reader, batch_size)]
+            if not batch:
+                break
+            if empty_as_null:
+                batch = [
+                    tuple(v if v != "" else None for v in row) if "" in row else row
+                    for row in batch
+                ]
+            cursor.executemany(insert_sql, batch)
+            row_count += len(batch)
+            uncommitted += len(batch)
+            if uncommitted >= commit_every:
+                conn.commit()
+                uncommitted = 0
+                logging.info(f"Committed {row_count} rows into {table}")
+        conn.commit()
+    cursor.close()
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Loaded {row_count} rows from {csv_path} into {table} in {elapsed:.1f}s"
+    )
+    return row_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch load a CSV into a table")
+    parser.add_argument(
+        "csv_path", help="CSV file with a header row, optionally .gz or .zst"
+    )
+    parser.add_argument("table", help="Target table, e.g. dbo.phones")
+    parser.add_argument(
+        "--conn-str", help="ODBC connection string (SQL Server via pyodbc)"
+    )
+    parser.add_argument("--sqlite", help="SQLite database file to load instead")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--commit-every", type=int, default=100000)
+    parser.add_argument(
+        "--empty-as-null", action="store_true", help="Insert empty fields as NULL"
+    )
+    parser.add_argument(
+        "--manifest", help="Run manifest whose run columns are loaded as constants"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    if args.sqlite:
+        import sqlite3
+
+        conn = sqlite3.connect(args.sqlite)
+    else:
+        import pyodbc
+
+        conn = pyodbc.connect(args.conn_str)
+    constants = None
+    if args.manifest:
+        with open(args.manifest, "r", encoding="utf-8") as f:
+            constants = json.load(f)["run_columns"]
+    try:
+        load_csv(
+            conn,
+            args.csv_path,
+            args.table,
+            batch_size=args.batch_size,
+            commit_every=args.commit_every,
+            empty_as_null=args.empty_as_null,
+            constants=constants,
+        )
+    finally:
+        conn.close()
@@ -1,5 +1,6 @@
 import pyodbc
-import csv
+
+from csvBatchLoader import load_csv
 
 # Define connection string using Windows Authentication (gMSA context)
 conn_str = (
@@ -19,18 +20,17 @@ try:
     # Path to your sample CSV file
     csv_file = r"C:\path\to\sample.csv"
 
-    # Example: assume table dbo.SampleData with columns [Id], [Name], [Value]
-    insert_sql = "INSERT INTO dbo.SampleData (Id, Name, Value) VALUES (?, ?, ?)"
-
-    with open(csv_file, newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        header = next(reader)  # skip header row
-        for row in reader:
-            # Adjust indexes to match your CSV structure
-            cursor.execute(insert_sql, row[0], row[1], row[2])
-
-    conn.commit()
-    print("CSV data uploaded successfully ✅")
+    # Example: assume table dbo.SampleData with columns [Id], [Name], [Value].
+    # Columns are taken from the CSV header, use column_map to rename
+    # (e.g. {"identifier": "Id"}) or skip ({"notes": None}) header columns.
+    row_count = load_csv(
+        conn,
+        csv_file,
+        "dbo.SampleData",
+        batch_size=10000,
+        commit_every=100000,
+    )
+    print(f"CSV data uploaded successfully ✅ ({row_count} rows)")
 
     # Verify upload
     cursor.execute("SELECT TOP 5 * FROM dbo.SampleData;")
@@ -0,0 +1,235 @@
+import logging
+import os
+
+from sqlalchemy import Column, MetaData, Table, UnicodeText, create_engine, func, select
+
+_engines = {}
+
+
+def mssql_url(server, database, user, password):
+    return (
+        f"mssql+pyodbc://{user}:{password}@{server}/{database}"
+        "?driver=ODBC+Driver+17+for+SQL+Server"
+    )
+
+
+def sql_engine(url, **kwargs):
+    """
+    Pooled SQLAlchemy engine for url, one per process.
+    SQL Server connections get fast_executemany so batches are array-bound.
+    """
+    # Keyed by pid too: pooled connections must not be shared with forked workers
+    key = (os.getpid(), url)
+    if key not in _engines:
+        if url.startswith("mssql+pyodbc"):
+            kwargs.setdefault("fast_executemany", True)
+        _engines[key] = create_engine(url, pool_pre_ping=True, **kwargs)
+    return _engines[key]
+
+
+def engine_url(engine):
+    # Full URL (password included) so worker processes can open their own engine
+    return engine.url.render_as_string(hide_password=False)
+
+
+def table_objects(headers: dict) -> dict:
+    """One Table per {table: columns} entry, every column as unicode text."""
+    metadata = MetaData()
+    return {
+        name: Table(name, metadata, *(Column(c, UnicodeText) for c in columns))
+        for name, columns in headers.items()
+    }
+
+
+def create_tables(engine, headers: dict, replace=True) -> dict:
+    """
+    Create the tables for headers. Values arrive as strings so no types are
+    inferred. With replace=True existing tables are dropped first, like
+    to_sql(if_exists="replace").
+    """
+    tables = table_objects(headers)
+    metadata = next(iter(tables.values())).metadata
+    if replace:
+        metadata.drop_all(engine)
+    metadata.create_all(engine)
+    return tables
+
+
+def create_staging_tables(engine, headers: dict, suffix) -> dict:
+    """
+    Empty tables like those for headers, named <table><suffix> and keyed by
+    the table they stage rows for, e.g. to publish one input file's rows all
+    at once (publish_staging_tables) or drop them (drop_staging_tables).
+    """
+    staged = create_tables(
+        engine, {f"{table}{suffix}": columns for table, columns in headers.items()}
+    )
+    return dict(zip(headers, staged.values()))
+
+
+def publish_staging_tables(engine, staged: dict):
+    """
+    Copy the rows of staging tables into their tables in one transaction,
+    so all of them arrive or none do, then drop the staging tables.
+    """
+    tables = table_objects(
+        {table: [c.name for c in staging.columns] for table, staging in staged.items()}
+    )
+    with engine.begin() as conn:
+        for table, staging in staged.items():
+            conn.execute(
+                tables[table]
+                .insert()
+                .from_select([c.name for c in staging.columns], staging.select())
+            )
+    drop_staging_tables(engine, staged)
+
+
+def drop_staging_tables(engine, staged: dict):
+    next(iter(staged.values())).metadata.drop_all(engine)
+
+
+def count_rows(engine, table: Table, **where) -> int:
+    """Rows of table, only those with the given column values if any."""
+    query = select(func.count()).select_from(table)
+    for column, value in where.items():
+        query = query.where(table.c[column] == value)
+    with engine.connect() as conn:
+        return conn.execute(query).scalar()
+
+
+class SqlTableSink:
+    """
+    Streams rows for one table into the database as batched parameterised
+    inserts (executemany), each batch in its own short transaction on a pooled
+    connection. Same writerow/close interface as CsvTableWriter: rows are
+    tuples in table column order.
+    before_flush is called ahead of every batch (e.g. SqlKeyDeleter.flush).
+    constants ({column: value}) fills the table's last columns with the same
+    value on every row, e.g. the run columns of a run manifest, so rows only
+    carry the columns before them.
+    checkpoint() flushes; resume() skips the rows already in the table.
+    """
+
+    def __init__(
+        self, engine, table: Table, batch_size=5000, before_flush=None, constants=None
+    ):
+        self.engine = engine
+        self.table = table
+        self.before_flush = before_flush
+        self.columns = [c.name for c in table.columns]
+        constants = constants or {}
+        if constants and list(constants) != self.columns[-len(constants) :]:
+            raise ValueError(
+                f"Constant columns {list(constants)} are not the last columns "
+                f"of {table.name}"
+            )
+        self.constants = tuple(
+            value if value is None or value.__class__ is str else str(value)
+            for value in constants.values()
+        )
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.skip_rows = 0
+        self._insert = table.insert().compile(dialect=engine.dialect)
+        self._batch = []
+
+    def writerow(self, row):
+        if self.skip_rows:
+            # Inserted before a resume, see resume()
+            self.skip_rows -= 1
+            self.rows_written += 1
+            return
+        # Non-string values are stored as their CSV text (True -> "True")
+        if not all(value is None or value.__class__ is str for value in row):
+            row = tuple(
+                value if value is None or value.__class__ is str else str(value)
+                for value in row
+            )
+        if self.constants:
+            row = (*row, *self.constants)
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if not self._batch:
+            return
+        if self.before_flush is not None:
+            self.before_flush()
+        with self.engine.begin() as conn:
+            if self._insert.positional:
+                # Tuples go to the driver's executemany as they are
+                conn.exec_driver_sql(self._insert.string, self._batch)
+            else:
+                conn.execute(
+                    self.table.insert(),
+                    [dict(zip(self.columns, row)) for row in self._batch],
+                )
+        self.rows_written += len(self._batch)
+        self._batch = []
+
+    def checkpoint(self) -> dict:
+        self.flush()
+        return {"loaded": self.rows_written}
+
+    def resume(self, state: dict):
+        """
+        Carry on from a checkpoint() state. state["in_table"] is the run's
+        row count in the table now: batches flushed after the checkpoint hold
+        the first rows the resumed run produces again, so that many are
+        skipped instead of inserted twice.
+        """
+        self.rows_written = state["loaded"]
+        self.skip_rows = state.get("in_table", self.rows_written) - self.rows_written
+        if self.skip_rows < 0:
+            raise ValueError(
+                f"{self.table.name} has fewer rows than its checkpoint "
+                f"({state['in_table']} < {self.rows_written})"
+            )
+
+    def close(self):
+        self.flush()
+        logging.info(f"Loaded {self.rows_written} records into {self.table.name}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqlKeyDeleter:
+    """
+    Collects key values (e.g. PartyIdentifiers) and deletes their rows from
+    every table on flush(), batch_size keys per statement (SQL Server allows
+    2100 parameters).
+    """
+
+    def __init__(self, engine, tables: dict, key="partyidentifier", batch_size=500):
+        self.engine = engine
+        self.tables = list(tables.values())
+        self.key = key
+        self.batch_size = batch_size
+        self.rows_deleted = 0
+        self._keys = []
+
+    def add(self, value):
+        self._keys.append(value)
+
+    def flush(self):
+        if not self._keys:
+            return
+        with self.engine.begin() as conn:
+            for i in range(0, len(self._keys), self.batch_size):
+                keys = self._keys[i : i + self.batch_size]
+                for table in self.tables:
+                    result = conn.execute(
+                        table.delete().where(table.c[self.key].in_(keys))
+                    )
+                    self.rows_deleted += result.rowcount
+        self._keys = []
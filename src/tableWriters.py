@@ -0,0 +1,254 @@
+import csv
+import logging
+import os
+
+from csvCodecs import csv_table_name, open_csv
+
+PARQUET_SUFFIX = ".parquet"
+
+# pyarrow type per JSON schema type (see partySchemaCompiler COLUMN_TYPES)
+ARROW_TYPES = {
+    "string": "string",
+    "boolean": "bool_",
+    "integer": "int64",
+    "number": "float64",
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output needs the pyarrow package") from None
+    return pyarrow
+
+
+def parquet_available():
+    try:
+        _pyarrow()
+    except ImportError:
+        return False
+    return True
+
+
+def output_table_name(file_name):
+    """Table of an output file (phones.csv, .csv.gz, .parquet, ...), else None."""
+    if file_name.lower().endswith(PARQUET_SUFFIX):
+        return file_name[: -len(PARQUET_SUFFIX)]
+    return csv_table_name(file_name)
+
+
+class CsvTableWriter:
+    """
+    Streams rows for one output table straight to CSV.
+    Rows are tuples (e.g. the flattener's namedtuples) in fieldnames order.
+    The file is only created when the first row arrives, so empty tables
+    produce no file (matching the behaviour of the batch write_csv helpers).
+    compression ("gzip", "zstd") compresses the stream as it is written.
+    header=False leaves out the header line, for shards merged under one.
+    checkpoint() and resume() let a run carry on from a checkpoint in the
+    same file.
+    """
+
+    def __init__(self, file_path, fieldnames, compression=None, header=True):
+        self.file_path = file_path
+        self.fieldnames = list(fieldnames)
+        self.compression = compression
+        self.header = header
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def writerow(self, row):
+        if self._writer is None:
+            self._open()
+        self._writer.writerow(row)
+        self.rows_written += 1
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _open(self):
+        logging.info(f"Streaming records to {self.file_path}")
+        self._file = open_csv(self.file_path, "w", self.compression)
+        self._writer = csv.writer(self._file)
+        if self.header:
+            self._writer.writerow(self.fieldnames)
+
+    def checkpoint(self) -> dict:
+        """
+        Make everything written so far durable in the file, returns the state
+        for resume(). Compressed output ends its gzip member / zstd frame here
+        and carries on in a new one, so the file can be cut back to this size.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = open_csv(self.file_path, "a", self.compression)
+            self._writer = csv.writer(self._file)
+        size = os.path.getsize(self.file_path) if self._writer is not None else 0
+        return {"rows": self.rows_written, "bytes": size}
+
+    def resume(self, state: dict):
+        """
+        Carry on from a checkpoint() state: rows written after it are cut
+        off and new rows are appended.
+        """
+        self.rows_written = state["rows"]
+        if not state["bytes"]:
+            # No rows yet at the checkpoint, start the file afresh
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+            return
+        with open(self.file_path, "r+b") as f:
+            f.truncate(state["bytes"])
+        logging.info(f"Resuming {self.file_path} after {self.rows_written} records")
+        self._file = open_csv(self.file_path, "a", self.compression)
+        self._writer = csv.writer(self._file)
+
+    def close(self):
+        if self._writer is None:
+            logging.info(f"No records to write for {self.file_path}")
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logging.info(f"Wrote {self.rows_written} records to {self.file_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetTableWriter:
+    """
+    Streams rows for one output table into a Parquet file, one row group per
+    row_group_size rows, so only one row group is ever held in memory. Same
+    interface as CsvTableWriter. column_types ({column: JSON schema type})
+    types the columns, e.g. booleans for IsPrimary; other columns are strings.
+    compression is the Parquet codec (snappy unless given, e.g. "zstd").
+    Non-string values in string columns are stored as their CSV text, values
+    that do not fit a typed column raise ValueError.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        fieldnames,
+        column_types=None,
+        compression=None,
+        row_group_size=65536,
+    ):
+        pa = _pyarrow()
+        column_types = column_types or {}
+        self.file_path = file_path
+        self.fieldnames = list(fieldnames)
+        self.schema = pa.schema(
+            [
+                (f, getattr(pa, ARROW_TYPES[column_types.get(f, "string")])())
+                for f in self.fieldnames
+            ]
+        )
+        self.compression = compression or "snappy"
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._writer = None
+        self._rows = []
+
+    def writerow(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self._write_row_group()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _write_row_group(self):
+        pa = _pyarrow()
+        if self._writer is None:
+            logging.info(f"Streaming records to {self.file_path}")
+            self._writer = pa.parquet.ParquetWriter(
+                self.file_path, self.schema, compression=self.compression
+            )
+        columns = list(zip(*self._rows))
+        arrays = []
+        for field, values in zip(self.schema, columns):
+            if field.type == pa.string() and not all(
+                value is None or value.__class__ is str for value in values
+            ):
+                # Stored as their CSV text (1000001 -> "1000001"), like SqlTableSink
+                values = [
+                    value if value is None or value.__class__ is str else str(value)
+                    for value in values
+                ]
+            try:
+                arrays.append(pa.array(values, type=field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(
+                    f"Column {field.name} of {self.file_path} is not {field.type}: {e}"
+                ) from e
+        self._writer.write_table(
+            pa.Table.from_arrays(arrays, schema=self.schema),
+            row_group_size=len(self._rows),
+        )
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        if self._rows:
+            self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            logging.info(f"Wrote {self.rows_written} records to {self.file_path}")
+        elif not self.rows_written:
+            logging.info(f"No records to write for {self.file_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TeeWriter:
+    """Sends every row to several table writers, e.g. a CSV file and the database."""
+
+    def __init__(self, *writers):
+        self.writers = writers
+
+    @property
+    def rows_written(self):
+        return self.writers[0].rows_written
+
+    def writerow(self, row):
+        for writer in self.writers:
+            writer.writerow(row)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def checkpoint(self) -> dict:
+        state = {}
+        for writer in self.writers:
+            state.update(writer.checkpoint())
+        return state
+
+    def resume(self, state: dict):
+        for writer in self.writers:
+            writer.resume(state)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
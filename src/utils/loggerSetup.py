@@ -4,6 +4,8 @@ from datetime import datetime
 from time import sleep
 import json
 
+from loggger import get_logger
+
 # --- Configuration ---
 # --- Load external config ---
 config_path = os.path.join(os.path.dirname(__file__), "config.json")
@@ -21,11 +23,12 @@ os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 with open(LOG_FILE, "w") as f:
     f.write("")  # Clear contents
 
-# --- Setup logging ---
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
+# --- Setup logging (queued, writes happen on a background thread) ---
+get_logger(
+    None,
+    log_file=LOG_FILE,
+    console=False,
+    fmt="%(asctime)s [%(levelname)s] %(message)s",
 )
 
 
@@ -1,29 +1,238 @@
+import atexit
 import logging
 import os
+import queue
+import time
+import weakref
+from logging.handlers import QueueHandler, QueueListener
 
+DEFAULT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# "<UTC ISO time>Z - message", the format of the party scripts' process.log
+PROCESS_LOG_FORMAT = "%(asctime)s.%(msecs)03dZ - %(message)s"
+PROCESS_LOG_DATEFMT = "%Y-%m-%dT%H:%M:%S"
 
-def get_logger(name="name", level="INFO", log_file="logs/log.log"):
+
+def get_logger(
+    name="name",
+    level="INFO",
+    log_file="logs/log.log",
+    console=True,
+    fmt=DEFAULT_FORMAT,
+    datefmt=None,
+    utc=False,
+    queued=True,
+    batch_size=500,
+    flush_interval=1.0,
+    sample_every=1,
+    max_per_second=None,
+    lean_records=False,
+):
+    """
+    Logger writing to log_file and/or the console.
+    With queued=True (the default) the caller only puts records on a queue;
+    formatting and writes happen on a background thread that flushes every
+    batch_size records or after flush_interval seconds of quiet.
+    Messages sent through log_sampled() are thinned to 1 in sample_every and at
+    most max_per_second, so per-party messages cost the same at any volume.
+    lean_records=True stops LogRecords collecting thread and process details
+    (process-wide), for formats that do not print them.
+    name=None configures the root logger. A named logger does not propagate,
+    so its records are not written again, unqueued, by root handlers.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+    if name is not None:
+        logger.propagate = False
 
     # Clear existing handlers to avoid inconsistent output
     if logger.hasHandlers():
+        for handler in list(logger.handlers):
+            if isinstance(handler, _QueueFeedHandler):
+                handler.listener.stop()
         logger.handlers.clear()
 
-    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    if lean_records:
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
 
-    # File handler
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    )
-    logger.addHandler(file_handler)
+    formatter = logging.Formatter(fmt, datefmt)
+    if utc:
+        formatter.converter = time.gmtime
 
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    )
-    logger.addHandler(console_handler)
+    handlers = []
+    if log_file:
+        if os.path.dirname(log_file):
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        # File handler
+        handlers.append(
+            BatchedFileHandler(log_file, encoding="utf-8", batch_size=batch_size)
+        )
+    if console:
+        # Console handler
+        handlers.append(BatchedStreamHandler(batch_size=batch_size))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        if not queued:
+            handler.batch_size = 1
 
+    if queued:
+        log_queue = queue.SimpleQueue()
+        listener = FlushingQueueListener(
+            log_queue, *handlers, flush_interval=flush_interval
+        )
+        feed = _QueueFeedHandler(log_queue, listener, logger)
+        listener.start()
+        atexit.register(listener.stop)
+        handlers = [feed]
+
+    for handler in handlers:
+        logger.addHandler(handler)
+    logger.sampler = Sampler(sample_every, max_per_second)
     return logger
+
+
+def log_sampled(logger, message, *args, level=logging.INFO):
+    """
+    Log a high-volume message subject to the logger's sampling settings.
+    The check runs before a LogRecord is built, so skipped messages are cheap.
+    """
+    sampler = getattr(logger, "sampler", None)
+    if sampler is None or sampler.allow():
+        logger.log(level, message, *args)
+
+
+def get_process_logger(name, log_file="process.log", **kwargs):
+    """Queued file logger in the process.log format of the party scripts."""
+    return get_logger(
+        name,
+        log_file=log_file,
+        console=False,
+        fmt=PROCESS_LOG_FORMAT,
+        datefmt=PROCESS_LOG_DATEFMT,
+        utc=True,
+        lean_records=True,
+        **kwargs,
+    )
+
+
+class _BatchedEmitMixin:
+    # Write every record but only flush every batch_size records
+    batch_size = 500
+    _pending = 0
+
+    def emit(self, record):
+        try:
+            if self.stream is None:  # FileHandler opened with delay=True
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self._pending = 0
+
+
+class BatchedFileHandler(_BatchedEmitMixin, logging.FileHandler):
+    def __init__(self, filename, mode="a", encoding=None, batch_size=500):
+        super().__init__(filename, mode=mode, encoding=encoding, delay=True)
+        self.batch_size = batch_size
+
+
+class BatchedStreamHandler(_BatchedEmitMixin, logging.StreamHandler):
+    def __init__(self, stream=None, batch_size=500):
+        super().__init__(stream)
+        self.batch_size = batch_size
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers whenever the queue goes quiet."""
+
+    def __init__(self, log_queue, *handlers, flush_interval=1.0):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                self.flush()
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+            self.flush()
+
+
+class _QueueFeedHandler(QueueHandler):
+    """
+    Caller-side handler: enqueues the record untouched, so message formatting
+    happens on the listener thread instead of the hot path.
+    """
+
+    def __init__(self, log_queue, listener, logger):
+        super().__init__(log_queue)
+        self.listener = listener
+        self.logger = logger
+        _feeds.add(self)
+
+    def prepare(self, record):
+        return record
+
+
+# Forked worker processes (ProcessPoolExecutor on Linux) do not inherit the
+# listener thread, so the child logs straight through the real handlers.
+_feeds = weakref.WeakSet()
+
+
+def _flush_before_fork():
+    for feed in list(_feeds):
+        feed.listener.flush()
+
+
+def _direct_after_fork():
+    for feed in list(_feeds):
+        feed.logger.removeHandler(feed)
+        for handler in feed.listener.handlers:
+            handler.batch_size = 1
+            feed.logger.addHandler(handler)
+    _feeds.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_flush_before_fork, after_in_child=_direct_after_fork)
+
+
+class Sampler:
+    """Passes 1 in every `every` calls, and at most max_per_second of those."""
+
+    def __init__(self, every=1, max_per_second=None):
+        self.every = max(1, every)
+        self.max_per_second = max_per_second
+        self._seen = 0
+        self._window = 0
+        self._window_count = 0
+
+    def allow(self):
+        self._seen += 1
+        if (self._seen - 1) % self.every:
+            return False
+        if self.max_per_second:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._window_count = window, 0
+            if self._window_count >= self.max_per_second:
+                return False
+            self._window_count += 1
+        return True
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The party scripts import each other flat from src/, src/json/ and src/sql/
+SRC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+sys.path[:0] = [SRC_DIR, os.path.join(SRC_DIR, "json"), os.path.join(SRC_DIR, "sql")]
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from sqlalchemy import create_engine, text
+
+from inputJsonParser import process_json
+from partyGenerator import generate_parties
+
+
+def parties_sharing_addresses(count, addresses=50):
+    # Every worker chunk sees the same few physical addresses
+    parties = list(generate_parties(count))
+    for i, party in enumerate(parties):
+        details = next(iter(party.values()))
+        shared = next(iter(parties[i % addresses].values()))
+        details["PhysicalAddress"] = shared["PhysicalAddress"]
+    return parties
+
+
+@pytest.mark.parametrize("csv_output", [True, False])
+def test_worker_direct_load_inserts_each_address_key_once(tmp_path, csv_output):
+    engine = create_engine(f"sqlite:///{tmp_path / 'parties.db'}")
+    process_json(
+        parties_sharing_addresses(2000),
+        base_output_dir=str(tmp_path / "data"),
+        workers=2,
+        chunk_size=300,
+        load="direct",
+        csv_output=csv_output,
+        engine=engine,
+        batch_size=500,
+        address_dimension=True,
+    )
+    with engine.connect() as conn:
+        rows, keys = conn.execute(
+            text("SELECT COUNT(*), COUNT(DISTINCT address_key) FROM address_dimension")
+        ).one()
+        missing = conn.execute(
+            text(
+                "SELECT COUNT(*) FROM physical_addresses p WHERE NOT EXISTS "
+                "(SELECT 1 FROM address_dimension d "
+                "WHERE d.address_key = p.address_key)"
+            )
+        ).scalar()
+    assert rows == keys >= 50
+    assert missing == 0
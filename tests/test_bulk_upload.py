@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from sqlalchemy import create_engine, inspect, text
+
+import inputJsonParser
+from inputJsonParser import SQL_TARGET, bulk_upload_to_sql, process_json
+from partyGenerator import generate_parties
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    data_dir = tmp_path / "data"
+    process_json(
+        generate_parties(300),
+        base_output_dir=str(data_dir),
+        load=None,
+        run_manifest=True,
+    )
+    (run_guid,) = os.listdir(data_dir)
+    return str(data_dir / run_guid)
+
+
+def sqlite_engine(tmp_path):
+    return create_engine(
+        f"sqlite:///{tmp_path / 'upload.db'}", connect_args={"timeout": 30}
+    )
+
+
+def test_tables_upload_concurrently_with_run_columns(tmp_path, run_dir):
+    engine = sqlite_engine(tmp_path)
+    uploaded = []
+    results = bulk_upload_to_sql(
+        run_dir,
+        **SQL_TARGET,
+        engine=engine,
+        max_workers=3,
+        skip_tables={"emails": 1},
+        on_uploaded=lambda table, rows: uploaded.append(table),
+    )
+    assert "emails" not in results
+    assert sorted(uploaded) == sorted(results)
+    assert set(inspect(engine).get_table_names()) == set(results)
+    run_guid = os.path.basename(run_dir)
+    with engine.connect() as conn:
+        for table, (rows, seconds) in results.items():
+            count, guids = conn.execute(
+                text(f'SELECT COUNT(*), COUNT(DISTINCT run_guid) FROM "{table}"')
+            ).one()
+            assert (count, guids) == (rows, 1)
+            assert (
+                conn.execute(text(f'SELECT run_guid FROM "{table}"')).scalar()
+                == run_guid
+            )
+
+
+def test_failing_table_does_not_stop_the_others(tmp_path, run_dir, monkeypatch):
+    upload = inputJsonParser.upload_csv_table
+
+    def failing_upload(engine, file_path, table_name, constants=None):
+        if table_name == "phones":
+            raise RuntimeError("disk full")
+        return upload(engine, file_path, table_name, constants)
+
+    monkeypatch.setattr(inputJsonParser, "upload_csv_table", failing_upload)
+    engine = sqlite_engine(tmp_path)
+    with pytest.raises(RuntimeError, match="phones"):
+        bulk_upload_to_sql(run_dir, **SQL_TARGET, engine=engine, max_workers=2)
+    tables = set(inspect(engine).get_table_names())
+    assert "phones" not in tables and "emails" in tables
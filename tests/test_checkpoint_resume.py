@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+import inputJsonParser
+from partyFlattener import RunFlattener
+from partyGenerator import generate_parties
+from partyStream import JsonArrayReader
+
+
+def write_crlf_array(path, parties):
+    with open(path, "w", encoding="utf-8", newline="\r\n") as f:
+        f.write("[\n")
+        f.write(",\n".join(json.dumps(party, indent=2) for party in parties))
+        f.write("\n]\n")
+
+
+def read_outputs(run_dir):
+    return {
+        name: open(os.path.join(run_dir, name), encoding="utf-8").read()
+        for name in sorted(os.listdir(run_dir))
+        if name.endswith(".csv")
+    }
+
+
+def test_reader_resumes_crlf_input_at_offset(tmp_path):
+    path = tmp_path / "parties.json"
+    parties = list(generate_parties(50))
+    write_crlf_array(path, parties)
+    reader = JsonArrayReader(str(path), chunk_size=256)
+    iterator = iter(reader)
+    head = [next(iterator) for _ in range(20)]
+    rest = list(reader.from_offset(reader.offset()))
+    assert head + rest == parties
+
+
+def test_process_json_resumes_crlf_input(tmp_path, monkeypatch):
+    path = tmp_path / "parties.json"
+    write_crlf_array(path, generate_parties(300))
+
+    flatten = RunFlattener.flatten
+    calls = 0
+
+    def dying_flatten(self, party, sinks):
+        nonlocal calls
+        calls += 1
+        if calls == 250:
+            raise RuntimeError("killed")
+        flatten(self, party, sinks)
+
+    monkeypatch.setattr(RunFlattener, "flatten", dying_flatten)
+    with pytest.raises(RuntimeError):
+        inputJsonParser.process_json(
+            JsonArrayReader(str(path)),
+            base_output_dir=str(tmp_path / "data"),
+            load=None,
+            run_manifest=True,
+            checkpoint_every=100,
+        )
+    monkeypatch.setattr(RunFlattener, "flatten", flatten)
+    (run_guid,) = os.listdir(tmp_path / "data")
+    inputJsonParser.process_json(
+        JsonArrayReader(str(path)),
+        base_output_dir=str(tmp_path / "data"),
+        resume=run_guid,
+    )
+
+    inputJsonParser.process_json(
+        JsonArrayReader(str(path)),
+        base_output_dir=str(tmp_path / "whole"),
+        load=None,
+        run_manifest=True,
+    )
+    (whole_guid,) = os.listdir(tmp_path / "whole")
+    resumed = read_outputs(tmp_path / "data" / run_guid)
+    whole = read_outputs(tmp_path / "whole" / whole_guid)
+    assert resumed == whole
@@ -0,0 +1,37 @@
+import pytest
+
+import contactNormaliser
+from contactNormaliser import normalise_phone, normalise_phones
+
+PHONES = {
+    "+64 (0)9 555 1111": "+6495551111",
+    "+64 9 555 1111": "+6495551111",
+    "0064 9 555 1111": "+6495551111",
+    "09 555 1111": "+6495551111",
+    "021-123-4567 ext 5": "+64211234567",
+    " (021) 123-4567 x12 ": "+64211234567",
+    "+1 212 555 1234 #3": "+12125551234",
+    # No trunk 0 or international prefix: the country is unknown
+    "555 1111": "555 1111",
+    "6495551111": "6495551111",
+    " not a number ": "not a number",
+    "0": "0",
+}
+
+
+@pytest.mark.parametrize("value, expected", PHONES.items())
+def test_normalise_phone(value, expected):
+    assert normalise_phone(value) == expected
+
+
+def test_vectorised_phones_match_scalar():
+    pytest.importorskip("pyarrow")
+    values = list(PHONES)
+    assert contactNormaliser.pd is not None
+    assert normalise_phones(values) == [normalise_phone(v) for v in values]
+
+
+def test_phones_without_pyarrow_match_scalar(monkeypatch):
+    monkeypatch.setattr(contactNormaliser, "pd", None)
+    values = list(PHONES)
+    assert normalise_phones(values) == list(PHONES.values())
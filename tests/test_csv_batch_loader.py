@@ -0,0 +1,63 @@
+import csv
+import sqlite3
+
+import pytest
+
+from csvBatchLoader import insert_statement, load_csv
+from csvCodecs import open_csv
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    yield conn
+    conn.close()
+
+
+def write_csv(path, rows):
+    with open_csv(str(path), "w") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+@pytest.mark.parametrize("name", ["phones.csv", "phones.csv.gz"])
+def test_load_csv_maps_columns_and_adds_constants(tmp_path, conn, name):
+    conn.execute('CREATE TABLE "party phones" (party, number, loadid)')
+    path = write_csv(
+        tmp_path / name,
+        [("PartyIdentifier", "Number", "Note"), ("p1", "021", "x"), ("p2", "", "y")],
+    )
+    count = load_csv(
+        conn,
+        path,
+        "main.party phones",
+        column_map={"PartyIdentifier": "party", "Number": "number", "Note": None},
+        batch_size=1,
+        commit_every=1,
+        empty_as_null=True,
+        constants={"loadid": 7},
+    )
+    assert count == 2
+    assert conn.execute('SELECT * FROM "party phones"').fetchall() == [
+        ("p1", "021", 7),
+        ("p2", None, 7),
+    ]
+
+
+def test_load_csv_single_column(tmp_path, conn):
+    conn.execute("CREATE TABLE phones (number)")
+    path = write_csv(tmp_path / "phones.csv", [("number",), ("021",), ("",)])
+    assert load_csv(conn, path, "phones") == 2
+    assert conn.execute("SELECT * FROM phones").fetchall() == [("021",), ("",)]
+
+
+def test_load_csv_without_mapped_columns(tmp_path, conn):
+    path = write_csv(tmp_path / "phones.csv", [("number",), ("021",)])
+    with pytest.raises(ValueError, match="No column"):
+        load_csv(conn, path, "phones", column_map={"number": None})
+
+
+def test_insert_statement_quotes_table_and_columns():
+    assert insert_statement('dbo.od"d', ["a b"]) == (
+        'INSERT INTO "dbo"."od""d" ("a b") VALUES (?)'
+    )
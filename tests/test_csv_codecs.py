@@ -0,0 +1,84 @@
+import csv
+
+import pytest
+
+from csvCodecs import (
+    codec_available,
+    compress_bytes,
+    compression_of,
+    csv_table_name,
+    header_bytes,
+    open_compressed,
+    open_csv,
+)
+from tableWriters import CsvTableWriter
+
+ROWS = [["p1", 'Māori, "quoted"'], ["p2", "line\r\nbreak"], ["p3", ""]]
+
+
+def codecs():
+    return [
+        pytest.param(
+            c,
+            marks=pytest.mark.skipif(
+                not codec_available(c), reason=f"{c} is not available"
+            ),
+        )
+        for c in (None, "gzip", "zstd")
+    ]
+
+
+def test_names():
+    assert compression_of("phones.csv.GZ") == "gzip"
+    assert compression_of("phones.csv.zst") == "zstd"
+    assert compression_of("phones.csv") is None
+    assert [csv_table_name(n) for n in ("phones.csv.zst", "a.CSV", "x.json")] == [
+        "phones",
+        "a",
+        None,
+    ]
+
+
+@pytest.mark.parametrize("compression", codecs())
+def test_csv_round_trip(tmp_path, compression):
+    path = str(tmp_path / "phones.csv")
+    with open_csv(path, "w", compression) as f:
+        csv.writer(f).writerows(ROWS)
+    with open_csv(path, "r", compression) as f:
+        assert list(csv.reader(f)) == ROWS
+
+
+@pytest.mark.parametrize("compression", codecs())
+def test_appended_members_read_as_one_stream(tmp_path, compression):
+    # What a shard merge or a checkpoint leaves: header, then more members
+    path = tmp_path / "phones.csv"
+    path.write_bytes(
+        header_bytes(["id", "note"], compression)
+        + compress_bytes(b"p1,a\r\n", compression)
+    )
+    with open_compressed(str(path), "ab", compression) as f:
+        f.write(b"p2,b\r\n")
+    with open_csv(str(path), "r", compression) as f:
+        assert list(csv.reader(f)) == [["id", "note"], ["p1", "a"], ["p2", "b"]]
+
+
+@pytest.mark.parametrize("compression", codecs())
+def test_writer_resumes_a_compressed_file_at_its_checkpoint(tmp_path, compression):
+    path = str(tmp_path / "phones.csv")
+    writer = CsvTableWriter(path, ["id", "note"], compression)
+    writer.writerows(ROWS[:2])
+    state = writer.checkpoint()
+    writer.writerow(["lost", "after the checkpoint"])
+    writer.close()
+
+    resumed = CsvTableWriter(path, ["id", "note"], compression)
+    resumed.resume(state)
+    with resumed:
+        resumed.writerow(ROWS[2])
+    with open_csv(path, "r", compression) as f:
+        assert list(csv.reader(f)) == [["id", "note"], *ROWS]
+
+
+def test_unknown_codec(tmp_path):
+    with pytest.raises(ValueError):
+        open_compressed(str(tmp_path / "x"), "wb", "lz4")
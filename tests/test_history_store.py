@@ -0,0 +1,36 @@
+import json
+import uuid
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from historyStore import compact
+from inputJsonParser import process_json
+from partyGenerator import generate_parties
+from runCheckpoint import write_checkpoint
+
+
+def test_compact_leaves_resumable_runs(tmp_path):
+    data_dir = tmp_path / "data"
+    process_json(generate_parties(20), base_output_dir=str(data_dir), load=None)
+    (done,) = data_dir.iterdir()
+    running = data_dir / str(uuid.uuid4())
+    running.mkdir()
+    (running / "metrics.json").write_text(
+        json.dumps({"run_date_utc": "2020-01-01 00:00:00"})
+    )
+    write_checkpoint(str(running), {"parties": 10, "complete": False})
+
+    summary = compact(
+        str(data_dir),
+        str(tmp_path / "history"),
+        min_age_days=-1,
+        today=date.today(),
+    )
+
+    assert summary["runs_compacted"] == 1
+    assert summary["runs_incomplete"] == 1
+    assert not done.exists()
+    assert running.exists()
@@ -0,0 +1,70 @@
+import logging
+import re
+
+from utils import loggger
+from utils.loggger import Sampler, get_logger, get_process_logger, log_sampled
+
+
+def stop(logger):
+    for handler in logger.handlers:
+        handler.listener.stop()
+    logger.handlers.clear()
+
+
+def test_queued_logger_writes_every_record(tmp_path, monkeypatch):
+    for flag in ("logThreads", "logProcesses", "logMultiprocessing"):
+        monkeypatch.setattr(logging, flag, getattr(logging, flag))
+    log_file = tmp_path / "process.log"
+    logger = get_process_logger("test_queued", str(log_file), batch_size=7)
+    for i in range(20):
+        logger.info(f"party {i}")
+    stop(logger)
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 20
+    assert re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z - party 19", lines[-1])
+
+
+def test_named_logger_does_not_propagate_to_root(tmp_path):
+    seen = []
+    root_handler = logging.Handler()
+    root_handler.emit = seen.append
+    logging.getLogger().addHandler(root_handler)
+    try:
+        logger = get_logger(
+            "test_named", log_file=str(tmp_path / "a.log"), console=False
+        )
+        logger.warning("once")
+        stop(logger)
+    finally:
+        logging.getLogger().removeHandler(root_handler)
+    assert seen == []
+    assert (tmp_path / "a.log").read_text().count("once") == 1
+
+
+def test_sampler_every():
+    sampler = Sampler(every=3)
+    assert [sampler.allow() for _ in range(7)] == [True, False, False] * 2 + [True]
+
+
+def test_sampler_caps_messages_per_second(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(loggger.time, "monotonic", lambda: now[0])
+    sampler = Sampler(max_per_second=2)
+    assert [sampler.allow() for _ in range(4)] == [True, True, False, False]
+    now[0] += 1
+    assert sampler.allow()
+
+
+def test_log_sampled_skips_messages(tmp_path):
+    log_file = tmp_path / "sampled.log"
+    logger = get_logger(
+        "test_sampled", log_file=str(log_file), console=False, sample_every=10
+    )
+    for i in range(25):
+        log_sampled(logger, "party %s", i)
+    stop(logger)
+    assert [line.split(" - ")[-1] for line in log_file.read_text().splitlines()] == [
+        "party 0",
+        "party 10",
+        "party 20",
+    ]
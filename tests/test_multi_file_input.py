@@ -0,0 +1,52 @@
+import csv
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from sqlalchemy import create_engine, inspect, text
+
+from inputJsonParser import process_json
+from partyGenerator import generate_parties
+from partyStream import PartyFiles, input_files
+
+
+def test_failed_file_leaves_other_files_rows(tmp_path):
+    parties = list(generate_parties(600))
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    (inputs / "a.json").write_text(json.dumps(parties[:300]))
+    (inputs / "c.json").write_text(json.dumps(parties[300:]))
+    # The same parties as a.json, then a line that does not parse
+    with open(inputs / "b.ndjson", "w", encoding="utf-8") as f:
+        for party in parties[:200]:
+            f.write(json.dumps(party) + "\n")
+        f.write("{broken\n")
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'parties.db'}")
+    process_json(
+        PartyFiles(input_files(str(inputs))),
+        base_output_dir=str(tmp_path / "data"),
+        workers=2,
+        load="direct",
+        engine=engine,
+        batch_size=50,
+    )
+
+    (run_dir,) = (tmp_path / "data").iterdir()
+    metrics = json.loads((run_dir / "metrics.json").read_text())
+    assert metrics["parties"] == 600
+    assert [bool(f["error"]) for f in metrics["files"]] == [False, True, False]
+    assert sorted(inspect(engine).get_table_names()) == sorted(
+        name.split(".")[0] for name in os.listdir(run_dir) if name.endswith(".csv")
+    )
+    with engine.connect() as conn:
+        for name in os.listdir(run_dir):
+            if name.endswith(".csv"):
+                with open(run_dir / name, newline="", encoding="utf-8") as f:
+                    rows = sum(1 for _ in csv.reader(f)) - 1
+                table = name.split(".")[0]
+                loaded = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                assert loaded == rows, table
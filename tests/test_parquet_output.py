@@ -0,0 +1,46 @@
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SRC_DIR
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+SAMPLE_INPUT = os.path.join(SRC_DIR, "json", "input.json")
+
+
+def test_party_reference_schema_writes_sample_input_to_parquet(tmp_path):
+    subprocess.run(
+        [
+            sys.executable,
+            os.path.join(SRC_DIR, "partyReferenceSchema.py"),
+            "--input",
+            SAMPLE_INPUT,
+            "--format",
+            "parquet",
+        ],
+        cwd=tmp_path,
+        check=True,
+    )
+    (phones,) = glob.glob(str(tmp_path / "phones_*.parquet"))
+    types = pq.read_table(phones).column("Type").to_pylist()
+    assert "Mobile" in types
+
+
+def test_process_json_writes_sample_input_to_parquet(tmp_path):
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    from inputJsonParser import process_json
+    from partyStream import open_parties
+
+    process_json(
+        open_parties(SAMPLE_INPUT),
+        base_output_dir=str(tmp_path),
+        load=None,
+        output_format="parquet",
+    )
+    (phones,) = glob.glob(str(tmp_path / "*" / "phones.parquet"))
+    types = pq.read_table(phones).column("type").to_pylist()
+    assert "Mobile" in types
@@ -0,0 +1,95 @@
+import copy
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from partyDelta import (
+    INSERT,
+    UPDATE,
+    PartyDelta,
+    load_fingerprints,
+    party_fingerprint,
+    save_fingerprints,
+)
+from partyGenerator import generate_parties
+
+
+def details(party):
+    return next(iter(party.values()))
+
+
+def add_phone(party):
+    details(party)["Phones"].append(
+        {"PhoneNumber": "+6495551111", "IsPrimary": False, "Type": "Home"}
+    )
+
+
+def test_classify_against_the_previous_run():
+    parties = list(generate_parties(4))
+    first = PartyDelta({})
+    assert [first.classify(p)[0] for p in parties] == [INSERT] * 4
+
+    changed = copy.deepcopy(parties[1])
+    add_phone(changed)
+    keyless = copy.deepcopy(parties[3])
+    del details(keyless)["PartyIdentifier"]
+    second = PartyDelta(first.current)
+    changes = [second.classify(p) for p in [parties[0], changed, keyless]]
+    assert [change for change, _ in changes] == [None, UPDATE, None]
+    assert changes[2] == (None, None)
+    assert second.deleted() == [
+        party_id for party_id in first.current if party_id not in second.current
+    ]
+    assert len(second.deleted()) == 2
+    assert second.counts == {INSERT: 0, UPDATE: 1, "unchanged": 1, "keyless": 1}
+
+
+def test_fingerprint_ignores_key_order():
+    party = next(iter(generate_parties(1)))
+    reordered = {k: dict(reversed(list(v.items()))) for k, v in party.items()}
+    assert party_fingerprint(reordered) == party_fingerprint(party)
+
+
+def test_fingerprint_store_round_trip(tmp_path):
+    path = str(tmp_path / "store" / "fingerprints.csv")
+    assert load_fingerprints(path) == {}
+    save_fingerprints(path, {"4001": "ab", "4002": "cd"})
+    assert load_fingerprints(path) == {"4001": "ab", "4002": "cd"}
+    assert os.listdir(tmp_path / "store") == ["fingerprints.csv"]
+
+
+def test_direct_delta_load_applies_only_changes(tmp_path):
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    from inputJsonParser import process_json
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'parties.db'}")
+    parties = list(generate_parties(50))
+    options = dict(
+        base_output_dir=str(tmp_path / "data"),
+        load="direct",
+        csv_output=False,
+        engine=engine,
+        delta=True,
+    )
+    process_json(parties, **options)
+    second = copy.deepcopy(parties[:40])
+    for party in second[:5]:
+        add_phone(party)
+    process_json(second, **options)
+
+    def party_phones():
+        with engine.connect() as conn:
+            return conn.execute(
+                text("SELECT partyidentifier, COUNT(*) FROM phones GROUP BY 1")
+            ).all()
+
+    expected = [
+        (str(details(p)["PartyIdentifier"]), len(details(p)["Phones"]))
+        for p in second
+        if details(p)["Phones"]
+    ]
+    assert sorted(party_phones()) == sorted(expected)
+    # A re-run of the same input changes nothing
+    process_json(copy.deepcopy(second), **options)
+    assert sorted(party_phones()) == sorted(expected)
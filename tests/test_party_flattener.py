@@ -0,0 +1,80 @@
+import csv
+
+from partyFlattener import (
+    TABLE_FIELDS,
+    AddressDimension,
+    PartyFlattener,
+    load_flattener,
+)
+from partyGenerator import generate_parties
+from partyReferenceSchema import process_party
+from rowMemoryBenchmark import hold_rows
+from tableWriters import CsvTableWriter
+
+
+def test_process_party_reuses_one_flattener_per_load():
+    load_flattener.cache_clear()
+    parties = list(generate_parties(20))
+    rows = [process_party(party, 7, "2024-01-01") for party in parties]
+    assert load_flattener.cache_info().misses == 1
+    assert load_flattener.cache_info().hits == len(parties) - 1
+
+    fresh = [
+        tuple(PartyFlattener(7, "2024-01-01").flatten_tables(party).values())
+        for party in parties
+    ]
+    assert rows == fresh
+
+
+def test_process_party_keeps_loads_apart():
+    party = next(iter(generate_parties(1)))
+    first = process_party(party, 1, "2024-01-01")
+    second = process_party(party, 2, "2024-01-02")
+    assert first != second
+
+
+def test_address_dimension_emits_each_address_once_past_the_cache():
+    emitted = []
+    dimension = AddressDimension(lambda key, content: (key, *content), maxsize=1)
+    dimension.emit = emitted.append
+    keys = [
+        dimension.key(content) for content in [("1 Main St",), (" 2 Side Rd ",)] * 3
+    ]
+    assert keys[0::2] == [keys[0]] * 3 and keys[1::2] == [keys[1]] * 3
+    assert emitted == [(keys[0], "1 Main St"), (keys[1], "2 Side Rd")]
+    assert dimension.key(("1 Main St ",)) == keys[0]
+    assert len(emitted) == 2
+
+
+def test_rows_are_tuples_in_table_column_order():
+    party = next(iter(generate_parties(3, organisation_ratio=0)))
+    tables = PartyFlattener(7, "2024-01-01").flatten_tables(party)
+    assert set(tables) == set(TABLE_FIELDS)
+    rows = [row for table_rows in tables.values() for row in table_rows]
+    assert rows
+    for table, table_rows in tables.items():
+        for row in table_rows:
+            assert isinstance(row, tuple) and not hasattr(row, "__dict__")
+            assert row._fields == tuple(TABLE_FIELDS[table])
+            assert (row.LoadID, row.LoadDateUTC) == (7, "2024-01-01")
+
+
+def test_csv_writer_takes_row_tuples(tmp_path):
+    party = next(iter(generate_parties(1, organisation_ratio=0)))
+    (row,) = PartyFlattener(7, "2024-01-01").flatten_tables(party)["individual"]
+    path = tmp_path / "individual.csv"
+    with CsvTableWriter(str(path), row._fields) as writer:
+        writer.writerow(row)
+    with open(path, newline="", encoding="utf-8") as f:
+        header, written = csv.reader(f)
+    assert header == list(row._fields)
+    assert written == ["" if v is None else str(v) for v in row]
+    with CsvTableWriter(str(tmp_path / "empty.csv"), row._fields):
+        pass
+    assert not (tmp_path / "empty.csv").exists()
+
+
+def test_row_memory_benchmark_holds_the_same_rows():
+    tuple_rows, _, _ = hold_rows(50, "tuple")
+    dict_rows, _, _ = hold_rows(50, "dict")
+    assert tuple_rows == dict_rows > 50
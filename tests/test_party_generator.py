@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from conftest import SRC_DIR
+from partyGenerator import generate_parties
+from partyReferenceValidation import validate_parties
+
+SCHEMA_PATH = os.path.join(SRC_DIR, "partyReferenceSchema.json")
+
+
+def test_same_seed_same_parties():
+    assert list(generate_parties(50, seed=4)) == list(generate_parties(50, seed=4))
+    assert list(generate_parties(50, seed=4)) != list(generate_parties(50, seed=5))
+
+
+@pytest.mark.parametrize(
+    "ratio, key", [(0, "IndividualDetails"), (1, "OrganisationDetails")]
+)
+def test_organisation_ratio(ratio, key):
+    assert {k for p in generate_parties(50, organisation_ratio=ratio) for k in p} == {
+        key
+    }
+
+
+def test_invalid_ratio_controls_schema_failures():
+    assert validate_parties(generate_parties(200), SCHEMA_PATH)[1] == 0
+    assert validate_parties(generate_parties(50, invalid_ratio=1), SCHEMA_PATH)[1] == 50
+
+
+def test_benchmark_times_each_stage(tmp_path):
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    from pipelineBenchmark import run_benchmark
+
+    results = run_benchmark(
+        60, ["parse", "process_party", "process_json_csv"], work_dir=str(tmp_path)
+    )
+    by_stage = {r["stage"]: r for r in results}
+    assert list(by_stage) == ["generate", "parse", "process_party", "process_json_csv"]
+    assert by_stage["parse"]["parties"] == 60
+    assert all(r["rows"] > 0 and r["seconds"] > 0 for r in results)
+    assert by_stage["process_json_csv"]["output_bytes"] > 0
+    assert all(r["peak_rss_mb"] > 0 for r in results)
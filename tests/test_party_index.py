@@ -0,0 +1,61 @@
+import csv
+import uuid
+
+import pytest
+
+from csvCodecs import codec_available, open_csv
+from partyIndex import PartyIndex
+
+ROWS = [
+    ["p1", "+6495551111", "Home"],
+    ["p1", "+64211234567", "Mobile"],
+    ["p2", "+6495552222", "Work,\nafter hours"],
+    ["p3", "+6495553333", ""],
+    ["p1", "+6495554444", "Home"],
+]
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".csv.gz", ".csv.zst"])
+def test_lookup_reads_each_block_of_a_party(tmp_path, suffix):
+    if suffix == ".csv.zst" and not codec_available("zstd"):
+        pytest.skip("zstandard is not installed")
+    run_dir = tmp_path / "data" / str(uuid.uuid4())
+    run_dir.mkdir(parents=True)
+    with open_csv(str(run_dir / f"phones{suffix}"), "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["partyidentifier", "phonenumber", "type"])
+        writer.writerows(ROWS)
+
+    with PartyIndex(str(tmp_path / "index.sqlite")) as index:
+        assert index.add_run(str(run_dir), "2024-01-01T00:00:00", {"loadid": "7"}) == 4
+        assert index.add_run(str(run_dir), "2024-01-01T00:00:00") == 0
+        (result,) = index.lookup("p2")
+        assert result["table"] == "phones"
+        assert result["rows"] == [
+            {
+                "partyidentifier": "p2",
+                "phonenumber": "+6495552222",
+                "type": "Work,\nafter hours",
+                "loadid": "7",
+            }
+        ]
+        first, second = index.lookup("p1")
+        assert [row["phonenumber"] for row in first["rows"] + second["rows"]] == [
+            "+6495551111",
+            "+64211234567",
+            "+6495554444",
+        ]
+        assert index.lookup("missing") == []
+
+
+def test_prune_forgets_removed_runs(tmp_path):
+    run_dir = tmp_path / str(uuid.uuid4())
+    run_dir.mkdir()
+    with open(run_dir / "phones.csv", "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([["partyidentifier"], ["p1"]])
+    with PartyIndex(str(tmp_path / "index.sqlite")) as index:
+        index.add_run(str(run_dir), "2024-01-01T00:00:00")
+        (run_dir / "phones.csv").unlink()
+        run_dir.rmdir()
+        assert index.prune() == [run_dir.name]
+        assert index.lookup("p1") == []
@@ -0,0 +1,75 @@
+from functools import partial
+
+import pytest
+
+from partyFlattener import RunFlattener, list_sinks
+from partyGenerator import generate_parties
+from partyPipeline import run_pipeline
+from runMetrics import RunMetrics
+
+RUN_COLUMNS = {
+    "run_guid": "guid",
+    "run_date_local": "2024-01-01 12:00:00",
+    "run_date_utc": "2024-01-01 00:00:00",
+}
+
+
+class ListWriter:
+    def __init__(self, fail_after=None):
+        self.rows = []
+        self.closed = False
+        self.fail_after = fail_after
+
+    def writerows(self, rows):
+        if self.fail_after is not None and len(self.rows) >= self.fail_after:
+            raise OSError("disk full")
+        self.rows.extend(rows)
+
+    def close(self):
+        self.closed = True
+
+
+def make_flattener():
+    return partial(RunFlattener, **RUN_COLUMNS, run_manifest=True)
+
+
+def test_pipeline_writes_the_rows_of_a_sequential_flatten():
+    parties = list(generate_parties(300))
+    expected = {table: [] for table in RunFlattener.tables}
+    flattener = make_flattener()()
+    sinks = list_sinks(expected)
+    for party in parties:
+        flattener.flatten(party, sinks)
+
+    stages = {
+        stage: {table: ListWriter() for table in RunFlattener.tables}
+        for stage in ("write", "load")
+    }
+    metrics = RunMetrics()
+    count = run_pipeline(
+        iter(parties),
+        make_flattener(),
+        stages,
+        batch_size=16,
+        queue_size=2,
+        metrics=metrics,
+    )
+    assert count == 300
+    for writers in stages.values():
+        for table, writer in writers.items():
+            assert writer.closed
+            assert writer.rows == [tuple(row) for row in expected[table]]
+    record = metrics.stages["pipeline"]
+    assert {"parse_seconds", "flatten_seconds", "write_seconds", "load_seconds"} <= set(
+        record
+    )
+
+
+def test_failing_writer_stops_the_pipeline_and_closes_the_others():
+    writers = {table: ListWriter() for table in RunFlattener.tables}
+    writers["phones"] = ListWriter(fail_after=1)
+    with pytest.raises(OSError, match="disk full"):
+        run_pipeline(
+            generate_parties(500), make_flattener(), {"write": writers}, batch_size=10
+        )
+    assert all(writer.closed for table, writer in writers.items() if table != "phones")
@@ -0,0 +1,122 @@
+import csv
+import gzip
+import os
+
+from csvCodecs import header_bytes, open_csv
+from partyShards import (
+    map_shards,
+    merge_csv_shards,
+    merge_unique_shards,
+    remove_shard,
+    remove_shards_from,
+    shard_path,
+)
+
+
+def touch(directory, *names):
+    for name in names:
+        open(os.path.join(directory, name), "w").close()
+
+
+def test_remove_shards_from_keeps_checkpoint_and_earlier_shards(tmp_path):
+    names = [
+        os.path.basename(shard_path(tmp_path, table, i, suffix))
+        for table in ("parties", "phones")
+        for i, suffix in [(0, ".csv"), (1, ".csv.gz"), (2, ".parquet")]
+    ]
+    touch(tmp_path, *names, "checkpoint.json", "checkpoint.json.tmp", "notes.txt")
+    remove_shards_from(str(tmp_path), 1)
+    assert sorted(os.listdir(tmp_path)) == [
+        "checkpoint.json",
+        "notes.txt",
+        "parties.000000.csv",
+        "phones.000000.csv",
+    ]
+
+
+def test_remove_shard_only_removes_its_index(tmp_path):
+    touch(tmp_path, "parties.000003.csv", "parties.000030.csv", "checkpoint.json")
+    remove_shard(str(tmp_path), 3)
+    assert sorted(os.listdir(tmp_path)) == ["checkpoint.json", "parties.000030.csv"]
+
+
+def shard_sum(shard_index, chunk, offset):
+    return shard_index, sum(chunk) + offset
+
+
+def test_map_shards_yields_in_shard_order():
+    results = list(map_shards(shard_sum, range(100), 3, 7, 1000, start=5))
+    assert [i for i, _ in results] == list(range(5, 20))
+    assert sum(total for _, total in results) == sum(range(100)) + 15 * 1000
+
+
+def write_shard(path, rows, header=None):
+    with open_csv(str(path), "w") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_merge_csv_shards_keeps_one_header_and_the_order(tmp_path):
+    shards = [
+        write_shard(tmp_path / f"phones.{i:06d}.csv", [[f"p{i}", i]], ["id", "n"])
+        for i in range(3)
+    ]
+    missing = str(tmp_path / "phones.000009.csv")
+    dest = str(tmp_path / "phones.csv")
+    assert merge_csv_shards([*shards, missing], dest) == dest
+    with open(dest, newline="") as f:
+        assert list(csv.reader(f)) == [
+            ["id", "n"],
+            ["p0", "0"],
+            ["p1", "1"],
+            ["p2", "2"],
+        ]
+    assert not any(os.path.exists(p) for p in shards)
+    assert merge_csv_shards([missing], str(tmp_path / "none.csv")) is None
+
+
+def test_merge_compressed_shards_after_a_header(tmp_path):
+    shards = [
+        write_shard(tmp_path / f"phones.{i:06d}.csv.gz", [[f"p{i}", ""]])
+        for i in range(3)
+    ]
+    dest = str(tmp_path / "phones.csv.gz")
+    merge_csv_shards(shards, dest, header_bytes(["id", "n"], "gzip"))
+    assert gzip.open(dest, "rt").read().splitlines() == ["id,n", "p0,", "p1,", "p2,"]
+
+
+class ListWriter:
+    def __init__(self):
+        self.rows = []
+
+    @property
+    def rows_written(self):
+        return len(self.rows)
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def test_merge_unique_shards_keeps_the_first_row_per_key(tmp_path):
+    shards = [
+        write_shard(
+            tmp_path / "address_dimension.000000.csv", [["k1", "1 Main St"], ["k2", ""]]
+        ),
+        write_shard(
+            tmp_path / "address_dimension.000001.csv",
+            [["k2", "x"], ["k3", "3 Side Rd"]],
+        ),
+    ]
+    writer = ListWriter()
+    assert merge_unique_shards(shards, writer) == 3
+    assert writer.rows == [("k1", "1 Main St"), ("k2", None), ("k3", "3 Side Rd")]
+    assert not any(os.path.exists(p) for p in shards)
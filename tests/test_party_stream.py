@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+from partyGenerator import generate_parties
+from partyStream import (
+    JsonArrayReader,
+    NdjsonReader,
+    is_ndjson,
+    iter_json_array,
+    json_array_to_ndjson,
+    ndjson_range_bytes,
+    ndjson_ranges,
+    open_parties,
+)
+
+
+def tricky_parties():
+    parties = list(generate_parties(30))
+    details = next(iter(parties[0].values()))
+    details["Note"] = 'Brackets ] [ } { , quotes \\" and "escaped"'
+    details["Name"] = "Māori café ☕"
+    return parties
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 16])
+def test_reader_yields_the_array_elements(tmp_path, chunk_size):
+    parties = tricky_parties()
+    path = tmp_path / "parties.json"
+    path.write_text(json.dumps(parties, indent=2, ensure_ascii=False), "utf-8")
+    assert list(iter_json_array(str(path), chunk_size)) == parties
+
+
+def test_reader_resumes_from_offset_after_multibyte_text(tmp_path):
+    parties = tricky_parties()
+    path = tmp_path / "parties.json"
+    path.write_text(json.dumps(parties, ensure_ascii=False), "utf-8")
+    reader = JsonArrayReader(str(path), chunk_size=100)
+    iterator = iter(reader)
+    head = [next(iterator) for _ in range(3)]
+    assert head + list(reader.from_offset(reader.offset())) == parties
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "", "[{}, "])
+def test_reader_rejects_anything_but_a_complete_array(tmp_path, text):
+    path = tmp_path / "parties.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path)))
+
+
+def test_empty_array(tmp_path):
+    path = tmp_path / "parties.json"
+    path.write_text(" [ ] \n")
+    assert list(open_parties(str(path))) == []
+
+
+def write_ndjson(path, parties):
+    # CRLF endings and blank lines, as hand-edited files have them
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for i, party in enumerate(parties):
+            f.write(json.dumps(party, ensure_ascii=False) + "\r\n")
+            if i % 7 == 0:
+                f.write("\r\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("range_bytes", [1, 500, 4096, 1 << 30])
+def test_ndjson_ranges_cover_every_line_once(tmp_path, range_bytes):
+    parties = tricky_parties()
+    path = write_ndjson(tmp_path / "parties.ndjson", parties)
+    ranges = ndjson_ranges(path, range_bytes)
+    assert ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(path)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    readers = NdjsonReader(path).split(range_bytes)
+    assert [party for reader in readers for party in reader] == parties
+
+
+def test_ndjson_range_bytes_estimates_from_the_first_lines(tmp_path):
+    parties = tricky_parties()
+    path = write_ndjson(tmp_path / "parties.ndjson", parties)
+    size = ndjson_range_bytes(path, 10)
+    assert 0 < size < os.path.getsize(path)
+    assert len(NdjsonReader(path).split(size)) in range(2, 5)
+
+
+def test_ndjson_reader_resumes_and_reports_bad_lines(tmp_path):
+    parties = tricky_parties()
+    path = write_ndjson(tmp_path / "parties.ndjson", parties)
+    reader = NdjsonReader(path)
+    iterator = iter(reader)
+    head = [next(iterator) for _ in range(4)]
+    assert head + list(reader.from_offset(reader.offset())) == parties
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("{not json\n")
+    with pytest.raises(ValueError, match="invalid JSON line at byte"):
+        list(NdjsonReader(path))
+
+
+def test_convert_array_to_ndjson(tmp_path):
+    parties = tricky_parties()
+    array = tmp_path / "parties.json"
+    array.write_text(json.dumps(parties, indent=2), "utf-8")
+    ndjson = str(tmp_path / "parties.ndjson")
+    assert json_array_to_ndjson(str(array), ndjson) == len(parties)
+    assert is_ndjson(ndjson) and not is_ndjson(str(array))
+    assert isinstance(open_parties(ndjson), NdjsonReader)
+    assert list(open_parties(ndjson)) == parties
@@ -0,0 +1,44 @@
+import json
+import os
+
+import pytest
+
+from conftest import SRC_DIR
+from partyGenerator import generate_parties, write_json_array
+from partyReferenceValidation import iter_parties, validate_parties
+
+SCHEMA_PATH = os.path.join(SRC_DIR, "partyReferenceSchema.json")
+
+
+@pytest.fixture(scope="module")
+def parties():
+    return list(generate_parties(400, invalid_ratio=0.2))
+
+
+def test_workers_give_the_same_result_in_input_order(parties):
+    serial = validate_parties(parties, SCHEMA_PATH, max_errors=1000)
+    sharded = validate_parties(
+        parties, SCHEMA_PATH, max_errors=1000, workers=2, chunk_size=30
+    )
+    assert sharded == serial
+    party_count, invalid, errors = serial
+    assert party_count == 400 and 0 < invalid < 400
+    assert [path[0] for path, _ in errors] == sorted(path[0] for path, _ in errors)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_error_cap_still_counts_every_invalid_party(parties, workers):
+    _, invalid, _ = validate_parties(parties, SCHEMA_PATH, max_errors=1000)
+    party_count, capped_invalid, errors = validate_parties(
+        parties, SCHEMA_PATH, max_errors=3, workers=workers, chunk_size=50
+    )
+    assert (party_count, capped_invalid, len(errors)) == (400, invalid, 3)
+
+
+def test_iter_parties_reads_an_array_or_one_party(tmp_path, parties):
+    array = tmp_path / "parties.json"
+    write_json_array(str(array), parties[:5])
+    single = tmp_path / "party.json"
+    single.write_text(json.dumps(parties[0]))
+    assert list(iter_parties(str(array))) == parties[:5]
+    assert list(iter_parties(str(single))) == parties[:1]
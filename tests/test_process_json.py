@@ -0,0 +1,155 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from sqlalchemy import create_engine, text
+
+from inputJsonParser import RUN_COLUMNS, RunOptions, process_json, read_run_manifest
+from partyGenerator import generate_parties, write_json_array
+from partyStream import JsonArrayReader, NdjsonReader
+
+
+def run_files(base_output_dir):
+    (run_dir,) = os.listdir(base_output_dir)
+    run_dir = os.path.join(base_output_dir, run_dir)
+    return {
+        name: open(os.path.join(run_dir, name), "rb").read()
+        for name in sorted(os.listdir(run_dir))
+        if name.endswith(".csv")
+    }
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"load": "bulk"},
+        {"output_format": "xml"},
+        {"load": "csv", "csv_output": False},
+        {"load": "csv", "delta": True},
+        {"load": None, "pipeline": True, "workers": 2},
+        {"load": None, "checkpoint_every": 10, "output_format": "parquet"},
+        {"load": None, "address_dimension": True, "delta": True},
+    ],
+)
+def test_options_that_do_not_combine(options):
+    with pytest.raises(ValueError):
+        RunOptions(**options).check()
+
+
+def test_unknown_option(tmp_path):
+    with pytest.raises(TypeError):
+        process_json([], base_output_dir=str(tmp_path), load=None, wokers=2)
+
+
+def test_streamed_input_gives_the_same_files_as_a_list(tmp_path):
+    parties = list(generate_parties(200))
+    path = tmp_path / "parties.json"
+    write_json_array(str(path), parties)
+    for name, data in [("list", parties), ("stream", JsonArrayReader(str(path)))]:
+        process_json(
+            data, base_output_dir=str(tmp_path / name), load=None, run_manifest=True
+        )
+    assert run_files(tmp_path / "list") == run_files(tmp_path / "stream")
+
+
+def test_workers_give_the_same_files_as_one_process(tmp_path):
+    parties = list(generate_parties(500))
+    for name, workers in [("serial", 1), ("sharded", 3)]:
+        process_json(
+            parties,
+            base_output_dir=str(tmp_path / name),
+            workers=workers,
+            chunk_size=70,
+            load=None,
+            run_manifest=True,
+        )
+    assert run_files(tmp_path / "serial") == run_files(tmp_path / "sharded")
+
+
+def test_run_writes_stage_and_table_metrics(tmp_path):
+    process_json(generate_parties(100), base_output_dir=str(tmp_path), load=None)
+    (run_guid,) = os.listdir(tmp_path)
+    with open(tmp_path / run_guid / "metrics.json", encoding="utf-8") as f:
+        metrics = json.load(f)
+    assert metrics["run_guid"] == run_guid and metrics["parties"] == 100
+    assert metrics["stages"]["flatten"]["wall_seconds"] > 0
+    for table, record in metrics["tables"].items():
+        assert record["bytes"] > 0
+        assert os.path.exists(tmp_path / run_guid / f"{table}.csv")
+    assert metrics["tables"]["phones"]["rows"] > 0
+
+
+def test_run_manifest_replaces_the_run_columns_of_every_row(tmp_path):
+    parties = list(generate_parties(100))
+    process_json(parties, base_output_dir=str(tmp_path / "rows"), load=None)
+    engine = create_engine(f"sqlite:///{tmp_path / 'parties.db'}")
+    process_json(
+        parties,
+        base_output_dir=str(tmp_path / "manifest"),
+        load="direct",
+        engine=engine,
+        run_manifest=True,
+    )
+    (run_guid,) = os.listdir(tmp_path / "manifest")
+    run_dir = str(tmp_path / "manifest" / run_guid)
+    manifest = read_run_manifest(run_dir)
+    assert list(manifest) == RUN_COLUMNS and manifest["run_guid"] == run_guid
+
+    with_columns, without = run_files(tmp_path / "rows"), run_files(
+        tmp_path / "manifest"
+    )
+    assert with_columns.keys() == without.keys()
+    for name, data in without.items():
+        header = data.splitlines()[0].decode().split(",")
+        assert not set(RUN_COLUMNS) & set(header)
+        assert len(data) < len(with_columns[name])
+
+    with engine.connect() as conn:
+        loaded = conn.execute(
+            text("SELECT DISTINCT run_guid, run_date_utc FROM phones")
+        ).all()
+    assert loaded == [(run_guid, manifest["run_date_utc"])]
+
+
+def test_pipeline_gives_the_files_and_rows_of_a_sequential_run(tmp_path):
+    parties = list(generate_parties(300))
+    loaded = {}
+    for name, pipeline in [("serial", False), ("pipeline", True)]:
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        process_json(
+            parties,
+            base_output_dir=str(tmp_path / name),
+            load="direct",
+            engine=engine,
+            run_manifest=True,
+            pipeline=pipeline,
+        )
+        with engine.connect() as conn:
+            loaded[name] = conn.execute(
+                text("SELECT partyidentifier, phonenumber, type FROM phones")
+            ).all()
+    assert run_files(tmp_path / "serial") == run_files(tmp_path / "pipeline")
+    assert sorted(loaded["serial"]) == sorted(loaded["pipeline"])
+    assert loaded["serial"]
+
+
+def test_ndjson_ranges_on_workers_give_the_files_of_one_process(tmp_path):
+    parties = list(generate_parties(400))
+    path = tmp_path / "parties.ndjson"
+    path.write_text("".join(json.dumps(p) + "\n" for p in parties), "utf-8")
+    for name, data, workers in [
+        ("serial", parties, 1),
+        ("ranges", NdjsonReader(str(path)), 2),
+    ]:
+        process_json(
+            data,
+            base_output_dir=str(tmp_path / name),
+            workers=workers,
+            chunk_size=60,
+            load=None,
+            run_manifest=True,
+        )
+    assert run_files(tmp_path / "serial") == run_files(tmp_path / "ranges")
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from runMetrics import RunMetrics
+
+
+def test_stage_records_wall_cpu_and_rss():
+    metrics = RunMetrics()
+    for _ in range(2):
+        with metrics.stage("flatten"):
+            sum(range(10000))
+    record = metrics.stages["flatten"]
+    assert record["wall_seconds"] > 0 and record["cpu_seconds"] >= 0
+    assert record["peak_rss_mb"] > 0
+
+
+def test_timed_iter_adds_parse_time_and_split_stage_keeps_the_rest():
+    metrics = RunMetrics()
+    with metrics.stage("flatten"):
+        assert list(metrics.timed_iter(range(5), "flatten")) == list(range(5))
+    record = metrics.stages["flatten"]
+    metrics.split_stage("flatten")
+    assert record["flatten_seconds"] == pytest.approx(
+        record["wall_seconds"] - record["parse_seconds"]
+    )
+
+
+def test_merge_prefixes_worker_stages_and_sums_tables():
+    metrics, worker = RunMetrics(), RunMetrics()
+    metrics.table("phones", rows=3)
+    worker.stages["flatten"] = {"wall_seconds": 1.5, "peak_rss_mb": 80.0}
+    worker.table("phones", rows=4)
+    worker.input_file("a.json", 10, 0.25)
+    metrics.merge(worker)
+    metrics.merge(worker)
+    assert metrics.stages["flatten"] == {
+        "worker_wall_seconds": 3.0,
+        "worker_peak_rss_mb": 80.0,
+    }
+    assert metrics.tables["phones"] == {"rows": 11}
+    assert len(metrics.files) == 2
+
+
+def test_write_metrics_json_with_file_bytes(tmp_path):
+    (tmp_path / "phones.csv").write_text("partyidentifier\n1\n")
+    os.makedirs(tmp_path / "insert")
+    (tmp_path / "insert" / "emails.csv.gz").write_bytes(b"12345")
+    (tmp_path / "notes.txt").write_text("not an output file")
+    metrics = RunMetrics()
+    metrics.csv_bytes(str(tmp_path))
+    path = metrics.write(str(tmp_path / "metrics.json"), run_guid="abc", parties=1)
+    with open(path, encoding="utf-8") as f:
+        written = json.load(f)
+    assert written["run_guid"] == "abc" and written["parties"] == 1
+    assert written["tables"] == {"phones": {"bytes": 18}, "insert/emails": {"bytes": 5}}
+    assert "files" not in written
@@ -0,0 +1,24 @@
+import os
+import shutil
+
+import partySchemaCompiler
+from partySchemaCompiler import SCHEMA_PATH, load_row_builders
+
+
+def test_row_builders_reused_without_rereading_schema(tmp_path, monkeypatch):
+    schema_path = tmp_path / "schema.json"
+    shutil.copy(SCHEMA_PATH, schema_path)
+    rows = load_row_builders(str(schema_path))
+
+    def no_hash(*args):
+        raise AssertionError("schema hashed again")
+
+    monkeypatch.setattr(partySchemaCompiler.hashlib, "sha256", no_hash)
+    assert load_row_builders(str(schema_path)) is rows
+
+    monkeypatch.undo()
+    with open(schema_path, "a", encoding="utf-8") as f:
+        f.write("\n")
+    stat = os.stat(schema_path)
+    os.utime(schema_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert load_row_builders(str(schema_path)) is not rows
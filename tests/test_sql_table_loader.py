@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from sqlTableLoader import SqlKeyDeleter, SqlTableSink, count_rows, create_tables
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'parties.db'}")
+
+
+def test_sink_inserts_in_batches_with_constants(engine):
+    tables = create_tables(engine, {"phones": ["partyidentifier", "number", "loadid"]})
+    batches = []
+    sink = SqlTableSink(
+        engine,
+        tables["phones"],
+        batch_size=2,
+        before_flush=lambda: batches.append(1),
+        constants={"loadid": 7},
+    )
+    with sink:
+        sink.writerows([("p1", "+6495551111"), ("p2", None), ("p3", True)])
+    assert sink.rows_written == 3
+    assert len(batches) == 2
+    with engine.connect() as conn:
+        rows = conn.execute(select(tables["phones"])).all()
+    assert rows == [
+        ("p1", "+6495551111", "7"),
+        ("p2", None, "7"),
+        ("p3", "True", "7"),
+    ]
+
+
+def test_sink_rejects_constants_that_are_not_the_last_columns(engine):
+    tables = create_tables(engine, {"phones": ["loadid", "number"]})
+    with pytest.raises(ValueError):
+        SqlTableSink(engine, tables["phones"], constants={"loadid": 1})
+
+
+def test_sink_resume_skips_rows_already_in_the_table(engine):
+    tables = create_tables(engine, {"phones": ["partyidentifier", "number"]})
+    rows = [(f"p{i}", str(i)) for i in range(5)]
+    first = SqlTableSink(engine, tables["phones"], batch_size=2)
+    first.writerows(rows[:2])
+    state = first.checkpoint()
+    # Flushed after the checkpoint, then the run stopped
+    first.writerows(rows[2:4])
+
+    resumed = SqlTableSink(engine, tables["phones"], batch_size=2)
+    resumed.resume({**state, "in_table": count_rows(engine, tables["phones"])})
+    with resumed:
+        resumed.writerows(rows[2:])
+    assert resumed.rows_written == 5
+    with engine.connect() as conn:
+        assert conn.execute(select(tables["phones"])).all() == rows
+
+
+def test_sink_resume_fails_when_rows_are_missing(engine):
+    tables = create_tables(engine, {"phones": ["partyidentifier", "number"]})
+    sink = SqlTableSink(engine, tables["phones"])
+    with pytest.raises(ValueError):
+        sink.resume({"loaded": 3, "in_table": 1})
+
+
+def test_key_deleter_deletes_keys_from_every_table(engine):
+    tables = create_tables(
+        engine,
+        {"parties": ["partyidentifier"], "phones": ["partyidentifier", "number"]},
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            tables["parties"].insert(), [{"partyidentifier": p} for p in "abc"]
+        )
+        conn.execute(
+            tables["phones"].insert(),
+            [
+                {"partyidentifier": p, "number": n}
+                for p, n in [("a", "1"), ("a", "2"), ("b", "1"), ("c", "1")]
+            ],
+        )
+    deleter = SqlKeyDeleter(engine, tables, batch_size=1)
+    deleter.add("a")
+    deleter.add("b")
+    deleter.flush()
+    assert deleter.rows_deleted == 5
+    assert count_rows(engine, tables["parties"]) == 1
+    assert count_rows(engine, tables["phones"], partyidentifier="c") == 1
+    deleter.flush()
+    assert deleter.rows_deleted == 5
@@ -0,0 +1,49 @@
+import json
+import logging
+import os
+
+import pytest
+from jsonschema import Draft7Validator
+
+import partyReferenceValidation
+from conftest import SRC_DIR
+from partyGenerator import generate_parties
+from partyReferenceValidation import check_parties, load_validator
+from partyValidatorCompiler import (
+    CompiledValidator,
+    UnsupportedSchema,
+    load_compiled_validator,
+)
+
+SCHEMA_PATH = os.path.join(SRC_DIR, "partyReferenceSchema.json")
+
+
+def test_compiled_validator_matches_jsonschema():
+    parties = list(generate_parties(300, invalid_ratio=0.3))
+    compiled = load_validator(SCHEMA_PATH, "compiled")
+    assert isinstance(compiled, CompiledValidator)
+    expected = check_parties(load_validator(SCHEMA_PATH), parties)
+    assert expected[1] > 0
+    assert check_parties(compiled, parties) == expected
+
+
+def unsupported_schema(tmp_path):
+    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    schema["not"] = {"type": "null"}
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps(schema))
+    return str(path)
+
+
+def test_unsupported_keyword_raises(tmp_path):
+    with pytest.raises(UnsupportedSchema, match="not"):
+        load_compiled_validator(unsupported_schema(tmp_path))
+
+
+def test_unsupported_schema_falls_back_to_jsonschema(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(partyReferenceValidation, "_validators", {})
+    with caplog.at_level(logging.WARNING):
+        validator = load_validator(unsupported_schema(tmp_path), "compiled")
+    assert isinstance(validator, Draft7Validator)
+    assert "cannot compile" in caplog.text